@@ -3,7 +3,7 @@ from channels.layers import get_channel_layer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
-from chat.models import Message, Chat
+from chat.models import ChatReadState, Message, Chat
 from common.serializers import (
     NonNullDynamicFieldsModelSerializer,
 )
@@ -12,11 +12,22 @@ from user.api.serializers import UserSerializer
 
 class MessageSerializer(NonNullDynamicFieldsModelSerializer):
     author = UserSerializer(fields=("id", "company", "email", "role"))
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Message
         fields = ("id", "chat", "author", "content", "is_read", "created_at")
 
+    def get_is_read(self, instance: Message):
+        # Свои сообщения прочитаны, если до них дошел кто-то из собеседников
+        read_cursors = self.context.get("read_cursors")
+        if read_cursors is None:
+            return instance.is_read
+        own_cursor, others_cursor = read_cursors
+        if instance.author_id == self.context["request"].user.pk:
+            return instance.pk <= others_cursor
+        return instance.pk <= own_cursor
+
 
 class EditMessageSerializer(NonNullDynamicFieldsModelSerializer):
     class Meta:
@@ -24,7 +35,18 @@ class EditMessageSerializer(NonNullDynamicFieldsModelSerializer):
         read_only_fields = ("id", "chat", "author", "content")
 
     def to_representation(self, instance):
-        return MessageSerializer().to_representation(instance)
+        return MessageSerializer(context=self.context).to_representation(instance)
+
+    def update(self, instance, validated_data):
+        # Отметка о прочтении хранится курсором пользователя в чате
+        if validated_data.pop("is_read", False):
+            ChatReadState.objects.mark_read(
+                instance.chat_id, self.context["request"].user, instance.pk
+            )
+            self.context["read_cursors"] = ChatReadState.objects.get_cursors(
+                instance.chat_id, self.context["request"].user
+            )
+        return super().update(instance, validated_data)
 
     def validate(self, attrs):
         if (
@@ -46,12 +68,17 @@ class ChatSerializer(NonNullDynamicFieldsModelSerializer):
         read_only_fields = ["messages", "last_message", "unread_count"]
 
     def get_last_message(self, chat: Chat):
-        try:
-            last_message = chat.messages.latest("created_at")
-        except Message.DoesNotExist:
-            last_message = None
-        if last_message:
-            return MessageSerializer(last_message).data
+        if chat.last_message:
+            context = self.context
+            if hasattr(chat, "last_read_message_id"):
+                context = {
+                    **context,
+                    "read_cursors": (
+                        chat.last_read_message_id,
+                        chat.others_last_read_message_id,
+                    ),
+                }
+            return MessageSerializer(chat.last_message, context=context).data
         return MessageSerializer().data
 
 
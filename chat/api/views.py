@@ -1,4 +1,6 @@
-from django.db.models import Sum
+from functools import partial
+
+from django.db.models import F
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
@@ -11,15 +13,17 @@ from chat.api.serializers import (
     CreateMessageSerializer,
     EditMessageSerializer,
 )
-from chat.models import Chat, Message
+from chat.models import Chat, ChatReadState, Message
 from common.views import MultiSerializerMixin
+from user.models import UnreadCounterKind
+from user.services.unread_counters import get_unread_count
 
 
 class ChatsViewSet(
     generics.ListAPIView, generics.RetrieveAPIView, GenericViewSet
 ):
     serializer_class = ChatSerializer
-    queryset = Chat.objects.prefetch_related("messages").all()
+    queryset = Chat.objects.select_related("last_message__author").all()
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
@@ -30,15 +34,17 @@ class ChatsViewSet(
         queryset = queryset.filter_user_chats(user)
         queryset = (
             queryset.annotate_unread_messages(user)
-            .annotate_latest_message()
-            .order_by("-latest_created_at")
+            .order_by(F("last_message_at").desc(nulls_last=True), "-pk")
         )
         return queryset
 
     def get_total_unread_count(self):
-        return self.get_queryset().aggregate(
-            total_unread_count=Sum("unread_count")
-        )["total_unread_count"]
+        user = self.request.user
+        return get_unread_count(
+            user,
+            UnreadCounterKind.CHAT_MESSAGES,
+            partial(Message.objects.count_unread, user),
+        )
 
     def list(self, request, *args, **kwargs):
         base_response = super().list(request, *args, **kwargs)
@@ -67,14 +73,21 @@ class MessageViewSet(
     parent_lookup_kwargs = {"chat_pk": "chat__pk"}
     permission_classes = [IsAuthenticated]
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated and "chat_pk" in self.kwargs:
+            context["read_cursors"] = ChatReadState.objects.get_cursors(
+                self.kwargs["chat_pk"], self.request.user
+            )
+        return context
+
     def retrieve(self, request, *args, **kwargs):
         """Overriding retrieve method, so we can mark messages as read after request"""
 
         message = self.get_object()
-        if message.author != request.user and not message.is_read:
-            message.is_read = True
-            message.save()
-        serializer = MessageSerializer(message)
+        if message.author != request.user:
+            ChatReadState.objects.mark_read(message.chat_id, request.user, message.pk)
+        serializer = MessageSerializer(message, context=self.get_serializer_context())
         return Response(serializer.data)
 
     def list(self, request, *args, **kwargs):
@@ -86,15 +99,16 @@ class MessageViewSet(
             queryset, request, view=self
         )
         messages_data = paginator_class.get_paginated_response(
-            MessageSerializer(paginated_queryset, many=True).data
+            MessageSerializer(
+                paginated_queryset, many=True, context=self.get_serializer_context()
+            ).data
         )
 
-        to_update = []
-        for message in paginated_queryset:
-            to_update.append(message.pk)
-            message.is_read = True
-
-        Message.objects.filter(id__in=to_update).exclude(
-            author=request.user
-        ).update(is_read=True)
+        # Прочитанным считается все до последнего сообщения страницы
+        if paginated_queryset:
+            ChatReadState.objects.mark_read(
+                self.kwargs["chat_pk"],
+                request.user,
+                max(message.pk for message in paginated_queryset),
+            )
         return messages_data
@@ -23,11 +23,13 @@ class ChatConsumer(AsyncJsonWebsocketConsumer):
             await self.disconnect(status.HTTP_401_UNAUTHORIZED)
             return
 
-        self.chat_db_obj, created = await database_sync_to_async(
-            Chat.objects.get_or_create
-        )(id=self.chat_id)
-
-        # TODO: Check if user has access to this chat
+        # Доступ проверяется по таблице участников чата
+        self.chat_db_obj = await database_sync_to_async(
+            Chat.objects.filter(id=self.chat_id).filter_user_chats(self.user).first
+        )()
+        if self.chat_db_obj is None:
+            await self.close()
+            return
 
         # Join room group
         await self.channel_layer.group_add(
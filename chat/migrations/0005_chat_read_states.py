@@ -0,0 +1,114 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Последнее сообщение каждого чата
+FILL_LAST_MESSAGE_SQL = """
+UPDATE chats
+SET last_message_id = latest.id, last_message_at = latest.created_at
+FROM (
+    SELECT DISTINCT ON (chat_id) chat_id, id, created_at
+    FROM chat_messages
+    ORDER BY chat_id, created_at DESC, id DESC
+) AS latest
+WHERE chats.id = latest.chat_id
+"""
+
+# Курсоры участников переписки по прочитанным сообщениям собеседников
+FILL_READ_STATES_SQL = """
+INSERT INTO chat_read_states (chat_id, user_id, last_read_message_id)
+SELECT authors.chat_id, authors.author_id, MAX(messages.id)
+FROM (SELECT DISTINCT chat_id, author_id FROM chat_messages) AS authors
+JOIN chat_messages AS messages
+    ON messages.chat_id = authors.chat_id
+    AND messages.author_id <> authors.author_id
+    AND messages.is_read
+GROUP BY authors.chat_id, authors.author_id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("chat", "0004_alter_message_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chat",
+            name="last_message",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="chat.message",
+                verbose_name="Последнее сообщение",
+            ),
+        ),
+        migrations.AddField(
+            model_name="chat",
+            name="last_message_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Время последнего сообщения"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["chat", "id"], name="chat_messages_cursor_idx"
+            ),
+        ),
+        migrations.CreateModel(
+            name="ChatReadState",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "last_read_message_id",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Последнее прочитанное сообщение"
+                    ),
+                ),
+                (
+                    "chat",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="read_states",
+                        to="chat.chat",
+                        verbose_name="Чат",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chat_read_states",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Прочтение чата",
+                "verbose_name_plural": "Прочтения чатов",
+                "db_table": "chat_read_states",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="chatreadstate",
+            constraint=models.UniqueConstraint(
+                fields=("chat", "user"), name="unique_chat_read_state"
+            ),
+        ),
+        migrations.RunSQL(FILL_LAST_MESSAGE_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(FILL_READ_STATES_SQL, migrations.RunSQL.noop),
+    ]
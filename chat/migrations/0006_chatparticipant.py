@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Участники существующих чатов, см. ChatParticipantQuerySet.refresh
+FILL_COMPANIES_SQL = """
+INSERT INTO chat_participants (chat_id, company_id)
+SELECT chat_id, company_id FROM (
+    SELECT chat_id, buyer_company_id AS company_id FROM recyclables_deals
+    UNION SELECT chat_id, supplier_company_id FROM recyclables_deals
+    UNION SELECT chat_id, buyer_company_id FROM equipment_deals
+    UNION SELECT chat_id, supplier_company_id FROM equipment_deals
+    UNION
+    SELECT offers.chat_id, users.company_id
+    FROM logistic_offers AS offers
+    JOIN transport_applications AS applications
+        ON applications.approved_logistics_offer_id = offers.id
+    JOIN users ON users.id = applications.created_by_id
+    UNION
+    SELECT special.chat_id, companies.company_id
+    FROM special_applications AS special
+    JOIN exchange_specialapps AS companies
+        ON companies.special_application_id = special.id
+) AS sources
+WHERE chat_id IS NOT NULL AND company_id IS NOT NULL
+"""
+
+FILL_USERS_SQL = """
+INSERT INTO chat_participants (chat_id, user_id)
+SELECT DISTINCT chat_id, logist_id FROM logistic_offers
+WHERE chat_id IS NOT NULL
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("company", "0028_geocodecache"),
+        ("exchange", "0039_pricequantilesketch"),
+        ("logistics", "0022_logistics_offer_logist_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("chat", "0005_chat_read_states"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChatParticipant",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "chat",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="participants",
+                        to="chat.chat",
+                        verbose_name="Чат",
+                    ),
+                ),
+                (
+                    "company",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chat_participants",
+                        to="company.company",
+                        verbose_name="Компания",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chat_participants",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Участник чата",
+                "verbose_name_plural": "Участники чатов",
+                "db_table": "chat_participants",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="chatparticipant",
+            index=models.Index(
+                fields=["company", "chat"], name="chat_participants_company_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chatparticipant",
+            index=models.Index(
+                fields=["user", "chat"], name="chat_participants_user_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="chatparticipant",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("company__isnull", False)),
+                fields=("chat", "company"),
+                name="unique_chat_participant_company",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="chatparticipant",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("user__isnull", False)),
+                fields=("chat", "user"),
+                name="unique_chat_participant_user",
+            ),
+        ),
+        migrations.RunSQL(FILL_COMPANIES_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(FILL_USERS_SQL, migrations.RunSQL.noop),
+    ]
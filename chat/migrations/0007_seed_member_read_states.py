@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.db import migrations
+
+# Курсоры всех, кто видит чат (см. ChatsQuerySet.get_members_filter):
+# администраторы компаний-участников (роль 5), логисты-участники (роль 4)
+# и остальные роли, которым доступны все чаты. Курсор ставится на новейшее
+# сообщение чата с is_read, прежние курсоры авторов только сдвигаются вперед
+FILL_MEMBER_READ_STATES_SQL = """
+WITH newest_read AS (
+    SELECT chat_id, MAX(id) AS message_id
+    FROM chat_messages
+    WHERE is_read
+    GROUP BY chat_id
+),
+members AS (
+    SELECT participants.chat_id, users.id AS user_id
+    FROM chat_participants AS participants
+    JOIN users ON users.company_id = participants.company_id AND users.role = 5
+    UNION
+    SELECT participants.chat_id, participants.user_id
+    FROM chat_participants AS participants
+    JOIN users ON users.id = participants.user_id AND users.role = 4
+    UNION
+    SELECT newest_read.chat_id, users.id
+    FROM newest_read CROSS JOIN users
+    WHERE users.role NOT IN (4, 5)
+)
+INSERT INTO chat_read_states (chat_id, user_id, last_read_message_id)
+SELECT members.chat_id, members.user_id, newest_read.message_id
+FROM members
+JOIN newest_read ON newest_read.chat_id = members.chat_id
+ON CONFLICT (chat_id, user_id) DO UPDATE
+SET last_read_message_id = GREATEST(
+    chat_read_states.last_read_message_id, EXCLUDED.last_read_message_id
+)
+"""
+
+# UnreadCounterKind.CHAT_MESSAGES, ключ см. user.services.unread_counters
+CHAT_MESSAGES_KIND = 2
+UNREAD_COUNTER_KEY = "unread_counter:{}:{}"
+
+
+def reset_chat_counters(apps, schema_editor):
+    """
+    Counters computed from the previous cursors are recomputed on the next read
+    """
+    UnreadCounter = apps.get_model("user", "UnreadCounter")
+    counters = UnreadCounter.objects.filter(kind=CHAT_MESSAGES_KIND)
+    user_ids = list(counters.values_list("user_id", flat=True))
+    counters.delete()
+    for i in range(0, len(user_ids), 1000):
+        cache.delete_many(
+            [
+                UNREAD_COUNTER_KEY.format(CHAT_MESSAGES_KIND, user_id)
+                for user_id in user_ids[i:i + 1000]
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0011_alter_unreadcounter_value"),
+        ("chat", "0006_chatparticipant"),
+    ]
+
+    operations = [
+        migrations.RunSQL(FILL_MEMBER_READ_STATES_SQL, migrations.RunSQL.noop),
+        migrations.RunPython(reset_chat_counters, migrations.RunPython.noop),
+    ]
@@ -1,28 +1,67 @@
 # Create your models here.
+from typing import Iterable, Tuple
+
 from bulk_update_or_create import BulkUpdateOrCreateQuerySet
 from django.conf import settings
-from django.db import models
-from django.db.models import Count, Q, Max
+from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models import Count, IntegerField, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 
 from common.models import BaseModel, BaseNameModel
-from user.models import UserRole
+from user.models import UnreadCounterKind, UserRole
+from user.services.unread_counters import change_unread_counts
+
+# Откуда берутся компании участников чата, см. ChatParticipantQuerySet.refresh
+CHAT_COMPANY_FIELDS = (
+    "deal__buyer_company",
+    "deal__supplier_company",
+    "equipment_deal__buyer_company",
+    "equipment_deal__supplier_company",
+    "logisticsoffer__transportapplication__created_by__company",
+    "special_app__companies",
+)
 
 
 class ChatsQuerySet(BulkUpdateOrCreateQuerySet, models.QuerySet):
     def annotate_unread_messages(self, user, *args, **kwargs):
+        """
+        Counts messages of other users after the read cursor of the user,
+        a range scan of the (chat, id) index. The read cursors are annotated as well
+        """
+        read_states = ChatReadState.objects.filter(chat=OuterRef("pk"), user=user)
+        unread_messages = (
+            Message.objects.filter(
+                chat=OuterRef("pk"), pk__gt=OuterRef("last_read_message_id")
+            )
+            .exclude(author=user)
+            .order_by()
+            .values("chat")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        others_read_states = (
+            ChatReadState.objects.filter(chat=OuterRef("pk"))
+            .exclude(user=user)
+            .order_by()
+            .values("chat")
+            .annotate(cursor=Max("last_read_message_id"))
+            .values("cursor")
+        )
         return self.annotate(
-            unread_count=Count(
-                "messages",
-                filter=(
-                    Q(messages__is_read=False) & ~Q(messages__author=user)
-                ),
+            last_read_message_id=Coalesce(
+                Subquery(read_states.values("last_read_message_id")[:1]), Value(0)
+            ),
+            others_last_read_message_id=Coalesce(
+                Subquery(others_read_states), Value(0)
+            ),
+        ).annotate(
+            unread_count=Coalesce(
+                Subquery(unread_messages, output_field=IntegerField()), Value(0)
             )
         )
 
-    def annotate_latest_message(self, *args, **kwargs):
-        return self.annotate(latest_created_at=Max("messages__created_at"))
-
     def filter_user_chats(self, user):
         if user.role == UserRole.COMPANY_ADMIN:
             return self.__filter_for_company_admin(user)
@@ -30,21 +69,48 @@ class ChatsQuerySet(BulkUpdateOrCreateQuerySet, models.QuerySet):
             return self.__filter_for_logist(user)
         return self
 
-    def __filter_for_company_admin(self, user):
-        return self.filter(
-            Q(deal__buyer_company=user.company)
-            | Q(deal__supplier_company=user.company)
-            | Q(equipment_deal__buyer_company=user.company)
-            | Q(equipment_deal__supplier_company=user.company)
-            | Q(logisticsoffer__transportapplication__created_by__company=user.company)
-            | Q(special_app__companies__id=user.company.id)
+    def get_members_filter(self) -> Q:
+        """
+        Users who see any of the chats, the reverse of filter_user_chats
+        """
+        participants = ChatParticipant.objects.filter(chat__in=self)
+        return (
+            Q(
+                role=UserRole.COMPANY_ADMIN,
+                company_id__in=participants.filter(company__isnull=False).values(
+                    "company"
+                ),
+            )
+            | Q(
+                role=UserRole.LOGIST,
+                pk__in=participants.filter(user__isnull=False).values("user"),
+            )
+            | ~Q(role__in=[UserRole.COMPANY_ADMIN, UserRole.LOGIST])
         )
 
+    def __filter_for_company_admin(self, user):
+        if not user.company_id:
+            return self.none()
+        return self.filter(participants__company_id=user.company_id)
+
     def __filter_for_logist(self, user):
-        return self.filter(logisticsoffer__logist=user)
+        return self.filter(participants__user=user)
 
 
 class Chat(BaseNameModel):
+    # Последнее сообщение хранится в чате, чтобы список чатов не читал сообщения
+    last_message = models.ForeignKey(
+        "chat.Message",
+        on_delete=models.SET_NULL,
+        verbose_name="Последнее сообщение",
+        related_name="+",
+        null=True,
+        blank=True,
+    )
+    last_message_at = models.DateTimeField(
+        "Время последнего сообщения", null=True, blank=True
+    )
+
     class Meta:
         db_table = "chats"
         verbose_name = "Чат"
@@ -56,6 +122,28 @@ class Chat(BaseNameModel):
         return reverse("chats-detail", kwargs={"pk": self.pk})
 
 
+class MessageQuerySet(models.QuerySet):
+    def unread_for(self, user):
+        """
+        Messages of other users after the read cursor of the user in their chat
+        """
+        read_states = ChatReadState.objects.filter(chat=OuterRef("chat"), user=user)
+        return self.exclude(author=user).filter(
+            pk__gt=Coalesce(
+                Subquery(read_states.values("last_read_message_id")[:1]), Value(0)
+            )
+        )
+
+    def count_unread(self, user) -> int:
+        if user.role == UserRole.COMPANY_ADMIN and not user.company_id:
+            return 0
+        return (
+            self.filter(chat__in=Chat.objects.filter_user_chats(user))
+            .unread_for(user)
+            .count()
+        )
+
+
 class Message(BaseModel):
     chat = models.ForeignKey(
         Chat, on_delete=models.CASCADE, related_name="messages"
@@ -68,13 +156,194 @@ class Message(BaseModel):
     content = models.TextField()
     is_read = models.BooleanField(default=False)
 
+    objects = MessageQuerySet.as_manager()
+
     class Meta:
         ordering = ("-created_at",)
         db_table = "chat_messages"
         verbose_name = "Сообщение чата"
         verbose_name_plural = "Сообщения чата"
+        indexes = [
+            models.Index(fields=["chat", "id"], name="chat_messages_cursor_idx"),
+        ]
 
     def get_absolute_url(self):
         return reverse(
             "messages", kwargs={"chat_pk": self.chat.pk, "pk": self.pk}
         )
+
+    def change_members_unread_counts(self, delta: int):
+        """
+        Changes unread counters of the chat members except the author,
+        members who have already read the message are skipped when it is removed
+        """
+        members = (
+            get_user_model()
+            .objects.filter(Chat.objects.filter(pk=self.chat_id).get_members_filter())
+            .exclude(pk=self.author_id)
+        )
+        if delta < 0:
+            members = members.exclude(
+                pk__in=ChatReadState.objects.filter(
+                    chat_id=self.chat_id, last_read_message_id__gte=self.pk
+                ).values("user")
+            )
+        change_unread_counts(
+            {member_id: delta for member_id in members.values_list("pk", flat=True)},
+            UnreadCounterKind.CHAT_MESSAGES,
+        )
+
+
+class ChatReadStateQuerySet(models.QuerySet):
+    def get_cursors(self, chat_id: int, user) -> Tuple[int, int]:
+        """
+        Read cursor of the user and the farthest one of the other members
+        """
+        cursors = self.filter(chat_id=chat_id).aggregate(
+            own=Max("last_read_message_id", filter=Q(user=user)),
+            others=Max("last_read_message_id", filter=~Q(user=user)),
+        )
+        return cursors["own"] or 0, cursors["others"] or 0
+
+    def mark_read(self, chat_id: int, user, message_id: int) -> int:
+        """
+        Moves the read cursor of the user in the chat forward to the message,
+        returns the number of messages of other users which became read
+        """
+        with transaction.atomic():
+            read_state, _ = self.select_for_update().get_or_create(
+                chat_id=chat_id, user=user
+            )
+            if read_state.last_read_message_id >= message_id:
+                return 0
+            read_count = (
+                Message.objects.filter(
+                    chat_id=chat_id,
+                    pk__gt=read_state.last_read_message_id,
+                    pk__lte=message_id,
+                )
+                .exclude(author=user)
+                .count()
+            )
+            read_state.last_read_message_id = message_id
+            read_state.save(update_fields=["last_read_message_id"])
+            change_unread_counts({user.pk: -read_count}, UnreadCounterKind.CHAT_MESSAGES)
+        return read_count
+
+
+class ChatReadState(models.Model):
+    """
+    Read cursor of the user in the chat: all messages up to
+    last_read_message_id are read by him
+    """
+
+    chat = models.ForeignKey(
+        Chat, on_delete=models.CASCADE, verbose_name="Чат", related_name="read_states"
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="chat_read_states",
+    )
+    last_read_message_id = models.BigIntegerField(
+        "Последнее прочитанное сообщение", default=0
+    )
+
+    objects = ChatReadStateQuerySet.as_manager()
+
+    class Meta:
+        db_table = "chat_read_states"
+        verbose_name = "Прочтение чата"
+        verbose_name_plural = "Прочтения чатов"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["chat", "user"], name="unique_chat_read_state"
+            )
+        ]
+
+
+class ChatParticipantQuerySet(models.QuerySet):
+    def refresh(self, chat_ids: Iterable[int]):
+        """
+        Rebuilds participants of the chats from their deals,
+        logistics offers and special applications
+        """
+        chat_ids = [chat_id for chat_id in chat_ids if chat_id]
+        if not chat_ids:
+            return
+        expected = set()
+        for chat_id, *companies, logist in Chat.objects.filter(
+            pk__in=chat_ids
+        ).values_list("pk", *CHAT_COMPANY_FIELDS, "logisticsoffer__logist"):
+            expected.update((chat_id, company, None) for company in companies if company)
+            if logist:
+                expected.add((chat_id, None, logist))
+
+        with transaction.atomic():
+            existing = {
+                (chat_id, company_id, user_id): pk
+                for pk, chat_id, company_id, user_id in self.filter(
+                    chat_id__in=chat_ids
+                ).values_list("pk", "chat_id", "company_id", "user_id")
+            }
+            self.filter(
+                pk__in=[pk for key, pk in existing.items() if key not in expected]
+            ).delete()
+            self.bulk_create(
+                [
+                    ChatParticipant(chat_id=chat_id, company_id=company_id, user_id=user_id)
+                    for chat_id, company_id, user_id in expected - existing.keys()
+                ],
+                ignore_conflicts=True,
+            )
+
+
+class ChatParticipant(models.Model):
+    """
+    Company whose admins see the chat or a user (logist) who sees it,
+    materialized from the objects the chat belongs to
+    """
+
+    chat = models.ForeignKey(
+        Chat, on_delete=models.CASCADE, verbose_name="Чат", related_name="participants"
+    )
+    company = models.ForeignKey(
+        "company.Company",
+        on_delete=models.CASCADE,
+        verbose_name="Компания",
+        related_name="chat_participants",
+        null=True,
+        blank=True,
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="chat_participants",
+        null=True,
+        blank=True,
+    )
+
+    objects = ChatParticipantQuerySet.as_manager()
+
+    class Meta:
+        db_table = "chat_participants"
+        verbose_name = "Участник чата"
+        verbose_name_plural = "Участники чатов"
+        indexes = [
+            models.Index(fields=["company", "chat"], name="chat_participants_company_idx"),
+            models.Index(fields=["user", "chat"], name="chat_participants_user_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["chat", "company"],
+                condition=Q(company__isnull=False),
+                name="unique_chat_participant_company",
+            ),
+            models.UniqueConstraint(
+                fields=["chat", "user"],
+                condition=Q(user__isnull=False),
+                name="unique_chat_participant_user",
+            ),
+        ]
@@ -0,0 +1,36 @@
+"""
+Last message of the chat and unread messages counters of the chat members,
+see user.services.unread_counters
+"""
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from chat.models import Chat, Message
+
+
+@receiver(post_save, sender=Message)
+def update_last_message(sender, instance: Message, created, **kwargs):
+    if not created:
+        return
+    Chat.objects.filter(
+        Q(last_message_at__isnull=True) | Q(last_message_at__lte=instance.created_at),
+        pk=instance.chat_id,
+    ).update(last_message=instance, last_message_at=instance.created_at)
+    instance.change_members_unread_counts(1)
+
+
+@receiver(post_delete, sender=Message)
+def update_last_message_on_delete(sender, instance: Message, **kwargs):
+    instance.change_members_unread_counts(-1)
+    previous_message = (
+        Message.objects.filter(chat_id=instance.chat_id)
+        .order_by("-created_at", "-pk")
+        .first()
+    )
+    Chat.objects.filter(
+        pk=instance.chat_id, last_message_at__gte=instance.created_at
+    ).update(
+        last_message=previous_message,
+        last_message_at=previous_message.created_at if previous_message else None,
+    )
@@ -80,13 +80,15 @@ class BaseClient:
         returns: raw JSON response.
         rtype: dict
         """
-        retries = Retry(
-            total=retry_counter,
-            backoff_factor=0.1,
-            status_forcelist=[500, 502, 503, 504],
-        )
-
-        self._session.mount("https://", HTTPAdapter(max_retries=retries))
+        # Адаптер с пулом соединений монтируется один раз на сессию
+        if getattr(self, "_retry_counter", None) != retry_counter:
+            retries = Retry(
+                total=retry_counter,
+                backoff_factor=0.1,
+                status_forcelist=[500, 502, 503, 504],
+            )
+            self._session.mount("https://", HTTPAdapter(max_retries=retries))
+            self._retry_counter = retry_counter
 
         authed_url = self._generate_auth_url(url, get_params)
 
@@ -0,0 +1,17 @@
+from django.db.models import Aggregate, FloatField
+
+
+class PercentileCont(Aggregate):
+    """
+    PostgreSQL continuous percentile of the expression within the group
+    """
+
+    function = "PERCENTILE_CONT"
+    name = "PercentileCont"
+    output_field = FloatField()
+    template = "%(function)s(%(percentile)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+
+    def __init__(self, expression, percentile, **extra):
+        if not 0 <= percentile <= 1:
+            raise ValueError("Percentile must be between 0 and 1")
+        super().__init__(expression, percentile=float(percentile), **extra)
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+from functools import wraps
+from typing import Dict, List
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+log = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TIMEOUT = 5 * 60
+# Время, на которое один запрос захватывает пересчет устаревшего ответа
+RESPONSE_CACHE_LOCK_TIMEOUT = 30
+# Последний ответ без учета версий моделей, отдается на время пересчета
+RESPONSE_CACHE_STALE_TIMEOUT = 24 * 60 * 60
+
+MODEL_VERSION_KEY = "response_cache_version:{}"
+
+# Все закэшированные эндпоинты, для вывода метрик
+cached_endpoints: List[str] = []
+
+
+def get_model_label(model) -> str:
+    return model if isinstance(model, str) else model._meta.label_lower
+
+
+def bump_model_version(model):
+    """
+    Makes all cached responses depending on the model outdated
+    """
+    key = MODEL_VERSION_KEY.format(get_model_label(model))
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_model_versions(models) -> str:
+    keys = [MODEL_VERSION_KEY.format(get_model_label(model)) for model in models]
+    versions = cache.get_many(keys)
+    return ".".join(str(versions.get(key, 0)) for key in keys)
+
+
+def normalize_query_params(request, user_params) -> str:
+    params = sorted(
+        (key, sorted(request.query_params.getlist(key)))
+        for key in request.query_params
+    )
+    # Результат фильтров вида is_my зависит от пользователя
+    if any(request.query_params.get(name) for name in user_params):
+        params.append(("user", [str(request.user.pk)]))
+    return hashlib.md5(json.dumps(params).encode()).hexdigest()
+
+
+def incr_metric(endpoint: str, name: str):
+    key = f"response_cache_metrics:{endpoint}:{name}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_metrics() -> Dict[str, Dict[str, int]]:
+    result = {}
+    for endpoint in cached_endpoints:
+        keys = {
+            name: f"response_cache_metrics:{endpoint}:{name}"
+            for name in ("hit", "stale", "miss", "not_modified")
+        }
+        values = cache.get_many(list(keys.values()))
+        result[endpoint] = {name: values.get(key, 0) for name, key in keys.items()}
+    return result
+
+
+def make_response(request, endpoint: str, cached: dict, cache_status: str) -> Response:
+    if request.headers.get("If-None-Match") == cached["etag"]:
+        incr_metric(endpoint, "not_modified")
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(cached["data"])
+    response["ETag"] = cached["etag"]
+    response["X-Cache"] = cache_status
+    return response
+
+
+def cached_response(*models, timeout=RESPONSE_CACHE_TIMEOUT, user_params=("is_my",)):
+    """
+    Caches successful responses of a read-only viewset action.
+    The key consists of the action, normalized query params and versions
+    of the models the response depends on, see bump_model_version.
+    Supports ETag/If-None-Match. An outdated response is recomputed by one
+    request, others get the previous response meanwhile (or compute it too
+    if there is none) instead of waiting
+    """
+
+    def decorator(method):
+        endpoint = f"{method.__module__}.{method.__qualname__}"
+        cached_endpoints.append(endpoint)
+
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            params_key = "response_cache:{}:{}:{}".format(
+                endpoint,
+                json.dumps(kwargs, sort_keys=True),
+                normalize_query_params(request, user_params),
+            )
+            key = f"{params_key}:{get_model_versions(models)}"
+            stale_key = f"{params_key}:stale"
+            cached = cache.get(key)
+            if cached is not None:
+                incr_metric(endpoint, "hit")
+                return make_response(request, endpoint, cached, "HIT")
+
+            lock_key = f"{key}:lock"
+            locked = cache.add(lock_key, 1, RESPONSE_CACHE_LOCK_TIMEOUT)
+            if not locked:
+                # Ответ уже пересчитывается другим запросом
+                cached = cache.get(stale_key)
+                if cached is not None:
+                    incr_metric(endpoint, "stale")
+                    return make_response(request, endpoint, cached, "STALE")
+
+            incr_metric(endpoint, "miss")
+            try:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                # Тот же кодировщик, что и у JSONRenderer: Decimal остаются числами,
+                # ответ из кэша совпадает с ответом без кэша
+                content = json.dumps(response.data, cls=JSONEncoder)
+                cached = {
+                    "data": json.loads(content),
+                    "etag": '"{}"'.format(hashlib.md5(content.encode()).hexdigest()),
+                }
+                cache.set(key, cached, timeout)
+                cache.set(stale_key, cached, RESPONSE_CACHE_STALE_TIMEOUT)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            return make_response(request, endpoint, cached, "MISS")
+
+        return wrapper
+
+    return decorator
@@ -1,5 +1,11 @@
-from common.utils import str2bool
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Coalesce
 from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from common.search import INN_RE, SEARCH_CONFIG, WORD_RE
+from common.utils import str2bool
 
 
 class FavoriteFilterBackend(filters.BaseFilterBackend):
@@ -17,3 +23,62 @@ class FavoriteFilterBackend(filters.BaseFilterBackend):
                 queryset = queryset.filter(is_favorite=True)
 
         return queryset
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Search over denormalized search vectors instead of ILIKE across joins.
+    Uses attributes of the view:
+    * search_vector_fields - lookups to SearchVectorField, results ranked by them.
+      Words of the query are also matched as prefixes (to_tsquery "word:*")
+    * search_trigram_fields - name lookups for typo tolerant trigram search
+      and substring (icontains) search, both served by trigram indexes
+    * search_inn_fields - INN lookups: a full INN is matched by them only,
+      other digits-only queries also match INN prefixes
+    Falls back to default SearchFilter when search_vector_fields is not set
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        vector_fields = getattr(view, "search_vector_fields", None)
+        if not vector_fields:
+            return super().filter_queryset(request, queryset, view)
+
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+        term = " ".join(search_terms)
+
+        # Быстрый путь для поиска по ИНН: полный ИНН ищется по уникальному индексу
+        inn_fields = getattr(view, "search_inn_fields", ())
+        if inn_fields and INN_RE.fullmatch(term):
+            condition = Q()
+            for field in inn_fields:
+                condition |= Q(**{f"{field}__exact": term})
+            return queryset.filter(condition)
+
+        search_query = SearchQuery(term, search_type="websearch", config=SEARCH_CONFIG)
+        words = WORD_RE.findall(term)
+        if words:
+            # Префиксный поиск: "картон" находит "Картонпак"
+            search_query |= SearchQuery(
+                " & ".join(f"{word}:*" for word in words),
+                search_type="raw",
+                config=SEARCH_CONFIG,
+            )
+        condition = Q()
+        if term.isdigit():
+            # Часть ИНН или число из названия ("2000")
+            for field in inn_fields:
+                condition |= Q(**{f"{field}__startswith": term})
+        rank = Value(0.0, output_field=FloatField())
+        for field in vector_fields:
+            condition |= Q(**{field: search_query})
+            rank += Coalesce(SearchRank(F(field), search_query), 0.0)
+        for field in getattr(view, "search_trigram_fields", ()):
+            condition |= Q(**{f"{field}__trigram_similar": term})
+            condition |= Q(**{f"{field}__icontains": term})
+
+        queryset = queryset.filter(condition).annotate(search_rank=rank)
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            queryset = queryset.order_by("-search_rank", "-pk")
+        return queryset
@@ -1,4 +1,5 @@
 from bulk_update_or_create import BulkUpdateOrCreateQuerySet
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 from common.model_fields import LatitudeField, LongitudeField
@@ -100,3 +101,18 @@ class DeliveryFieldsModelMixin(models.Model):
 
     class Meta:
         abstract = True
+
+
+class SearchVectorModelMixin(models.Model):
+    """
+    Abstract model with denormalized full-text search vector.
+    Vector is built from SEARCH_VECTOR_FIELDS ((field, weight, config), ...)
+    and updated after save by receivers
+    """
+
+    SEARCH_VECTOR_FIELDS = ()
+
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        abstract = True
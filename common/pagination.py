@@ -1,5 +1,16 @@
-from rest_framework.pagination import PageNumberPagination
+import binascii
+import hashlib
+import json
+from base64 import b64decode, b64encode
+
+from django.core.cache import cache
+from django.db import models
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
 
 class PageSizePagination(PageNumberPagination):
@@ -54,3 +65,152 @@ class PageSizePagination(PageNumberPagination):
                 "results": schema,
             },
         }
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor (keyset) paginator. Pages are selected with WHERE on the
+    (ordering field, id) pair instead of OFFSET, the total count is
+    not calculated unless `with_count=true` is passed.
+    Allowed orderings are taken from view.keyset_ordering_fields.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "size"
+    count_query_param = "with_count"
+    default_ordering = "-created_at"
+    count_cache_timeout = 60
+
+    def __init__(self, page_size=None):
+        self.page_size = page_size or api_settings.PAGE_SIZE
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return size if size > 0 else self.page_size
+
+    def get_ordering(self, request, view):
+        allowed = getattr(view, "keyset_ordering_fields", ("created_at",))
+        ordering = request.query_params.get("ordering", self.default_ordering)
+        if ordering.lstrip("-") not in allowed:
+            ordering = self.default_ordering
+        return ordering
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode("ascii")).decode("utf-8"))
+            return data["v"], int(data["id"]), bool(data.get("r", False))
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError, binascii.Error):
+            raise NotFound("Некорректный курсор")
+
+    def encode_cursor(self, instance, reverse):
+        value = getattr(instance, self.field)
+        data = {"v": str(value), "id": instance.pk, "r": reverse}
+        encoded = b64encode(json.dumps(data).encode("utf-8")).decode("ascii")
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        size = self.get_page_size(request)
+        ordering = self.get_ordering(request, view)
+        self.field = ordering.lstrip("-")
+        descending = ordering.startswith("-")
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) == "true":
+            self.count = self.get_approximate_count(queryset)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+        # При движении назад порядок сортировки меняется на обратный
+        forward_descending = descending != reverse
+        prefix = "-" if forward_descending else ""
+        queryset = queryset.order_by(f"{prefix}{self.field}", f"{prefix}pk")
+
+        if cursor:
+            value, pk, _ = cursor
+            lookup = "lt" if forward_descending else "gt"
+            queryset = queryset.filter(
+                Q(**{f"{self.field}__{lookup}": value})
+                | Q(**{self.field: value, f"pk__{lookup}": pk})
+            )
+
+        results = list(queryset[: size + 1])
+        has_more = len(results) > size
+        results = results[:size]
+        if reverse:
+            results.reverse()
+
+        self.next_link = None
+        self.previous_link = None
+        if results:
+            if has_more or reverse:
+                self.next_link = self.encode_cursor(results[-1], reverse=False)
+            if cursor and (has_more or not reverse):
+                self.previous_link = self.encode_cursor(results[0], reverse=True)
+        return results
+
+    def get_approximate_count(self, queryset):
+        """
+        Count is cached by the SQL of the filtered queryset,
+        so it may lag behind for count_cache_timeout seconds
+        """
+        query = str(queryset.order_by().query)
+        key = "keyset_count:" + hashlib.md5(query.encode("utf-8")).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.order_by().count()
+            cache.set(key, count, self.count_cache_timeout)
+        return count
+
+    def get_paginated_response(self, data):
+        response = {
+            "next": self.next_link,
+            "previous": self.previous_link,
+            "results": data,
+        }
+        if self.count is not None:
+            response["count"] = self.count
+        return Response(response)
+
+
+class PageSizeOrKeysetPagination(PageSizePagination):
+    """
+    Page number pagination by default, switches to KeysetPagination
+    when `cursor` or `pagination=cursor` is passed in query params
+    """
+
+    keyset_class = KeysetPagination
+
+    def __init__(self):
+        self.keyset = None
+
+    @classmethod
+    def is_keyset_requested(cls, request):
+        return (
+            KeysetPagination.cursor_query_param in request.query_params
+            or request.query_params.get("pagination") == "cursor"
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        # Списки (например, несуществующие компании) пагинируются по номеру страницы
+        if self.is_keyset_requested(request) and isinstance(
+                queryset, models.QuerySet
+        ):
+            self.keyset = self.keyset_class(self.page_size)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,35 @@
+import re
+
+from django.contrib.postgres.search import SearchVector
+
+SEARCH_CONFIG = "russian"
+
+# ИНН юр. лица - 10 цифр, ИП - 12 цифр
+INN_RE = re.compile(r"\d{10}|\d{12}")
+# Слова запроса для префиксного tsquery, спецсимволы to_tsquery отбрасываются
+WORD_RE = re.compile(r"\w+")
+
+
+def build_search_vector(weighted_fields):
+    """
+    Builds weighted tsvector expression from ((field, weight, config), ...)
+    """
+    vector = None
+    for field, weight, config in weighted_fields:
+        field_vector = SearchVector(field, weight=weight, config=config)
+        vector = field_vector if vector is None else vector + field_vector
+    return vector
+
+
+def update_search_vector(instance, update_fields=None):
+    """
+    Recalculates denormalized search_vector of the instance on the database side
+    """
+    weighted_fields = instance.SEARCH_VECTOR_FIELDS
+    if update_fields is not None and not {
+        field for field, _, _ in weighted_fields
+    } & set(update_fields):
+        return
+    type(instance).objects.filter(pk=instance.pk).update(
+        search_vector=build_search_vector(weighted_fields)
+    )
@@ -1,9 +1,15 @@
+import csv
 import http
+import io
+import json
 import os
+from itertools import islice
 
 from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Exists, OuterRef
-from django.http import QueryDict
+from django.http import QueryDict, StreamingHttpResponse
+from djangorestframework_camel_case.util import camelize, camelize_re, underscore_to_camel
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
 from rest_framework.decorators import action
@@ -19,8 +25,7 @@ from exchange.api.serializers import (
     CreateImageModelSerializer,
     CreateDocumentModelSerializer,
 )
-from exchange.models import ImageModel, DocumentModel, DealType, RecyclablesApplication, RecyclablesDeal, DealStatus, \
-    UrgencyType, Review
+from exchange.models import ImageModel, DocumentModel, DealType, RecyclablesApplication, UrgencyType
 from exchange.services import filter_qs_by_coordinates
 from user.models import UserRole, Favorite
 from drf_yasg import openapi as api
@@ -295,6 +300,84 @@ class ExcludeMixin:
         return super().list(request, *args, **kwargs)
 
 
+class StreamingExportMixin:
+    """
+    Implements streaming export of the list without pagination.
+    When `export=ndjson` or `export=csv` query param is passed, queryset is
+    iterated with server-side cursor and serialized chunk by chunk,
+    so memory usage does not depend on the result size
+    """
+
+    export_query_param = "export"
+    export_chunk_size = 500
+    export_serializer_class = None
+
+    def get_export_format(self):
+        export_format = self.request.query_params.get(self.export_query_param)
+        if export_format in ("ndjson", "csv"):
+            return export_format
+        return None
+
+    def iter_export_rows(self, queryset):
+        serializer_class = (
+                self.export_serializer_class or self.get_serializer_class()
+        )
+        context = self.get_serializer_context()
+        # iterator(chunk_size) использует серверный курсор и
+        # выполняет prefetch_related для каждого чанка
+        rows = queryset.iterator(chunk_size=self.export_chunk_size)
+        while chunk := list(islice(rows, self.export_chunk_size)):
+            yield from camelize(
+                serializer_class(chunk, many=True, context=context).data
+            )
+
+    def iter_ndjson(self, queryset):
+        for row in self.iter_export_rows(queryset):
+            yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+    def iter_csv(self, queryset):
+        serializer_class = (
+                self.export_serializer_class or self.get_serializer_class()
+        )
+        columns = [
+            camelize_re.sub(underscore_to_camel, name)
+            for name in serializer_class().fields
+        ]
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction="ignore")
+
+        def flush():
+            value = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+            return value
+
+        writer.writeheader()
+        yield flush()
+        for row in self.iter_export_rows(queryset):
+            # Вложенные объекты записываются в ячейку как JSON
+            writer.writerow(
+                {
+                    key: json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+                    if isinstance(value, (dict, list))
+                    else value
+                    for key, value in row.items()
+                }
+            )
+            yield flush()
+
+    def get_export_response(self, queryset, export_format):
+        if export_format == "csv":
+            response = StreamingHttpResponse(
+                self.iter_csv(queryset), content_type="text/csv; charset=utf-8"
+            )
+            response["Content-Disposition"] = 'attachment; filename="export.csv"'
+            return response
+        return StreamingHttpResponse(
+            self.iter_ndjson(queryset), content_type="application/x-ndjson"
+        )
+
+
 class RecyclableApplicationsQuerySetMixin:
 
     @staticmethod
@@ -331,18 +414,13 @@ class RecyclableApplicationsQuerySetMixin:
                 Q(recyclables_id=recyclable_id[0])).filter(
                 ~Q(deal_type=DealType.SELL))
 
-        if not dick.getlist("point", []) and self.get_urgency_type(qs, dick):
+        points = dick.getlist("point", [])
+        if not points:
             return self.get_urgency_type(qs, dick)
 
-        if dick.getlist("point", []):
-            if dick.get('urgency_type'):
-                qs = filter_qs_by_coordinates(qs, self.get_urgency_type(qs, dick))
-                return qs
-            else:
-                qs = filter_qs_by_coordinates(qs, dick.getlist("point", []))
-                return qs
-        else:
-            return qs
+        if dick.get('urgency_type'):
+            qs = self.get_urgency_type(qs, dick)
+        return filter_qs_by_coordinates(qs, points)
 
 
 class CompanyQueryMixin:
@@ -357,95 +435,44 @@ class CompanyQueryMixin:
             companies_ids = list(set(companies))
             qs = qs.filter(id__in=companies_ids)
 
+        # Агрегаты компаний берутся из CompanyStats одним join
         if request_params.get('company_failed_deals'):
             failed_deals = int(request_params.get('company_failed_deals'))
             if failed_deals == 2:
-                buyer_companies_ids = RecyclablesDeal.objects.filter(status__lte=DealStatus.COMPLETED).values_list(
-                    'buyer_company_id', flat=True)
-                supplier_companies_ids = RecyclablesDeal.objects.filter(status__lte=DealStatus.COMPLETED).values_list(
-                    'supplier_company_id', flat=True)
-                companies_ids = list(set(list(buyer_companies_ids) + list(supplier_companies_ids)))
-                qs = qs.filter(id__in=companies_ids)
+                qs = qs.filter(stats__deals_count__gt=0)
             if failed_deals == 1:
-                buyer_companies_ids = RecyclablesDeal.objects.filter(status__gte=DealStatus.PROBLEM).values_list(
-                    'buyer_company_id', flat=True)
-                supplier_companies_ids = RecyclablesDeal.objects.filter(status__gte=DealStatus.PROBLEM).values_list(
-                    'supplier_company_id', flat=True)
-                companies_ids = list(set(list(buyer_companies_ids) + list(supplier_companies_ids)))
-                qs = qs.filter(id__in=companies_ids)
+                qs = qs.filter(stats__failed_deals_count__gt=0)
 
         if request_params.get('deals_count'):
             deals_count = int(request_params.get('deals_count'))
-            buyer_companies_ids = RecyclablesDeal.objects.filter(status__lte=DealStatus.COMPLETED).values_list(
-                'buyer_company_id', flat=True)
-            supplier_companies_ids = RecyclablesDeal.objects.filter(status__lte=DealStatus.COMPLETED).values_list(
-                'supplier_company_id', flat=True)
-            companies_ids_by_deals = list(buyer_companies_ids) + list(supplier_companies_ids)
-            current_companies_ids = []
-            for company_id in companies_ids_by_deals:
-                count = companies_ids_by_deals.count(company_id)
-                if count >= deals_count:
-                    current_companies_ids.append(company_id)
-            qs = qs.filter(id__in=current_companies_ids)
+            qs = qs.filter(stats__deals_count__gte=deals_count)
 
         if request_params.get('company_volume'):
-            clear_company_ids = []
             company_volume = int(request_params.get('company_volume'))
-            applications = RecyclablesApplication.objects.filter(
-                urgency_type=UrgencyType.SUPPLY_CONTRACT)
-            for company_id in applications.values_list("company_id"):
-                company_contracts_volume = []
-                for app in applications:
-                    if company_id == app.company_id:
-                        company_contracts_volume.append(app.volume)
-                if sum(company_contracts_volume) >= company_volume:
-                    clear_company_ids.append(company_id)
-            qs = qs.filter(id__in=clear_company_ids)
+            qs = qs.filter(stats__supply_contract_volume__gte=company_volume)
 
         if request_params.get('deal_type'):
             deal_type = int(request_params.get('deal_type'))
-            if deal_type == 1:
-                companies_ids = RecyclablesApplication.objects.filter(deal_type=DealType.BUY).values_list(
-                    'company_id', flat=True)
-                qs = qs.filter(id__in=companies_ids)
-            if deal_type == 2:
-                companies_ids = RecyclablesApplication.objects.filter(deal_type=DealType.SELL).values_list(
-                    'company_id', flat=True)
-                qs = qs.filter(id__in=companies_ids)
+            if deal_type == DealType.BUY:
+                qs = qs.filter(stats__has_buy_applications=True)
+            if deal_type == DealType.SELL:
+                qs = qs.filter(stats__has_sell_applications=True)
 
         if request_params.get('company_has_applications'):
-            has_apps = request_params.get('company_has_applications')
-            if has_apps == 1:
-                companies = RecyclablesApplication.objects.filter(
-                    urgency_type=UrgencyType.READY_FOR_SHIPMENT).values_list(
-                    'company_id', flat=True)
-                companies_ids = list(set(companies))
-                qs = qs.filter(id__in=companies_ids)
-            if has_apps == 2:
-                companies = RecyclablesApplication.objects.filter(
-                    urgency_type=UrgencyType.SUPPLY_CONTRACT).values_list(
-                    'company_id', flat=True)
-                companies_ids = list(set(companies))
-                qs = qs.filter(id__in=companies_ids)
+            has_apps = int(request_params.get('company_has_applications'))
+            if has_apps == UrgencyType.READY_FOR_SHIPMENT:
+                qs = qs.filter(stats__has_ready_for_shipment=True)
+            if has_apps == UrgencyType.SUPPLY_CONTRACT:
+                qs = qs.filter(stats__has_supply_contract=True)
 
         if request_params.get('rate'):
             company_rate = int(request_params.get('rate'))
-            clear_company_ids = []
-            companies_ids = qs.values_list('id')
-            company_reviews = Review.objects.all()
             if company_rate > 0:
-                for company in companies_ids:
-                    company_reviews_sum = []
-                    for review in company_reviews:
-                        if review.company_id == company:
-                            company_reviews_sum.append(int(review.rate))
-                    if sum(company_reviews_sum) > 0:
-                        current_company_rate = round(sum(company_reviews_sum) / len(company_reviews_sum))
-                        if current_company_rate >= company_rate:
-                            clear_company_ids.append(company)
-                qs = qs.filter(id__in=clear_company_ids)
-            else:
-                qs = qs
+                # Средняя оценка округляется до целого
+                qs = qs.filter(
+                    stats__reviews_count__gt=0,
+                    stats__average_review_rate__gte=company_rate - 0.5,
+                )
 
         # if request_params.get('recyclables_applications__urgency_type'):
         #     urgency_type = int(request_params.get('recyclables_applications__urgency_type'))
@@ -494,15 +521,10 @@ class EquipmentApplicationsQuerySetMixin:
                 Q(recyclables_id=recyclable_id[0])).filter(
                 ~Q(deal_type=DealType.SELL))
 
-        if not dick.getlist("point", []) and self.get_urgency_type(qs, dick):
+        points = dick.getlist("point", [])
+        if not points:
             return self.get_urgency_type(qs, dick)
 
-        if dick.getlist("point", []):
-            if dick.get('urgency_type'):
-                qs = filter_qs_by_coordinates(qs, self.get_urgency_type(qs, dick))
-                return qs
-            else:
-                qs = filter_qs_by_coordinates(qs, dick.getlist("point", []))
-                return qs
-        else:
-            return qs
+        if dick.get('urgency_type'):
+            qs = self.get_urgency_type(qs, dick)
+        return filter_qs_by_coordinates(qs, points)
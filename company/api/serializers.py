@@ -3,6 +3,7 @@ from django.db.models import Q
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 
+from common.cache import bump_model_version
 from common.serializers import (
     NonNullDynamicFieldsModelSerializer,
     BaseCreateSerializer,
@@ -26,13 +27,18 @@ from company.models import (
     Region, Proposal,
     Subscribe, SubscribesCompanies, EquipmentProposal, District
 )
+from company.services.company_stats import refresh_company_stats
 from exchange.models import (
     ApplicationStatus,
     DealType,
     RecyclablesApplication,
     UrgencyType, ImageModel, EquipmentApplication, DealStatus, ContractsStatisticsMark,
+    DailyExchangeVolume,
 )
+from exchange.order_book import order_book
+from exchange.services import invalidate_companies_offers
 from exchange.signals import create_supply_contract, create_ready_for_shipment_contract, update_supply_contract
+from product.models import RecyclableMarketSummary
 from product.api.serializers import RecyclablesSerializer, EquipmentSerializer, RecyclablesShortSerializerForMainFilter
 from user.models import UserRole, User
 
@@ -253,24 +259,25 @@ class BulkCreateCompanyRecyclablesSerializer(BulkCreateListSerializer):
                 #     is_deleted=item["deleted"]
                 # )
 
-                to_create.append(
-                    RecyclablesApplication(
-                        recyclables=item["recyclables"],
-                        company=company,
-                        status=status,
-                        urgency_type=UrgencyType.SUPPLY_CONTRACT,
-                        deal_type=deal_type,
-                        volume=item["monthly_volume"],
-                        price=item["price"],
-                        with_nds=company.with_nds,
-                        city_id=company.city_id,
-                        address=company.address,
-                        latitude=company.latitude,
-                        longitude=company.longitude,
-                        application_recyclable_status=item["application_recyclable_status"],
-                        is_deleted=item["deleted"]
-                    )
+                application = RecyclablesApplication(
+                    recyclables=item["recyclables"],
+                    company=company,
+                    status=status,
+                    urgency_type=UrgencyType.SUPPLY_CONTRACT,
+                    deal_type=deal_type,
+                    volume=item["monthly_volume"],
+                    price=item["price"],
+                    with_nds=company.with_nds,
+                    city_id=company.city_id,
+                    address=company.address,
+                    latitude=company.latitude,
+                    longitude=company.longitude,
+                    application_recyclable_status=item["application_recyclable_status"],
+                    is_deleted=item["deleted"]
                 )
+                # bulk_create не вызывает save(), поэтому общий вес проставляется явно
+                application.total_weight = RecyclablesApplication.get_total_weight(application)
+                to_create.append(application)
 
                 # new_statistics = ContractsStatisticsMark.objects.create(
                 #     company_id=current_company.id,
@@ -291,6 +298,19 @@ class BulkCreateCompanyRecyclablesSerializer(BulkCreateListSerializer):
                 #                                        )
 
             RecyclablesApplication.objects.bulk_create(to_create)
+            # bulk_create не отправляет post_save, книгу заявок нужно перечитать
+            created_recyclables_ids = {item.recyclables_id for item in to_create}
+            for recyclables_id in created_recyclables_ids:
+                order_book.invalidate(recyclables_id, UrgencyType.SUPPLY_CONTRACT)
+                invalidate_companies_offers(recyclables_id)
+            RecyclableMarketSummary.objects.refresh(created_recyclables_ids)
+            DailyExchangeVolume.objects.add(
+                RecyclablesApplication.objects.filter(
+                    pk__in=[item.pk for item in to_create]
+                ).exchange_volume_rows()
+            )
+            bump_model_version(RecyclablesApplication)
+            refresh_company_stats({item.company_id for item in to_create})
 
             for item in not_exist:  # validated_data:
 
@@ -449,53 +469,47 @@ class ManagerSerializer(NonNullDynamicFieldsModelSerializer):
         fields = ("id", "first_name", "last_name", "middle_name")
 
 
-class ListCompanySerializer(NonNullDynamicFieldsModelSerializer):
-    manager = ManagerSerializer()
-    activities = serializers.SerializerMethodField()
-    recyclables_type = serializers.SerializerMethodField()
-    recyclables_count = serializers.IntegerField(read_only=True)
-    #recyclables_count = serializers.SerializerMethodField(read_only=True)
-    recyclables = CompanyRecyclablesSerializer(many=True)
-    application_types = serializers.SerializerMethodField()
-    city = CitySerializer()
-    reviews_count = serializers.SerializerMethodField(read_only=True)
-    deals_count = serializers.SerializerMethodField(read_only=True)
-    average_review_rate = serializers.SerializerMethodField(read_only=True)
-    is_favorite = serializers.BooleanField(
-        read_only=True, required=False, default=False
-    )
+class CompanyListProjectionMixin:
+    """
+    Reads values annotated by company.services.company_list.annotate_company_list,
+    falls back to queries when the company is serialized without them
+    """
 
-    class Meta:
-        model = Company
+    @staticmethod
+    def get_annotated(instance: Company, name, default):
+        if hasattr(instance, name):
+            return getattr(instance, name)
+        return default()
 
     def get_activities(self, obj):
-        # FIXME: оптимизировать по запросам в БД
-        activity_types = obj.activity_types.values_list(
-            "activity", flat=True
-        ).distinct()
-        return [ActivityType(item).label for item in activity_types]
+        activity_types = self.get_annotated(
+            obj,
+            "activity_values",
+            lambda: obj.activity_types.values_list("activity", flat=True).distinct(),
+        )
+        return [ActivityType(item).label for item in activity_types or []]
 
     def get_application_types(self, obj):
-        # FIXME: оптимизировать по запросам в БД
-        application_types = obj.recyclables.values_list(
-            "action", flat=True
-        ).distinct()
+        application_types = self.get_annotated(
+            obj,
+            "application_type_values",
+            lambda: obj.recyclables.values_list("action", flat=True).distinct(),
+        )
         return [
             CompanyRecyclablesActionType(item).label
-            for item in application_types
+            for item in application_types or []
         ]
 
     def get_recyclables_type(self, obj):
-        # FIXME: оптимизировать по запросам в БД
-        company_recyclables = obj.recyclables.select_related(
-            "recyclables"
-        ).first()
-        if company_recyclables:
-            return company_recyclables.recyclables.name
-        return None
+        def get_first_recyclables_name():
+            company_recyclables = obj.recyclables.select_related(
+                "recyclables"
+            ).first()
+            if company_recyclables:
+                return company_recyclables.recyclables.name
+            return None
 
-    # def get_recyclables_count(self, instance: Company):
-    #     return instance.recyclables.count()
+        return self.get_annotated(obj, "recyclables_type", get_first_recyclables_name)
 
     def get_recyclables_count(self, obj):
         if obj.recyclables_count > 0:
@@ -503,24 +517,50 @@ class ListCompanySerializer(NonNullDynamicFieldsModelSerializer):
         return obj.recyclables_count
 
     def get_reviews_count(self, instance: Company):
-        return instance.review_set.count()
+        return self.get_annotated(
+            instance, "reviews_count", lambda: instance.review_set.count()
+        )
 
-    # FIXME: сделать через аннотацию
     def get_deals_count(self, instance: Company):
-        return (
-                instance.recyclables_sell_deals.count()
-                + instance.recyclables_buy_deals.count()
-                + instance.equipment_buy_deals.count()
-                + instance.equipment_sell_deals.count()
+        return self.get_annotated(
+            instance,
+            "deals_count",
+            lambda: (
+                    instance.recyclables_sell_deals.count()
+                    + instance.recyclables_buy_deals.count()
+                    + instance.equipment_buy_deals.count()
+                    + instance.equipment_sell_deals.count()
+            ),
         )
 
     def get_average_review_rate(self, instance: Company):
-        return (
-                instance.review_set.aggregate(models.Avg("rate"))["rate__avg"]
-                or 0.0
+        return self.get_annotated(
+            instance,
+            "average_review_rate",
+            lambda: instance.review_set.aggregate(models.Avg("rate"))["rate__avg"] or 0.0,
         )
 
 
+class ListCompanySerializer(CompanyListProjectionMixin, NonNullDynamicFieldsModelSerializer):
+    manager = ManagerSerializer()
+    activities = serializers.SerializerMethodField()
+    recyclables_type = serializers.SerializerMethodField()
+    recyclables_count = serializers.IntegerField(read_only=True)
+    #recyclables_count = serializers.SerializerMethodField(read_only=True)
+    recyclables = CompanyRecyclablesSerializer(many=True)
+    application_types = serializers.SerializerMethodField()
+    city = CitySerializer()
+    reviews_count = serializers.SerializerMethodField(read_only=True)
+    deals_count = serializers.SerializerMethodField(read_only=True)
+    average_review_rate = serializers.SerializerMethodField(read_only=True)
+    is_favorite = serializers.BooleanField(
+        read_only=True, required=False, default=False
+    )
+
+    class Meta:
+        model = Company
+
+
 # class CompanyRecyclablesForCompaniesMainFiltersPageSerializer(NonNullDynamicFieldsModelSerializer):
 #     recyclables = RecyclablesShortSerializerForMainFilter()
 #
@@ -529,7 +569,7 @@ class ListCompanySerializer(NonNullDynamicFieldsModelSerializer):
 #         exclude = ("created_at", "action", "company")
 
 
-class CompaniesListForMainFilterSerializer(NonNullDynamicFieldsModelSerializer):
+class CompaniesListForMainFilterSerializer(CompanyListProjectionMixin, NonNullDynamicFieldsModelSerializer):
     activities = serializers.SerializerMethodField()
     recyclables_type = serializers.SerializerMethodField()
     recyclables_count = serializers.IntegerField(read_only=True)
@@ -553,79 +593,46 @@ class CompaniesListForMainFilterSerializer(NonNullDynamicFieldsModelSerializer):
         exclude = ("bank_name", "correction_account", "bic", "description", "inn", "phone", "email")
 
     def get_has_supply_contracts(self, obj):
-        app = obj.recyclables_applications.filter(Q(urgency_type=UrgencyType.SUPPLY_CONTRACT))
-        if len(app) > 0:
-            return True
-        else:
-            return False
+        return self.get_annotated(
+            obj,
+            "has_supply_contracts",
+            lambda: obj.recyclables_applications.filter(
+                urgency_type=UrgencyType.SUPPLY_CONTRACT
+            ).exists(),
+        )
 
     def get_has_ready_for_shipment(self, obj):
-        app = obj.recyclables_applications.filter(~Q(urgency_type=UrgencyType.SUPPLY_CONTRACT),
-                                                  Q(status__lte=ApplicationStatus.ON_REVIEW), ~Q(is_deleted=1))
-        if len(app) > 0:
-            return True
-        else:
-            return False
+        return self.get_annotated(
+            obj,
+            "has_ready_for_shipment",
+            lambda: obj.recyclables_applications.filter(
+                ~Q(urgency_type=UrgencyType.SUPPLY_CONTRACT),
+                Q(status__lte=ApplicationStatus.ON_REVIEW),
+                ~Q(is_deleted=1),
+            ).exists(),
+        )
 
     def get_company_volume(self, obj):
-        return sum(obj.recyclables_sell_deals.values_list("weight", flat=True)) + sum(
-            obj.recyclables_buy_deals.values_list("weight", flat=True))
+        return self.get_annotated(
+            obj,
+            "company_volume",
+            lambda: sum(obj.recyclables_sell_deals.values_list("weight", flat=True))
+            + sum(obj.recyclables_buy_deals.values_list("weight", flat=True)),
+        )
 
     def get_company_recyclables(self, obj):
-        return obj.recyclables_applications.values_list("recyclables", flat=True)
+        return self.get_annotated(
+            obj,
+            "company_recyclables",
+            lambda: obj.recyclables_applications.values_list("recyclables", flat=True),
+        ) or []
 
     def get_has_failed_deals(self, obj):
-        buy = obj.recyclables_buy_deals.filter(Q(status__lte=DealStatus.COMPLETED))
-        sell = obj.recyclables_sell_deals.filter(Q(status__lte=DealStatus.COMPLETED))
-        return True if len(buy) > 0 and len(sell) > 0 else False
-
-    def get_activities(self, obj):
-        # FIXME: оптимизировать по запросам в БД
-        activity_types = obj.activity_types.values_list(
-            "activity", flat=True
-        ).distinct()
-        return [ActivityType(item).label for item in activity_types]
-
-    def get_application_types(self, obj):
-        # FIXME: оптимизировать по запросам в БД
-        application_types = obj.recyclables.values_list(
-            "action", flat=True
-        ).distinct()
-        return [
-            CompanyRecyclablesActionType(item).label
-            for item in application_types
-        ]
-
-    def get_recyclables_type(self, obj):
-        # FIXME: оптимизировать по запросам в БД
-        company_recyclables = obj.recyclables.select_related(
-            "recyclables"
-        ).first()
-        if company_recyclables:
-            return company_recyclables.recyclables.name
-        return None
-
-    def get_recyclables_count(self, obj):
-        if obj.recyclables_count > 0:
-            return obj.recyclables_count - 1
-        return obj.recyclables_count
-
-    def get_reviews_count(self, instance: Company):
-        return instance.review_set.count()
-
-    # FIXME: сделать через аннотацию
-    def get_deals_count(self, instance: Company):
-        return (
-                instance.recyclables_sell_deals.count()
-                + instance.recyclables_buy_deals.count()
-                + instance.equipment_buy_deals.count()
-                + instance.equipment_sell_deals.count()
-        )
-
-    def get_average_review_rate(self, instance: Company):
-        return (
-                instance.review_set.aggregate(models.Avg("rate"))["rate__avg"]
-                or 0.0
+        return self.get_annotated(
+            obj,
+            "has_failed_deals",
+            lambda: obj.recyclables_buy_deals.filter(status__lte=DealStatus.COMPLETED).exists()
+            and obj.recyclables_sell_deals.filter(status__lte=DealStatus.COMPLETED).exists(),
         )
 
 
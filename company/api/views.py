@@ -23,7 +23,8 @@ from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.viewsets import GenericViewSet
 from rest_framework_nested.viewsets import NestedViewSetMixin
-from common.filters import FavoriteFilterBackend
+from common.filters import FavoriteFilterBackend, FullTextSearchFilter
+from common.pagination import PageSizeOrKeysetPagination
 from common.permissions import IsOwner
 from common.subscribe_services.create_payment import create_payment
 from common.subscribe_services.payment_acceptance import payment_acceptance
@@ -79,6 +80,7 @@ from company.models import (
     Subscribe, SubscribesCompanies, EquipmentProposal, District
 )
 from company.services.company_data.get_data import get_companies
+from company.services.company_list import annotate_company_list
 from company.signals import change_company_fields
 from exchange.api.serializers import DealReviewSerializer
 from exchange.models import Review, RecyclablesApplication
@@ -115,14 +117,19 @@ class CompanyViewSet(
     default_serializer_class = CreateCompanySerializer
     yasg_parser_classes = [CamelCaseFormParser, CamelCaseMultiPartParser]
     filter_backends = (
-        filters.SearchFilter,
+        FullTextSearchFilter,
         filters.OrderingFilter,
         DjangoFilterBackend,
         FavoriteFilterBackend,
     )
 
     search_fields = ("name", "inn")
+    search_vector_fields = ("search_vector",)
+    search_trigram_fields = ("name",)
+    search_inn_fields = ("inn",)
     ordering_fields = "__all__"
+    pagination_class = PageSizeOrKeysetPagination
+    keyset_ordering_fields = ("created_at", "name")
     filterset_fields = {
         # "activity_types": ["exact"],
         "activity_types__rec_col_types": ["exact"],
@@ -191,6 +198,9 @@ class CompanyViewSet(
                 return qs
             else:
                 return qs.none()
+        if self.action == "list":
+            # Все данные ListCompanySerializer одним запросом, см. annotate_company_list
+            qs = annotate_company_list(qs.prefetch_related(None))
         return qs.distinct()
 
     @swagger_auto_schema(
@@ -430,18 +440,13 @@ class CompanyViewSet(
 
     @action(methods=["GET"], detail=False)
     def companies_with_applications_for_main_filter(self, request, *args, **kwargs):
-        filter_query = self.filter_queryset(self.get_queryset().select_related("city")
-                                            .prefetch_related(
-            "documents",
-            "recyclables",
-            "contacts",
-            "activity_types",
-            "review_set",
-            "city__region",
-            "city__region__district",
+        filter_query = self.filter_queryset(
+            annotate_company_list(
+                self.get_queryset().prefetch_related(None), main_filter=True
+            )
+            .annotate(recyclables_count=Count("recyclables"))
+            .annotate(monthly_volume=models.Sum("recyclables__monthly_volume"))
         )
-                                            .annotate(recyclables_count=Count("recyclables"))
-                                            .annotate(monthly_volume=models.Sum("recyclables__monthly_volume")))
         filter_query = self.query_filters(filter_query, request.query_params)
         # filter_query = filter_query.filter(company_recyclables__contains=recyclable)
 
@@ -0,0 +1,218 @@
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from common.cache import get_model_versions
+from company.models import City
+
+EARTH_RADIUS_KM = 6371.0
+LEAF_SIZE = 16
+# Как часто проверяется версия городов,
+# изменения видны другим процессам с этой задержкой
+VERSION_CHECK_INTERVAL = 5
+
+
+def to_unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """
+    Points on the unit sphere, the euclidean (chord) distance between them
+    is monotonic in the great circle distance
+    """
+    latitudes = np.radians(np.asarray(latitudes, dtype=float))
+    longitudes = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack(
+        (
+            np.cos(latitudes) * np.cos(longitudes),
+            np.cos(latitudes) * np.sin(longitudes),
+            np.sin(latitudes),
+        )
+    )
+
+
+def chord_to_km(chord):
+    return (
+        2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0))
+    )
+
+
+def km_to_chord(distance_km: float) -> float:
+    return 2 * np.sin(min(distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class KDTree:
+    """
+    Static balanced k-d tree over rows of `points`.
+    Node [lo, hi) of `order` is split at its median by axis depth % k,
+    ranges of at most LEAF_SIZE points are scanned with numpy
+    """
+
+    def __init__(self, points: np.ndarray):
+        self.points = np.asarray(points, dtype=float)
+        self.order = np.arange(len(self.points))
+        self.k = self.points.shape[1] if self.points.ndim == 2 else 0
+        stack = [(0, len(self.points), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                continue
+            axis = depth % self.k
+            mid = (lo + hi) // 2
+            indexes = self.order[lo:hi]
+            partition = np.argpartition(self.points[indexes, axis], mid - lo)
+            self.order[lo:hi] = indexes[partition]
+            stack.append((lo, mid, depth + 1))
+            stack.append((mid + 1, hi, depth + 1))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _traverse(self, point: np.ndarray, get_bound, visit_leaf):
+        """
+        Depth first traversal visiting the nearer side first,
+        the farther side is skipped when the splitting plane
+        is farther than get_bound()
+        """
+        stack = [(0, len(self.points), 0, 0.0)]
+        while stack:
+            lo, hi, depth, plane_distance = stack.pop()
+            if plane_distance > get_bound():
+                continue
+            if hi - lo <= LEAF_SIZE:
+                visit_leaf(self.order[lo:hi])
+                continue
+            axis = depth % self.k
+            mid = (lo + hi) // 2
+            visit_leaf(self.order[mid : mid + 1])
+            diff = point[axis] - self.points[self.order[mid], axis]
+            near, far = (
+                ((lo, mid), (mid + 1, hi))
+                if diff < 0
+                else ((mid + 1, hi), (lo, mid))
+            )
+            stack.append((*far, depth + 1, diff * diff))
+            stack.append((*near, depth + 1, plane_distance))
+
+    def nearest(self, point) -> Tuple[Optional[int], float]:
+        """
+        Index of the nearest point and the squared distance to it
+        """
+        point = np.asarray(point, dtype=float)
+        best = [None, np.inf]
+
+        def visit_leaf(indexes):
+            distances = ((self.points[indexes] - point) ** 2).sum(axis=1)
+            position = int(distances.argmin())
+            if distances[position] < best[1]:
+                best[0], best[1] = int(indexes[position]), float(
+                    distances[position]
+                )
+
+        if len(self.points):
+            self._traverse(point, lambda: best[1], visit_leaf)
+        return best[0], best[1]
+
+    def within(self, point, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Indexes of the points within `radius` and the squared distances to them
+        """
+        point = np.asarray(point, dtype=float)
+        squared_radius = radius * radius
+        found_indexes, found_distances = [], []
+
+        def visit_leaf(indexes):
+            distances = ((self.points[indexes] - point) ** 2).sum(axis=1)
+            mask = distances <= squared_radius
+            found_indexes.append(indexes[mask])
+            found_distances.append(distances[mask])
+
+        if len(self.points):
+            self._traverse(point, lambda: squared_radius, visit_leaf)
+        if not found_indexes:
+            return np.array([], dtype=int), np.array([])
+        return np.concatenate(found_indexes), np.concatenate(found_distances)
+
+
+class CityIndex:
+    """
+    In-process spatial index of cities with coordinates.
+    Rebuilt when the City version is bumped, see company.receivers
+    """
+
+    def __init__(self):
+        self._tree: Optional[KDTree] = None
+        self._city_ids = np.array([], dtype=int)
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _get_tree(self) -> KDTree:
+        if (
+            self._tree is not None
+            and time.monotonic() - self._checked_at < VERSION_CHECK_INTERVAL
+        ):
+            return self._tree
+        with self._lock:
+            version = get_model_versions([City])
+            if self._tree is None or version != self._version:
+                self._build()
+                self._version = version
+            self._checked_at = time.monotonic()
+            return self._tree
+
+    def _build(self):
+        rows = City.objects.filter(
+            latitude__isnull=False, longitude__isnull=False
+        ).values_list("pk", "latitude", "longitude")
+        city_ids, latitudes, longitudes = zip(*rows) if rows else ((), (), ())
+        self._city_ids = np.array(city_ids, dtype=int)
+        self._tree = KDTree(
+            to_unit_vectors(latitudes, longitudes).reshape(-1, 3)
+        )
+
+    def reset(self):
+        with self._lock:
+            self._tree = None
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        max_distance_km: Optional[float] = None,
+    ) -> Optional[Tuple[int, float]]:
+        """
+        Id of the nearest known city and the distance to it in km
+        """
+        tree = self._get_tree()
+        index, squared_distance = tree.nearest(
+            to_unit_vectors([latitude], [longitude])[0]
+        )
+        if index is None:
+            return None
+        distance = float(chord_to_km(np.sqrt(squared_distance)))
+        if max_distance_km is not None and distance > max_distance_km:
+            return None
+        return int(self._city_ids[index]), distance
+
+    def within(
+        self, latitude: float, longitude: float, radius_km: float
+    ) -> List[Tuple[int, float]]:
+        """
+        Ids of cities within `radius_km` with distances, nearest first
+        """
+        tree = self._get_tree()
+        indexes, squared_distances = tree.within(
+            to_unit_vectors([latitude], [longitude])[0], km_to_chord(radius_km)
+        )
+        distances = chord_to_km(np.sqrt(squared_distances))
+        ordering = np.argsort(distances)
+        return [
+            (
+                int(self._city_ids[indexes[position]]),
+                float(distances[position]),
+            )
+            for position in ordering
+        ]
+
+
+city_index = CityIndex()
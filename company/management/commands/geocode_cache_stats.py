@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from services.geocode_cache import get_metrics
+
+
+class Command(BaseCommand):
+    help = "Выводит процент попаданий кэша геокодера и среднее время запросов к геокодеру"
+
+    def handle(self, *args, **options):
+        metrics = get_metrics()
+        hits = metrics["memory_hit"] + metrics["db_hit"]
+        total = hits + metrics["miss"]
+        hit_rate = hits / total * 100 if total else 0
+        requests = metrics["upstream_requests"]
+        average_ms = metrics["upstream_ms"] / requests if requests else 0
+        self.stdout.write(
+            f"memory_hit={metrics['memory_hit']} db_hit={metrics['db_hit']} "
+            f"miss={metrics['miss']} hit_rate={hit_rate:.1f}%"
+        )
+        self.stdout.write(
+            f"upstream_requests={requests} upstream_average_ms={average_ms:.1f}"
+        )
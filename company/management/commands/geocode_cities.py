@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from company.models import City
+from config.settings import YANDEX_GEOCODER_API_KEY
+from services.distances import fill_city_coordinates
+from services.yandex_geo import YandexGeocoderClient
+
+
+class Command(BaseCommand):
+    help = "Определяет координаты городов, у которых их нет, для расчета расстояний"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=1000,
+            help="Максимум городов за запуск",
+        )
+
+    def handle(self, *args, **options):
+        geocoder_client = YandexGeocoderClient(YANDEX_GEOCODER_API_KEY)
+
+        def resolve_coordinates(city):
+            address_data = geocoder_client.get_coordinates_from_city(city)
+            return address_data.latitude, address_data.longitude
+
+        cities = City.objects.filter(
+            Q(latitude__isnull=True) | Q(longitude__isnull=True)
+        ).order_by("pk")[: options["limit"]]
+        resolved = fill_city_coordinates(cities, resolve_coordinates)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Городов с найденными координатами: {len(resolved)}"
+            )
+        )
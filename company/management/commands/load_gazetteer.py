@@ -0,0 +1,112 @@
+import csv
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from common.cache import bump_model_version
+from company.models import City, District, Region
+
+
+def get_ids_by_name(model, names, defaults=None):
+    """
+    Ids of the objects by names, missing objects are created in bulk.
+    Names are not unique, the object with the smallest id is used
+    """
+    ids = {}
+    for pk, name in model.objects.filter(name__in=names).order_by("-pk").values_list("pk", "name"):
+        ids[name] = pk
+    created = model.objects.bulk_create(
+        [model(name=name, **(defaults or {}).get(name, {})) for name in set(names) - ids.keys()]
+    )
+    ids.update((obj.name, obj.pk) for obj in created)
+    return ids
+
+
+class Command(BaseCommand):
+    help = (
+        "Загружает координаты городов, их регионы и округа из CSV справочника "
+        "с колонками name, region, district, latitude, longitude"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к CSV файлу")
+        parser.add_argument("--delimiter", default=",")
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Перезаписывать уже заполненные координаты и регионы",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["path"], encoding="utf-8") as file:
+                rows = [
+                    row for row in csv.DictReader(file, delimiter=options["delimiter"])
+                    if row.get("name") and row.get("latitude") and row.get("longitude")
+                ]
+        except OSError as e:
+            raise CommandError(e)
+
+        with transaction.atomic():
+            created, updated = self.load(rows, options["overwrite"])
+            transaction.on_commit(lambda: bump_model_version(City))
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Городов создано: {created}, обновлено: {updated}")
+        )
+
+    def load(self, rows, overwrite):
+        district_ids = get_ids_by_name(
+            District, {row["district"] for row in rows if row.get("district")}
+        )
+        region_districts = {
+            row["region"]: district_ids.get(row.get("district"))
+            for row in rows if row.get("region")
+        }
+        region_ids = get_ids_by_name(
+            Region,
+            set(region_districts),
+            defaults={name: {"district_id": pk} for name, pk in region_districts.items()},
+        )
+        regions = Region.objects.filter(pk__in=region_ids.values(), district__isnull=True)
+        for region in regions:
+            region.district_id = region_districts[region.name]
+        Region.objects.bulk_update(regions, ["district"])
+
+        # Город без региона в базе подходит к строке с любым регионом,
+        # строка без региона подходит к городу с любым регионом
+        cities, cities_by_name = {}, {}
+        for city in City.objects.filter(name__in={row["name"] for row in rows}).order_by("-pk"):
+            cities[(city.name, city.region_id)] = city
+            cities_by_name[city.name] = city
+
+        to_create, to_update = [], {}
+        for row in rows:
+            region_id = region_ids.get(row.get("region"))
+            latitude, longitude = Decimal(row["latitude"]), Decimal(row["longitude"])
+            city = cities.get((row["name"], region_id)) or cities.get((row["name"], None))
+            if city is None and region_id is None:
+                city = cities_by_name.get(row["name"])
+            if city is None:
+                city = City(
+                    name=row["name"], region_id=region_id, latitude=latitude, longitude=longitude
+                )
+                cities[(city.name, region_id)] = city
+                cities_by_name.setdefault(city.name, city)
+                to_create.append(city)
+                continue
+            if city.pk is None:
+                continue
+            if overwrite or city.latitude is None or city.longitude is None:
+                city.latitude, city.longitude = latitude, longitude
+                to_update[city.pk] = city
+            if region_id and (overwrite or city.region_id is None):
+                city.region_id = region_id
+                to_update[city.pk] = city
+
+        City.objects.bulk_create(to_create, batch_size=1000)
+        City.objects.bulk_update(
+            to_update.values(), ["latitude", "longitude", "region"], batch_size=1000
+        )
+        return len(to_create), len(to_update)
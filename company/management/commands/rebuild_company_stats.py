@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from company.models import CompanyStats
+from company.services.company_stats import refresh_company_stats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает статистику компаний для фильтров"
+
+    def handle(self, *args, **options):
+        refresh_company_stats()
+        self.stdout.write(
+            self.style.SUCCESS(f"Компаний: {CompanyStats.objects.count()}")
+        )
@@ -0,0 +1,45 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+from common.search import build_search_vector
+
+
+def fill_search_vector(apps, schema_editor):
+    Company = apps.get_model("company", "Company")
+    Company.objects.update(
+        search_vector=build_search_vector(
+            (
+                ("name", "A", "russian"),
+                ("inn", "A", "simple"),
+                ("address", "C", "russian"),
+                ("description", "D", "russian"),
+            )
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0025_alter_company_payment_account'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='company',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='companies_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='company',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='companies_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+    ]
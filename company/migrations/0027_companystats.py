@@ -0,0 +1,33 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0026_company_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompanyStats',
+            fields=[
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='company.company', verbose_name='Компания')),
+                ('deals_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Количество сделок')),
+                ('failed_deals_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Количество проблемных и отмененных сделок')),
+                ('supply_contract_volume', models.FloatField(db_index=True, default=0, verbose_name='Объем контрактов на поставку')),
+                ('reviews_count', models.PositiveIntegerField(default=0, verbose_name='Количество отзывов')),
+                ('average_review_rate', models.FloatField(db_index=True, default=0, verbose_name='Средняя оценка')),
+                ('has_ready_for_shipment', models.BooleanField(db_index=True, default=False, verbose_name='Есть заявки готово к отгрузке')),
+                ('has_supply_contract', models.BooleanField(db_index=True, default=False, verbose_name='Есть контракты на поставку')),
+                ('has_buy_applications', models.BooleanField(db_index=True, default=False, verbose_name='Есть заявки на покупку')),
+                ('has_sell_applications', models.BooleanField(db_index=True, default=False, verbose_name='Есть заявки на продажу')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Статистика компании',
+                'verbose_name_plural': 'Статистика компаний',
+                'db_table': 'company_stats',
+            },
+        ),
+    ]
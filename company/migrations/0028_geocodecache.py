@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0027_companystats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeocodeCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('address', models.CharField(max_length=1024, verbose_name='Нормализованный адрес')),
+                ('results', models.PositiveSmallIntegerField(verbose_name='Количество адресов')),
+                ('addresses', models.JSONField(default=list, verbose_name='Адреса')),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'Ответ геокодера',
+                'verbose_name_plural': 'Кэш геокодера',
+                'db_table': 'geocode_cache',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='geocodecache',
+            constraint=models.UniqueConstraint(fields=('address', 'results'), name='unique_geocode_cache_address'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# Начальное заполнение CompanyStats, повторяет
+# company.services.company_stats.refresh_company_stats:
+# сделки до закрытия включительно (статус <= 6), проблемные и отмененные (>= 7),
+# контракты на поставку - urgency_type 2, готово к отгрузке - 1,
+# покупка - deal_type 1, продажа - 2
+FILL_COMPANY_STATS_SQL = """
+INSERT INTO company_stats (
+    company_id, deals_count, failed_deals_count, supply_contract_volume,
+    reviews_count, average_review_rate, has_ready_for_shipment,
+    has_supply_contract, has_buy_applications, has_sell_applications,
+    updated_at
+)
+SELECT
+    companies.id,
+    COALESCE(deals.deals_count, 0),
+    COALESCE(deals.failed_deals_count, 0),
+    COALESCE(applications.supply_contract_volume, 0),
+    COALESCE(reviews.reviews_count, 0),
+    COALESCE(reviews.average_review_rate, 0),
+    COALESCE(applications.has_ready_for_shipment, FALSE),
+    COALESCE(applications.has_supply_contract, FALSE),
+    COALESCE(applications.has_buy_applications, FALSE),
+    COALESCE(applications.has_sell_applications, FALSE),
+    NOW()
+FROM companies
+LEFT JOIN (
+    SELECT
+        company_id,
+        COUNT(*) FILTER (WHERE status <= 6) AS deals_count,
+        COUNT(*) FILTER (WHERE status >= 7) AS failed_deals_count
+    FROM (
+        SELECT supplier_company_id AS company_id, status FROM recyclables_deals
+        UNION ALL
+        SELECT buyer_company_id, status FROM recyclables_deals
+    ) AS sides
+    GROUP BY company_id
+) AS deals ON deals.company_id = companies.id
+LEFT JOIN (
+    SELECT
+        company_id,
+        SUM(volume) FILTER (WHERE urgency_type = 2) AS supply_contract_volume,
+        BOOL_OR(urgency_type = 1) AS has_ready_for_shipment,
+        BOOL_OR(urgency_type = 2) AS has_supply_contract,
+        BOOL_OR(deal_type = 1) AS has_buy_applications,
+        BOOL_OR(deal_type = 2) AS has_sell_applications
+    FROM recyclables_applications
+    GROUP BY company_id
+) AS applications ON applications.company_id = companies.id
+LEFT JOIN (
+    SELECT company_id, COUNT(*) AS reviews_count, AVG(rate) AS average_review_rate
+    FROM reviews
+    GROUP BY company_id
+) AS reviews ON reviews.company_id = companies.id
+ON CONFLICT (company_id) DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0039_pricequantilesketch'),
+        ('company', '0029_name_upper_trgm_idx'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FILL_COMPANY_STATS_SQL, migrations.RunSQL.noop),
+    ]
@@ -3,7 +3,9 @@ import uuid
 from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models.functions import Upper
 from django.urls import reverse
 from model_utils import FieldTracker
 from phonenumber_field.modelfields import PhoneNumberField
@@ -19,6 +21,7 @@ from common.models import (
     BaseNameDescModel,
     BaseNameModel,
     AddressFieldsModelMixin,
+    SearchVectorModelMixin,
 )
 from common.utils import get_current_user_id
 from company.signals import verification_status_changed
@@ -77,6 +80,27 @@ class City(BaseNameModel):
         db_table = "cities"
 
 
+class GeocodeCache(models.Model):
+    """
+    Persistent level of the geocoder cache, see services.geocode_cache
+    """
+
+    address = models.CharField("Нормализованный адрес", max_length=1024)
+    results = models.PositiveSmallIntegerField("Количество адресов")
+    addresses = models.JSONField("Адреса", default=list)
+    updated_at = models.DateTimeField("Дата обновления", auto_now=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Ответ геокодера"
+        verbose_name_plural = "Кэш геокодера"
+        db_table = "geocode_cache"
+        constraints = [
+            models.UniqueConstraint(
+                fields=("address", "results"), name="unique_geocode_cache_address"
+            ),
+        ]
+
+
 class CompanyStatus(models.IntegerChoices):
     NOT_VERIFIED = 1, "Не проверенная"
     VERIFIED = 2, "Проверенная"
@@ -85,7 +109,14 @@ class CompanyStatus(models.IntegerChoices):
     FOR_DELETE = 5, "На удаление"
 
 
-class Company(AddressFieldsModelMixin, BaseNameDescModel):
+class Company(AddressFieldsModelMixin, SearchVectorModelMixin, BaseNameDescModel):
+    SEARCH_VECTOR_FIELDS = (
+        ("name", "A", "russian"),
+        ("inn", "A", "simple"),
+        ("address", "C", "russian"),
+        ("description", "D", "russian"),
+    )
+
     # Main
     image = models.ImageField(
         "Фото/логотип", upload_to=company_storage, null=True, blank=True
@@ -161,6 +192,57 @@ class Company(AddressFieldsModelMixin, BaseNameDescModel):
         verbose_name = "Компания"
         verbose_name_plural = "Компании"
         db_table = "companies"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="companies_search_vector_idx"),
+            GinIndex(fields=["name"], name="companies_name_trgm_idx", opclasses=["gin_trgm_ops"]),
+            # Для icontains (UPPER(name) LIKE UPPER(...)) в поиске
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="companies_upper_trgm_idx",
+            ),
+        ]
+
+
+class CompanyStats(models.Model):
+    """
+    Aggregated deals, applications and reviews data of company
+    used by companies filters, see company.services.company_stats
+    """
+
+    company = models.OneToOneField(
+        "company.Company",
+        verbose_name="Компания",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+    )
+    deals_count = models.PositiveIntegerField("Количество сделок", default=0, db_index=True)
+    failed_deals_count = models.PositiveIntegerField(
+        "Количество проблемных и отмененных сделок", default=0, db_index=True
+    )
+    supply_contract_volume = models.FloatField(
+        "Объем контрактов на поставку", default=0, db_index=True
+    )
+    reviews_count = models.PositiveIntegerField("Количество отзывов", default=0)
+    average_review_rate = models.FloatField("Средняя оценка", default=0, db_index=True)
+    has_ready_for_shipment = models.BooleanField(
+        "Есть заявки готово к отгрузке", default=False, db_index=True
+    )
+    has_supply_contract = models.BooleanField(
+        "Есть контракты на поставку", default=False, db_index=True
+    )
+    has_buy_applications = models.BooleanField(
+        "Есть заявки на покупку", default=False, db_index=True
+    )
+    has_sell_applications = models.BooleanField(
+        "Есть заявки на продажу", default=False, db_index=True
+    )
+    updated_at = models.DateTimeField("Дата обновления", auto_now=True)
+
+    class Meta:
+        verbose_name = "Статистика компании"
+        verbose_name_plural = "Статистика компаний"
+        db_table = "company_stats"
 
 
 class CompanyDocumentType(models.IntegerChoices):
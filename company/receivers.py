@@ -0,0 +1,52 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from common.cache import bump_model_version
+from common.search import update_search_vector
+from company.models import City, Company
+from company.services.company_stats import refresh_company_stats
+from exchange.models import RecyclablesApplication, RecyclablesDeal, Review
+
+
+@receiver(post_save, sender=Company)
+def update_company_search_vector(sender, instance, update_fields=None, **kwargs):
+    update_search_vector(instance, update_fields)
+
+
+@receiver([post_save, post_delete], sender=Company)
+def bump_company_response_cache_version(sender, **kwargs):
+    transaction.on_commit(partial(bump_model_version, sender))
+
+
+@receiver([post_save, post_delete], sender=City)
+def bump_city_version(sender, **kwargs):
+    # Пространственный индекс городов перестраивается по версии, см. company.city_index
+    transaction.on_commit(partial(bump_model_version, sender))
+
+
+# Статистика компаний пересчитывается после фиксации транзакции
+# только для компаний, затронутых изменением
+
+@receiver(post_save, sender=Company)
+def create_company_stats(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(refresh_company_stats, [instance.pk]))
+
+
+@receiver([post_save, post_delete], sender=RecyclablesDeal)
+def refresh_deal_companies_stats(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(
+            refresh_company_stats,
+            [instance.supplier_company_id, instance.buyer_company_id],
+        )
+    )
+
+
+@receiver([post_save, post_delete], sender=RecyclablesApplication)
+@receiver([post_save, post_delete], sender=Review)
+def refresh_company_stats_on_change(sender, instance, **kwargs):
+    transaction.on_commit(partial(refresh_company_stats, [instance.company_id]))
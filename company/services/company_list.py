@@ -0,0 +1,134 @@
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import (
+    Avg,
+    BooleanField,
+    Count,
+    Exists,
+    ExpressionWrapper,
+    FloatField,
+    IntegerField,
+    OuterRef,
+    Prefetch,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+
+from company.models import CompanyActivityType, CompanyRecyclables
+from exchange.models import (
+    ApplicationStatus,
+    DealStatus,
+    EquipmentDeal,
+    RecyclablesApplication,
+    RecyclablesDeal,
+    Review,
+    UrgencyType,
+)
+
+
+def aggregate_subquery(queryset, company_field, aggregate, output_field):
+    """
+    Aggregate of the company related rows as a correlated subquery,
+    so annotations of different relations do not multiply each other
+    """
+    return Subquery(
+        queryset.filter(**{company_field: OuterRef("pk")})
+        .order_by()
+        .values(company_field)
+        .annotate(value=aggregate)
+        .values("value"),
+        output_field=output_field,
+    )
+
+
+def count_subquery(queryset, company_field):
+    return Coalesce(
+        aggregate_subquery(queryset, company_field, Count("pk"), IntegerField()),
+        Value(0),
+    )
+
+
+def annotate_company_list(queryset, main_filter=False):
+    """
+    Annotates everything ListCompanySerializer (and CompaniesListForMainFilterSerializer
+    if main_filter is passed) needs, so a page of companies is serialized
+    with a constant number of queries
+    """
+    queryset = queryset.select_related("city__region", "manager").prefetch_related(
+        Prefetch(
+            "recyclables",
+            queryset=CompanyRecyclables.objects.select_related("recyclables__category"),
+        )
+    ).annotate(
+        activity_values=aggregate_subquery(
+            CompanyActivityType.objects.all(),
+            "company",
+            ArrayAgg("activity", distinct=True),
+            ArrayField(IntegerField()),
+        ),
+        application_type_values=aggregate_subquery(
+            CompanyRecyclables.objects.all(),
+            "company",
+            ArrayAgg("action", distinct=True),
+            ArrayField(IntegerField()),
+        ),
+        recyclables_type=Subquery(
+            CompanyRecyclables.objects.filter(company=OuterRef("pk"))
+            .order_by("pk")
+            .values("recyclables__name")[:1]
+        ),
+        reviews_count=count_subquery(Review.objects.all(), "company"),
+        average_review_rate=Coalesce(
+            aggregate_subquery(Review.objects.all(), "company", Avg("rate"), FloatField()),
+            Value(0.0),
+        ),
+        deals_count=(
+            count_subquery(RecyclablesDeal.objects.all(), "supplier_company")
+            + count_subquery(RecyclablesDeal.objects.all(), "buyer_company")
+            + count_subquery(EquipmentDeal.objects.all(), "supplier_company")
+            + count_subquery(EquipmentDeal.objects.all(), "buyer_company")
+        ),
+    )
+    if not main_filter:
+        return queryset
+
+    applications = RecyclablesApplication.objects.filter(company=OuterRef("pk"))
+    not_failed_deals = RecyclablesDeal.objects.filter(status__lte=DealStatus.COMPLETED)
+    return queryset.annotate(
+        has_supply_contracts=Exists(
+            applications.filter(urgency_type=UrgencyType.SUPPLY_CONTRACT)
+        ),
+        has_ready_for_shipment=Exists(
+            applications.filter(
+                ~Q(urgency_type=UrgencyType.SUPPLY_CONTRACT),
+                ~Q(is_deleted=True),
+                status__lte=ApplicationStatus.ON_REVIEW,
+            )
+        ),
+        company_volume=Coalesce(
+            aggregate_subquery(
+                RecyclablesDeal.objects.all(), "supplier_company", Sum("weight"), FloatField()
+            ),
+            Value(0.0),
+        )
+        + Coalesce(
+            aggregate_subquery(
+                RecyclablesDeal.objects.all(), "buyer_company", Sum("weight"), FloatField()
+            ),
+            Value(0.0),
+        ),
+        company_recyclables=aggregate_subquery(
+            RecyclablesApplication.objects.all(),
+            "company",
+            ArrayAgg("recyclables", ordering="pk"),
+            ArrayField(IntegerField()),
+        ),
+        has_failed_deals=ExpressionWrapper(
+            Exists(not_failed_deals.filter(buyer_company=OuterRef("pk")))
+            & Exists(not_failed_deals.filter(supplier_company=OuterRef("pk"))),
+            output_field=BooleanField(),
+        ),
+    )
@@ -0,0 +1,108 @@
+from collections import defaultdict
+from typing import Iterable, Optional
+
+from django.db.models import Avg, Count, Q, Sum
+
+from company.models import Company, CompanyStats
+from exchange.models import (
+    DealStatus,
+    DealType,
+    RecyclablesApplication,
+    RecyclablesDeal,
+    Review,
+    UrgencyType,
+)
+
+STATS_FIELDS = [
+    field.name
+    for field in CompanyStats._meta.concrete_fields
+    if field.name != "company"
+]
+
+
+def refresh_company_stats(company_ids: Optional[Iterable[int]] = None):
+    """
+    Recalculates CompanyStats of the given companies (all if not passed)
+    with a few grouped queries
+    """
+    companies = Company.objects.all()
+    deals = RecyclablesDeal.objects.all()
+    applications = RecyclablesApplication.objects.all()
+    reviews = Review.objects.all()
+    if company_ids is not None:
+        company_ids = {company_id for company_id in company_ids if company_id}
+        if not company_ids:
+            return
+        companies = companies.filter(id__in=company_ids)
+        applications = applications.filter(company_id__in=company_ids)
+        reviews = reviews.filter(company_id__in=company_ids)
+
+    stats = defaultdict(dict)
+    deals_count = defaultdict(int)
+    failed_deals_count = defaultdict(int)
+    for side in ("supplier_company_id", "buyer_company_id"):
+        side_deals = deals
+        if company_ids is not None:
+            side_deals = deals.filter(**{f"{side}__in": company_ids})
+        rows = (
+            side_deals.values(side)
+            .annotate(
+                deals=Count("id", filter=Q(status__lte=DealStatus.COMPLETED)),
+                failed_deals=Count("id", filter=Q(status__gte=DealStatus.PROBLEM)),
+            )
+            .order_by()
+        )
+        for row in rows:
+            deals_count[row[side]] += row["deals"]
+            failed_deals_count[row[side]] += row["failed_deals"]
+
+    rows = (
+        applications.values("company_id")
+        .annotate(
+            supply_contract_volume=Sum(
+                "volume", filter=Q(urgency_type=UrgencyType.SUPPLY_CONTRACT)
+            ),
+            ready_for_shipment=Count(
+                "id", filter=Q(urgency_type=UrgencyType.READY_FOR_SHIPMENT)
+            ),
+            supply_contract=Count("id", filter=Q(urgency_type=UrgencyType.SUPPLY_CONTRACT)),
+            buy=Count("id", filter=Q(deal_type=DealType.BUY)),
+            sell=Count("id", filter=Q(deal_type=DealType.SELL)),
+        )
+        .order_by()
+    )
+    for row in rows:
+        stats[row["company_id"]].update(
+            supply_contract_volume=row["supply_contract_volume"] or 0,
+            has_ready_for_shipment=row["ready_for_shipment"] > 0,
+            has_supply_contract=row["supply_contract"] > 0,
+            has_buy_applications=row["buy"] > 0,
+            has_sell_applications=row["sell"] > 0,
+        )
+
+    rows = (
+        reviews.values("company_id")
+        .annotate(reviews_count=Count("id"), average_review_rate=Avg("rate"))
+        .order_by()
+    )
+    for row in rows:
+        stats[row["company_id"]].update(
+            reviews_count=row["reviews_count"],
+            average_review_rate=row["average_review_rate"] or 0,
+        )
+
+    CompanyStats.objects.bulk_create(
+        [
+            CompanyStats(
+                company_id=company_id,
+                deals_count=deals_count[company_id],
+                failed_deals_count=failed_deals_count[company_id],
+                **stats[company_id],
+            )
+            for company_id in companies.values_list("id", flat=True).iterator()
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=["company"],
+        update_fields=STATS_FIELDS,
+    )
@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from company.models import (
+    ActivityType,
+    Company,
+    CompanyActivityType,
+    CompanyRecyclables,
+)
+from product.models import Recyclables, RecyclablesCategory
+
+
+class CompanyListQueriesTestCase(APITestCase):
+    """
+    Number of queries of the company list does not depend on the page size,
+    see company.services.company_list.annotate_company_list
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recyclables = Recyclables.objects.create(
+            name="Картон",
+            category=RecyclablesCategory.objects.create(name="Бумага"),
+        )
+
+    def create_companies(self, count):
+        for i in range(count):
+            company = Company.objects.create(
+                name=f"Компания {i}",
+                inn=str(Company.objects.count() + 1),
+                phone="+79990000000",
+            )
+            CompanyActivityType.objects.create(
+                company=company, activity=ActivityType.SUPPLIER
+            )
+            CompanyRecyclables.objects.create(
+                company=company,
+                recyclables=self.recyclables,
+                monthly_volume=1000,
+                price=Decimal("10"),
+            )
+
+    def get_list(self, size):
+        response = self.client.get("/api/companies/", {"size": size})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), size)
+
+    def test_constant_queries(self):
+        self.create_companies(100)
+        with CaptureQueriesContext(connection) as queries:
+            self.get_list(10)
+        with self.assertNumQueries(len(queries)):
+            self.get_list(100)
+
+
+class NearestCitiesTestCase(APITestCase):
+    def test_invalid_radius(self):
+        for radius in ("-100", "0", "100000", "abc"):
+            response = self.client.get(
+                "/api/services/nearest_cities",
+                {"lat": 55.75, "lon": 37.62, "radius": radius},
+            )
+            self.assertEqual(response.status_code, 400, radius)
@@ -54,6 +54,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Third party apps
     "django_admin_multiple_choice_list_filter",
     "django_mptt_admin",
@@ -295,6 +296,13 @@ YANDEX_GEOCODER_API_KEY = os.getenv(
     "YANDEX_GEOCODER_API_KEY", "90bf0a8e-8e85-42c9-b8f6-b264cf884460"
 )
 YANDEX_GEOCODER_BASE_URL = "https://geocode-maps.yandex.ru"
+# Geocoder responses cache: in-process LRU size and DB entries lifetime in seconds
+YANDEX_GEOCODER_CACHE_SIZE = int(os.getenv("YANDEX_GEOCODER_CACHE_SIZE", 1024))
+YANDEX_GEOCODER_CACHE_TTL = int(
+    os.getenv("YANDEX_GEOCODER_CACHE_TTL", 30 * 24 * 60 * 60)
+)
+# Points farther than this from any known city are not assigned to a city
+CITY_INDEX_MAX_DISTANCE_KM = float(os.getenv("CITY_INDEX_MAX_DISTANCE_KM", 30))
 
 # Channels
 # https://channels.readthedocs.io/
@@ -312,6 +320,10 @@ else:
             },
         },
     }
+# Notifications arriving within this delay are sent to the websocket as one frame
+NOTIFICATIONS_WS_COALESCE_DELAY = float(
+    os.getenv("NOTIFICATIONS_WS_COALESCE_DELAY", 0.5)
+)
 
 
 #LOGGING = {
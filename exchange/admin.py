@@ -51,10 +51,6 @@ class RecyclablesApplicationAdmin(BaseModelAdmin):
     ]
     exclude = ["images"]
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.annotate_total_weight()
-
     def total_weight_property(self, obj):
         return obj.total_weight
 
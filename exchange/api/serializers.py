@@ -486,6 +486,22 @@ class RecyclablesDealsForOffers(
     class Meta:
         model = Company
 
+    def get_average_review_rate(self, instance: Company):
+        # Средний рейтинг уже посчитан аннотацией в companies_offers
+        if hasattr(instance, "average_review_rate_for_offers"):
+            return instance.average_review_rate_for_offers or 0.0
+        return super().get_average_review_rate(instance)
+
+    def get_total_applications_count(self, instance: Company):
+        if hasattr(instance, "total_applications_count"):
+            return instance.total_applications_count
+        return super().get_total_applications_count(instance)
+
+    def get_deals_count(self, instance: Company):
+        if hasattr(instance, "deals_count"):
+            return instance.deals_count
+        return super().get_deals_count(instance)
+
 
 class UpdateRecyclablesDealSerializerUsingTransportApplication(
     DynamicFieldsModelSerializer
@@ -735,6 +751,48 @@ class MatchingApplicationSerializer(serializers.Serializer):
             raise ValidationError("Заявки с разной срочностью ")
 
 
+class CrossablePairSerializer(MatchingApplicationSerializer):
+    buying_price = serializers.DecimalField(max_digits=20, decimal_places=2)
+    selling_price = serializers.DecimalField(max_digits=20, decimal_places=2)
+
+
+class OrderBookLevelSerializer(serializers.Serializer):
+    price = serializers.DecimalField(max_digits=20, decimal_places=2)
+    count = serializers.IntegerField()
+    total_weight = serializers.FloatField()
+
+
+class OrderBookSerializer(serializers.Serializer):
+    best_bid = serializers.DecimalField(max_digits=20, decimal_places=2, allow_null=True)
+    best_ask = serializers.DecimalField(max_digits=20, decimal_places=2, allow_null=True)
+    spread = serializers.DecimalField(max_digits=20, decimal_places=2, allow_null=True)
+    bids = OrderBookLevelSerializer(many=True)
+    asks = OrderBookLevelSerializer(many=True)
+
+
+class PriceDistributionSerializer(serializers.Serializer):
+    recyclables = serializers.IntegerField()
+    deal_type = serializers.IntegerField()
+    count = serializers.IntegerField()
+    mean = serializers.FloatField(allow_null=True)
+    median = serializers.FloatField(allow_null=True)
+    p10 = serializers.FloatField(allow_null=True)
+    p25 = serializers.FloatField(allow_null=True)
+    p75 = serializers.FloatField(allow_null=True)
+    p90 = serializers.FloatField(allow_null=True)
+
+
+class PriceCandleSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    open = serializers.DecimalField(max_digits=13, decimal_places=2, allow_null=True)
+    high = serializers.DecimalField(max_digits=13, decimal_places=2, allow_null=True)
+    low = serializers.DecimalField(max_digits=13, decimal_places=2, allow_null=True)
+    close = serializers.DecimalField(max_digits=13, decimal_places=2, allow_null=True)
+    median = serializers.DecimalField(max_digits=13, decimal_places=2, allow_null=True)
+    average = serializers.DecimalField(max_digits=13, decimal_places=2, allow_null=True)
+    count = serializers.IntegerField()
+
+
 class SpecialSerializer(NonNullDynamicFieldsModelSerializer):
     companies = CompanyForProposalAndSubscribeSerializer(read_only=True, many=True)
     images = ImageModelSerializer(fields=("id", "image"), many=True)
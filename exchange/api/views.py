@@ -1,7 +1,10 @@
 import json
+from typing import List, Optional
 
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Q
+from django.core.cache import cache
+from django.db.models import Q, F, Count, Max, Avg, OuterRef, Subquery, Value, Exists
+from django.utils import timezone
 from django_filters import (
     MultipleChoiceFilter,
     NumberFilter,
@@ -18,13 +21,16 @@ from rest_framework import filters, generics, viewsets, status
 from drf_yasg import openapi as api
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework.decorators import action
-from rest_framework.exceptions import NotAuthenticated
+from rest_framework.exceptions import NotAuthenticated, ValidationError
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 from rest_framework_nested.viewsets import NestedViewSetMixin
 
 from chat.models import Chat
-from common.filters import FavoriteFilterBackend
+from common.aggregates import PercentileCont
+from common.cache import cached_response
+from common.filters import FavoriteFilterBackend, FullTextSearchFilter
+from common.pagination import PageSizeOrKeysetPagination
 from common.subscribe_services.create_payment import create_payment_for_special_app
 from common.subscribe_services.payment_acceptance import payment_acceptance_special_application
 from common.utils import generate_random_sequence, equals_application_and_request, equals_deal_and_request
@@ -33,9 +39,10 @@ from common.views import (
     ImagesMixin,
     FavoritableMixin,
     DocumentsMixin,
-    ExcludeMixin, RecyclableApplicationsQuerySetMixin,
+    ExcludeMixin, RecyclableApplicationsQuerySetMixin, StreamingExportMixin,
 )
 from company.models import Company, CompanyActivityType, City
+from company.services.company_list import count_subquery
 from document_generator.api.serializers import GeneratedDocumentSerializer
 from document_generator.common import get_or_generate_document
 from document_generator.generators.document_generators import (
@@ -61,6 +68,8 @@ from exchange.api.serializers import (
     UpdateRecyclablesApplicationSerializer, RecyclablesDealsForOffers,
     SpecialApplicationsSerializer, SpecialSerializer, AllRecyclablesApplicationsSerializer,
     ContractsStatisticsMarkSerializer, SupplyContractsPricesForMedianPriceSerializer,
+    OrderBookSerializer, CrossablePairSerializer, PriceCandleSerializer,
+    PriceDistributionSerializer,
 )
 from exchange.models import (
     RecyclablesApplication,
@@ -70,9 +79,23 @@ from exchange.models import (
     Review,
     EquipmentApplication,
     EquipmentDeal, DealType, UrgencyType, SpecialApps, SpecialApplication, SpecialApplicationPaidPeriod,
-    ContractsStatisticsMark,
+    ContractsStatisticsMark, PriceCandle, PriceQuantileSketch,
+)
+from exchange.candles import (
+    CANDLE_FIELDS,
+    MAX_POINTS,
+    PERIOD_RESOLUTIONS,
+    get_bucket_start,
+    rebucket,
+    shift_bucket,
+    validate_resolution,
+)
+from exchange.order_book import order_book
+from exchange.services import (
+    filter_qs_by_coordinates,
+    get_companies_offers_cache_key,
+    COMPANIES_OFFERS_CACHE_TIMEOUT,
 )
-from exchange.services import filter_qs_by_coordinates
 from exchange.utils import (
     validate_period,
     get_truncation_class,
@@ -86,11 +109,31 @@ from exchange.signals import (
     update_application_deal, update_equipment_deal, create_equipment_deal, create_supply_contract_by_form,
     update_supply_contract_by_form
 )
-from product.models import Recyclables, Equipment, EquipmentCategory, RecyclablesCategory
+from product.models import Recyclables, Equipment, EquipmentCategory, RecyclablesCategory, RecyclableMarketSummary
 from statistic.api.serializers import RecyclablesAppStatisticsSerializer
 from user.models import UserRole
 
 
+def get_int_query_param(request, name, default):
+    try:
+        return int(request.query_params.get(name, default))
+    except (TypeError, ValueError):
+        raise ValidationError(f"Некорректное значение параметра {name}")
+
+
+def get_optional_int_query_param(request, name) -> Optional[int]:
+    if not request.query_params.get(name):
+        return None
+    return get_int_query_param(request, name, None)
+
+
+def get_int_query_params(request, name) -> List[int]:
+    try:
+        return [int(value) for value in request.query_params.getlist(name)]
+    except ValueError:
+        raise ValidationError(f"Некорректное значение параметра {name}")
+
+
 class DealDocumentGeneratorMixin:
     @action(
         methods=["GET"],
@@ -189,17 +232,21 @@ class AllRecyclablesApplicationsViewSet(
     MultiSerializerMixin,
     FavoritableMixin,
     ExcludeMixin,
+    StreamingExportMixin,
     viewsets.ModelViewSet
 ):
     queryset = RecyclablesApplication.objects.prefetch_related("company", "recyclables", "company__city",
                                                                "recyclables__category", "company__activity_types",
-                                                               "company__activity_types__rec_col_types").annotate_total_weight()
+                                                               "company__activity_types__rec_col_types")
     yasg_parser_classes = [CamelCaseFormParser, CamelCaseMultiPartParser]
     parent_lookup_kwargs = "company_pk"
     search_fields = ("company__name", "company__inn", "recyclables__name")
     ordering_fields = "__all__"
+    search_vector_fields = ("company__search_vector", "recyclables__search_vector")
+    search_trigram_fields = ("company__name", "recyclables__name")
+    search_inn_fields = ("company__inn",)
     filter_backends = (
-        filters.SearchFilter,
+        FullTextSearchFilter,
         filters.OrderingFilter,
         DjangoFilterBackend,
         FavoriteFilterBackend,
@@ -239,6 +286,8 @@ class AllRecyclablesApplicationsViewSet(
             queryset = queryset.filter(company__activity_types__rec_col_types__activity=company_activity_types)
 
         if not request.query_params.get('page'):
+            if export_format := self.get_export_format():
+                return self.get_export_response(queryset, export_format)
             serializer = self.get_serializer(queryset, many=True)
             return Response(serializer.data)
 
@@ -248,11 +297,21 @@ class AllRecyclablesApplicationsViewSet(
             return self.get_paginated_response(serializer.data)
 
 
+PRICE_PERCENTILES = {
+    "p10": 0.1,
+    "p25": 0.25,
+    "median": 0.5,
+    "p75": 0.75,
+    "p90": 0.9,
+}
+
+
 class RecyclablesApplicationViewSet(
     ImagesMixin,
     MultiSerializerMixin,
     FavoritableMixin,
     ExcludeMixin,
+    StreamingExportMixin,
     viewsets.ModelViewSet,
     RecyclableApplicationsQuerySetMixin
 ):
@@ -260,7 +319,7 @@ class RecyclablesApplicationViewSet(
     queryset = RecyclablesApplication.objects.prefetch_related("company", "recyclables", "images").prefetch_related(
         "company__city", "company__activity_types", "company__activity_types__advantages",
         "company__activity_types__rec_col_types", "company__city__region",
-        "company__city__region__district").annotate_total_weight()
+        "company__city__region__district")
     serializer_classes = {
         "list": RecyclablesApplicationSerializer,
         "retrieve": RecyclablesApplicationSerializer,
@@ -271,8 +330,14 @@ class RecyclablesApplicationViewSet(
     parent_lookup_kwargs = "company_pk"
     search_fields = ("company__name", "company__inn", "recyclables__name")
     ordering_fields = "__all__"
+    pagination_class = PageSizeOrKeysetPagination
+    keyset_ordering_fields = ("created_at", "price")
+    export_serializer_class = AllRecyclablesApplicationsSerializer
+    search_vector_fields = ("company__search_vector", "recyclables__search_vector")
+    search_trigram_fields = ("company__name", "recyclables__name")
+    search_inn_fields = ("company__inn",)
     filter_backends = (
-        filters.SearchFilter,
+        FullTextSearchFilter,
         filters.OrderingFilter,
         DjangoFilterBackend,
         FavoriteFilterBackend,
@@ -465,6 +530,8 @@ class RecyclablesApplicationViewSet(
             queryset = queryset.filter(Q(status__lte=ApplicationStatus.CLOSED),
                                        Q(urgency_type=urgency_type))
 
+            if export_format := self.get_export_format():
+                return self.get_export_response(queryset, export_format)
             serializer = self.get_serializer(queryset, many=True)
             data = {
                 "results": serializer.data,
@@ -488,7 +555,9 @@ class RecyclablesApplicationViewSet(
             queryset = queryset.filter(
                 recyclables__id=request.query_params.get('sub_category'))
 
-        if not pages and not urgency_type:
+        if not pages and not urgency_type and not self.paginator.is_keyset_requested(request):
+            if export_format := self.get_export_format():
+                return self.get_export_response(queryset, export_format)
             serializer = self.get_serializer(queryset, many=True)
             return Response(serializer.data)
 
@@ -512,12 +581,65 @@ class RecyclablesApplicationViewSet(
         serializer = SupplyContractsPricesForMedianPriceSerializer(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            api.Parameter(
+                "source",
+                api.IN_QUERY,
+                type=api.TYPE_STRING,
+                required=False,
+                description="applications - точный расчет по текущим заявкам с учетом фильтров, "
+                            "sketch - приближенный по истории цен контрактов (фильтры recyclables и deal_type)",
+            ),
+        ],
+        responses={200: PriceDistributionSerializer(many=True)},
+    )
+    @action(methods=["GET"], detail=False)
+    def supply_contracts_price_distribution(self, request, *args, **kwargs):
+        """
+        Median, percentiles, mean and count of supply contracts prices
+        by recyclable and deal type
+        """
+        if request.query_params.get("source") == "sketch":
+            sketches = PriceQuantileSketch.objects.order_by("recyclables_id", "deal_type")
+            if recyclables := get_int_query_params(request, "recyclables"):
+                sketches = sketches.filter(recyclables_id__in=recyclables)
+            if deal_type := get_optional_int_query_param(request, "deal_type"):
+                sketches = sketches.filter(deal_type=deal_type)
+            data = []
+            for sketch in sketches:
+                quantiles = sketch.get_quantiles(PRICE_PERCENTILES.values())
+                data.append(
+                    {
+                        "recyclables": sketch.recyclables_id,
+                        "deal_type": sketch.deal_type,
+                        "count": sketch.count,
+                        "mean": sketch.total / sketch.count if sketch.count else None,
+                        **dict(zip(PRICE_PERCENTILES, quantiles)),
+                    }
+                )
+        else:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                urgency_type=UrgencyType.SUPPLY_CONTRACT
+            )
+            data = (
+                queryset.values("recyclables", "deal_type")
+                .annotate(
+                    count=Count("id"),
+                    mean=Avg("price"),
+                    **{
+                        name: PercentileCont("price", percentile)
+                        for name, percentile in PRICE_PERCENTILES.items()
+                    },
+                )
+                .order_by("recyclables", "deal_type")
+            )
+        return Response(PriceDistributionSerializer(data, many=True).data)
+
     @action(methods=["GET"], detail=False)
     def company_apps(self, request, *args, **kwargs):
         company_id = request.query_params.get('company')
         apps = RecyclablesApplication.objects.filter(company__id=company_id)
-        for i in apps:
-            i.total_weight = i.full_weigth
         app_serializer = RecyclablesApplicationSerializer(apps, many=True)
         return Response(app_serializer.data, status=status.HTTP_200_OK)
 
@@ -530,8 +652,6 @@ class RecyclablesApplicationViewSet(
         queryset = self.filter_queryset(apps)
         if len(queryset) > 0:
             page = self.paginate_queryset(queryset)
-            for i in page:  # apps:(
-                i.total_weight = i.full_weigth
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -556,8 +676,6 @@ class RecyclablesApplicationViewSet(
         apps = RecyclablesApplication.objects.filter(~Q(company_id=company_id),
                                                      deal_type=DealType.SELL,
                                                      recyclables=recyclable_id)
-        for i in apps:
-            i.total_weight = i.full_weigth
         app_serializer = RecyclablesApplicationSerializer(apps, many=True)
         company = Company.objects.get(id=company_id)
 
@@ -618,8 +736,11 @@ class EquipmentApplicationViewSet(
     parent_lookup_kwargs = "company_pk"
     search_fields = ("company__name", "company__inn", "equipment__name")
     ordering_fields = "__all__"
+    search_vector_fields = ("company__search_vector", "equipment__search_vector")
+    search_trigram_fields = ("company__name", "equipment__name")
+    search_inn_fields = ("company__inn",)
     filter_backends = (
-        filters.SearchFilter,
+        FullTextSearchFilter,
         filters.OrderingFilter,
         DjangoFilterBackend,
         FavoriteFilterBackend,
@@ -745,11 +866,31 @@ class EquipmentApplicationViewSet(
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+class ExchangeRecyclablesFilterSet(FilterSet):
+    applications__city__region = NumberFilter(method="filter_by_summary")
+    applications__city__region__district = NumberFilter(method="filter_by_summary")
+
+    class Meta:
+        model = Recyclables
+        fields = ("category",)
+
+    def filter_by_summary(self, queryset, name, value):
+        # Вторсырье, по которому есть опубликованные заявки в регионе/округе
+        lookup = "region__district" if name.endswith("district") else "region"
+        return queryset.filter(
+            Exists(
+                RecyclableMarketSummary.objects.filter(
+                    recyclables=OuterRef("pk"), **{lookup: value}
+                )
+            )
+        )
+
+
 class ExchangeRecyclablesViewSet(
     generics.ListAPIView,
     viewsets.GenericViewSet,
 ):
-    queryset = Recyclables.objects.prefetch_related("applications").annotate_applications()
+    queryset = Recyclables.objects.prefetch_related("applications")
     serializer_class = RecyclablesAppStatisticsSerializer  # ExchangeRecyclablesSerializer
     filter_backends = (
         filters.SearchFilter,
@@ -761,29 +902,30 @@ class ExchangeRecyclablesViewSet(
         "category__name",
     )
     search_fields = ("name",)
-    filterset_fields = ("category", "applications__city__region__district", "applications__city__region")
+    filterset_class = ExchangeRecyclablesFilterSet
 
     def get_queryset(self):
 
         qs = super().get_queryset()
 
-        page = self.request.query_params.get("page")
-
-        size = self.request.query_params.get("size")
-
-        urgency_type = self.request.query_params.get("urgency_type")
+        urgency_type = get_optional_int_query_param(self.request, "urgency_type")
 
         ordering = self.request.query_params.get("ordering")
 
-        if ordering and page == '1':
-            qs = qs.ordering_applications(ordering, urgency_type, page, size)
-            return qs
+        # Данные заявок берутся из RecyclableMarketSummary с учетом фильтра по региону
+        summary_filters = {
+            "region": get_optional_int_query_param(
+                self.request, "applications__city__region"
+            ),
+            "district": get_optional_int_query_param(
+                self.request, "applications__city__region__district"
+            ),
+        }
 
-        if urgency_type:
-            qs = qs.annotate_applications(urgency_type=int(urgency_type))
-            return qs
+        if ordering:
+            return qs.ordering_applications(ordering, urgency_type, **summary_filters)
 
-        return qs
+        return qs.annotate_applications(urgency_type=urgency_type, **summary_filters)
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -796,6 +938,7 @@ class ExchangeRecyclablesViewSet(
             ),
         ],
     )
+    @cached_response(RecyclablesApplication, RecyclableMarketSummary, Recyclables)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
@@ -816,22 +959,157 @@ class ExchangeRecyclablesViewSet(
         serializer = self.get_serializer(query, many=True)
         return Response(serializer.data)
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            api.Parameter(
+                "urgency_type",
+                api.IN_QUERY,
+                type=api.TYPE_INTEGER,
+                required=True,
+                description="Срочность",
+            ),
+            api.Parameter(
+                "deal_type",
+                api.IN_QUERY,
+                type=api.TYPE_INTEGER,
+                required=True,
+                description="Тип сделки",
+            ),
+            api.Parameter(
+                "period",
+                api.IN_QUERY,
+                type=api.TYPE_STRING,
+                required=False,
+                description="Период по которому выводить график(week/month/year/all)",
+            ),
+            api.Parameter(
+                "resolution",
+                api.IN_QUERY,
+                type=api.TYPE_STRING,
+                required=False,
+                description="Размер свечи (day/week/month), по умолчанию зависит от периода",
+            ),
+            api.Parameter(
+                "points",
+                api.IN_QUERY,
+                type=api.TYPE_INTEGER,
+                required=False,
+                description=f"Количество точек графика (не более {MAX_POINTS})",
+            ),
+        ],
+        responses={200: PriceCandleSerializer(many=True)},
+    )
     @action(methods=["GET"], detail=True)
     def graph(self, request, pk):
-        urgency_type = int(request.query_params.get("urgency_type"))
-        deal_type = int(request.query_params.get("deal_type"))
-        period = request.query_params.get("period", "all")
-        period = validate_period(period)
+        """
+        Price candles of the recyclable, always returns `points` candles,
+        the last one is the current day/week/month
+        """
+        urgency_type = get_int_query_param(request, "urgency_type", None)
+        deal_type = get_int_query_param(request, "deal_type", None)
+        period = validate_period(request.query_params.get("period", "all"))
+        resolution, points = PERIOD_RESOLUTIONS[period]
+        if "resolution" in request.query_params:
+            resolution = validate_resolution(request.query_params["resolution"])
+        points = min(max(get_int_query_param(request, "points", points), 1), MAX_POINTS)
         recyclable: Recyclables = self.get_object()
-        TruncClass = get_truncation_class(period)
-        lower_date_bound = get_lower_date_bound(period)
-        # deals = self.get_filtered_deals(
-        #     TruncClass, lower_date_bound, recyclable
-        # )
-        applications = self.get_filtered_applications(TruncClass, lower_date_bound, recyclable, urgency_type, deal_type)
-        # graph_data = deals.values_list("price", "truncated_date")
-        graph_data = applications.values_list("price", "truncated_date")
-        return Response(graph_data)
+
+        end = get_bucket_start(timezone.localdate(), resolution)
+        start = shift_bucket(end, resolution, 1 - points)
+        candles = PriceCandle.objects.filter(
+            recyclables=recyclable, urgency_type=urgency_type, deal_type=deal_type
+        )
+        previous_close = (
+            candles.filter(date__lt=start).order_by("-date").values_list("close", flat=True).first()
+        )
+        graph_data = rebucket(
+            candles.filter(date__gte=start).order_by("date").values("date", *CANDLE_FIELDS),
+            resolution,
+            start,
+            points,
+            previous_close,
+        )
+        return Response(PriceCandleSerializer(graph_data, many=True).data)
+
+    def get_urgency_type_param(self, request) -> int:
+        urgency_type = get_int_query_param(
+            request, "urgency_type", UrgencyType.READY_FOR_SHIPMENT
+        )
+        if urgency_type not in UrgencyType.values:
+            raise ValidationError("Некорректное значение параметра urgency_type")
+        return urgency_type
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            api.Parameter(
+                "urgency_type",
+                api.IN_QUERY,
+                type=api.TYPE_INTEGER,
+                required=False,
+                description="Срочность (по умолчанию готово к отгрузке)",
+            ),
+            api.Parameter(
+                "depth",
+                api.IN_QUERY,
+                type=api.TYPE_INTEGER,
+                required=False,
+                description="Количество ценовых уровней для покупки и продажи",
+            ),
+        ],
+        responses={200: OrderBookSerializer},
+    )
+    @action(methods=["GET"], detail=True)
+    def order_book(self, request, pk):
+        """
+        Best bid/ask, spread and depth of published applications by the recyclable
+        """
+        urgency_type = self.get_urgency_type_param(request)
+        depth = max(get_int_query_param(request, "depth", 10), 1)
+        # Книга создается только для существующего вторсырья
+        book = order_book.get_book(self.get_object().pk, urgency_type)
+        best_bid = book.best(DealType.BUY)
+        best_ask = book.best(DealType.SELL)
+        data = {
+            "best_bid": best_bid.price if best_bid else None,
+            "best_ask": best_ask.price if best_ask else None,
+            "spread": best_ask.price - best_bid.price
+            if best_bid and best_ask
+            else None,
+            "bids": book.depth(DealType.BUY, depth),
+            "asks": book.depth(DealType.SELL, depth),
+        }
+        return Response(OrderBookSerializer(data).data)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            api.Parameter(
+                "urgency_type",
+                api.IN_QUERY,
+                type=api.TYPE_INTEGER,
+                required=False,
+                description="Срочность (по умолчанию готово к отгрузке)",
+            ),
+            api.Parameter(
+                "limit",
+                api.IN_QUERY,
+                type=api.TYPE_INTEGER,
+                required=False,
+                description="Максимальное количество пар",
+            ),
+        ],
+        responses={200: CrossablePairSerializer(many=True)},
+    )
+    @action(methods=["GET"], detail=True)
+    def crossable_pairs(self, request, pk):
+        """
+        Pairs of buy and sell applications which prices cross,
+        can be passed to match_applications
+        """
+        urgency_type = self.get_urgency_type_param(request)
+        limit = max(get_int_query_param(request, "limit", 10), 1)
+        book = order_book.get_book(self.get_object().pk, urgency_type)
+        pairs = book.crossable_pairs(limit)
+        return Response(CrossablePairSerializer(pairs, many=True).data)
 
     @staticmethod
     def get_filtered_deals(TruncClass, lower_date_bound, recyclable):
@@ -923,6 +1201,8 @@ class RecyclablesDealViewSet(
     }
     default_serializer_class = UpdateRecyclablesDealSerializer
     yasg_parser_classes = [CamelCaseFormParser, CamelCaseMultiPartParser]
+    pagination_class = PageSizeOrKeysetPagination
+    keyset_ordering_fields = ("created_at", "price")
     search_fields = (
         "supplier_company__name",
         "supplier_company__inn",
@@ -931,8 +1211,19 @@ class RecyclablesDealViewSet(
         "application__recyclables__name",
     )
     ordering_fields = "__all__"
+    search_vector_fields = (
+        "supplier_company__search_vector",
+        "buyer_company__search_vector",
+        "application__recyclables__search_vector",
+    )
+    search_trigram_fields = (
+        "supplier_company__name",
+        "buyer_company__name",
+        "application__recyclables__name",
+    )
+    search_inn_fields = ("supplier_company__inn", "buyer_company__inn")
     filter_backends = (
-        filters.SearchFilter,
+        FullTextSearchFilter,
         DjangoFilterBackend,
         filters.OrderingFilter,
     )
@@ -996,101 +1287,87 @@ class RecyclablesDealViewSet(
             )
         return qs
 
-    def sort_offers(self, companies, ordering=None):
-        if ordering:
-            if ordering == 'dealsByThisRecyclable':
-                sorted_companies = sorted(companies, key=lambda x: x.deals_by_recyclable_for_offers)
-                return sorted_companies
-            if ordering == '-dealsByThisRecyclable':
-                sorted_companies = sorted(companies, key=lambda x: x.deals_by_recyclable_for_offers)
-                return list(reversed(sorted_companies))
-
-            if ordering == 'lastDealDate':
-                sorted_companies = sorted(companies, key=lambda x: x.last_deal_date)
-                return sorted_companies
-            if ordering == '-lastDealDate':
-                sorted_companies = sorted(companies, key=lambda x: x.last_deal_date)
-                return list(reversed(sorted_companies))
-
-            if ordering == 'address':
-                sorted_companies = sorted(companies, key=lambda x: x.address)
-                return sorted_companies
-            if ordering == '-address':
-                sorted_companies = sorted(companies, key=lambda x: x.address)
-                return list(reversed(sorted_companies))
-            if ordering == 'averageReviewRate':
-                sorted_companies = sorted(companies, key=lambda x: x.average_review_rate)
-                return sorted_companies
-            if ordering == '-averageReviewRate':
-                sorted_companies = sorted(companies, key=lambda x: x.average_review_rate)
-                return list(reversed(sorted_companies))
-
-            if ordering == 'buyAppsByThisRecyclable':
-                sorted_companies = sorted(companies, key=lambda x: x.buy_apps_by_recyclable_for_offers)
-                return sorted_companies
-            if ordering == '-buyAppsByThisRecyclable':
-                sorted_companies = sorted(companies, key=lambda x: x.buy_apps_by_recyclable_for_offers)
-                return list(reversed(sorted_companies))
-
-            if ordering == 'lastAppDate':
-                sorted_companies = sorted(companies, key=lambda x: x.last_buy_app_date)
-                return sorted_companies
-            if ordering == '-lastAppDate':
-                sorted_companies = sorted(companies, key=lambda x: x.last_buy_app_date)
-                return list(reversed(sorted_companies))
-
-        return companies
+    # Сортировки списка компаний для предложений и соответствующие им аннотации
+    OFFERS_ORDERING = {
+        "dealsByThisRecyclable": "deals_by_recyclable_for_offers",
+        "lastDealDate": "last_deal_date",
+        "address": "address",
+        "averageReviewRate": "average_review_rate_for_offers",
+        "buyAppsByThisRecyclable": "buy_apps_by_recyclable_for_offers",
+        "lastAppDate": "last_buy_app_date",
+    }
+
+    def get_offers_ordering(self, ordering):
+        field = self.OFFERS_ORDERING.get((ordering or "").lstrip("-"))
+        if field is None:
+            return ("id",)
+        if ordering.startswith("-"):
+            return F(field).desc(nulls_last=True), "-id"
+        return F(field).asc(nulls_first=True), "id"
+
+    def get_companies_offers_queryset(self, recyclable_id, ordering=None):
+        """
+        Companies that have buy applications for the recyclable, with number and
+        date of the last deal and buy application, grouped in one query
+        """
+        applications_for_sell_count = RecyclablesApplication.objects.filter(
+            recyclables=recyclable_id, deal_type=DealType.SELL
+        ).count()
+        average_review_rate = (
+            Review.objects.filter(company=OuterRef("pk"))
+            .values("company")
+            .annotate(avg=Avg("rate"))
+            .values("avg")
+        )
+        deals_filter = Q(recyclables_buy_deals__application__recyclables=recyclable_id)
+        return (
+            Company.objects.filter(
+                recyclables_applications__recyclables=recyclable_id,
+                recyclables_applications__deal_type=DealType.BUY,
+            )
+            .annotate(
+                buy_apps_by_recyclable_for_offers=Count(
+                    "recyclables_applications", distinct=True
+                ),
+                last_buy_app_date=Max("recyclables_applications__created_at"),
+                deals_by_recyclable_for_offers=Count(
+                    "recyclables_buy_deals", filter=deals_filter, distinct=True
+                ),
+                last_deal_date=Max(
+                    "recyclables_buy_deals__created_at", filter=deals_filter
+                ),
+                average_review_rate_for_offers=Subquery(average_review_rate),
+                app_offers_count=Value(applications_for_sell_count),
+                total_applications_count=count_subquery(
+                    RecyclablesApplication.objects.all(), "company"
+                ),
+                deals_count=(
+                    count_subquery(RecyclablesDeal.objects.all(), "supplier_company")
+                    + count_subquery(RecyclablesDeal.objects.all(), "buyer_company")
+                ),
+            )
+            .select_related("city", "city__region", "manager", "owner")
+            .prefetch_related(
+                "documents",
+                "contacts",
+                "review_set",
+                "recyclables__recyclables",
+                "activity_types__rec_col_types",
+                "activity_types__advantages",
+            )
+            .order_by(*self.get_offers_ordering(ordering))
+        )
 
     @action(methods=["get"], detail=True)
     def companies_offers(self, request, pk=None, **kwargs):
-        companies = []
-        ordering = request.query_params.get('ordering')
-        # deals = RecyclablesDeal.objects.filter(application__recyclables=pk)
-
-        # ДОБАВИЛ
-        applications_for_sell_count = len(
-            RecyclablesApplication.objects.filter(recyclables=pk, deal_type=DealType.SELL))
-        applications = RecyclablesApplication.objects.filter(recyclables=pk, deal_type=DealType.BUY)
-        for i in applications:
-            if i.company not in companies:
-                deal_s = RecyclablesDeal.objects.filter(application__recyclables=pk,
-                                                        buyer_company_id=i.company.id)
-                apps = RecyclablesApplication.objects.filter(company_id=i.company.id, recyclables=pk,
-                                                             deal_type=DealType.BUY)
-                # recyclable = CompanyRecyclables.objects.filter(id=pk)
-
-                apps_count = len(apps)
-                buy_count = len(deal_s)
-                if len(apps) > 0:
-                    if (len(deal_s) > 0):
-                        last_deal_date = deal_s.order_by('-created_at')[0].created_at
-                        i.company.last_deal_date = last_deal_date
-                    # last_deal_date = len(deal_s) > 0 if deal_s.order_by('-created_at')[0].created_at else ''
-
-                    last_buy_app_date = apps.order_by('-created_at')[0].created_at
-
-                    i.company.deals_by_recyclable_for_offers = buy_count
-
-                    i.company.last_buy_app_date = last_buy_app_date
-                    i.company.buy_apps_by_recyclable_for_offers = apps_count
-
-                    i.company.app_offers_count = applications_for_sell_count
-
-                companies.append(i.company)
-
-        # for i in deals:
-        #    if i.buyer_company not in companies:
-        #        deal_s = RecyclablesDeal.objects.filter(application__recyclables=pk,
-        #                                                buyer_company_id=i.buyer_company_id)
-        #        buy_count = len(deal_s)
-        #        last_deal_date = deal_s.order_by('-created_at')[0].created_at
-        #        i.buyer_company.deals_by_recyclable_for_offers = buy_count
-        #        i.buyer_company.last_deal_date = last_deal_date
-        #        companies.append(i.buyer_company)
-
-        sorted_companies = self.sort_offers(companies, ordering)
-        serializer = RecyclablesDealsForOffers(sorted_companies, many=True)
-        return Response(serializer.data)
+        ordering = request.query_params.get("ordering")
+        cache_key = get_companies_offers_cache_key(pk, ordering)
+        data = cache.get(cache_key)
+        if data is None:
+            companies = self.get_companies_offers_queryset(pk, ordering)
+            data = RecyclablesDealsForOffers(companies, many=True).data
+            cache.set(cache_key, data, COMPANIES_OFFERS_CACHE_TIMEOUT)
+        return Response(data)
 
 
 class ReviewViewSet(
@@ -0,0 +1,161 @@
+import datetime
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from rest_framework.exceptions import ValidationError
+
+from exchange.sketches import KLLSketch
+
+RESOLUTIONS = ("day", "week", "month")
+
+# Разрешение и количество точек графика по умолчанию для периода
+PERIOD_RESOLUTIONS = {
+    "week": ("day", 7),
+    "month": ("day", 31),
+    "year": ("week", 52),
+    "all": ("month", 36),
+}
+
+MAX_POINTS = 366
+
+CandleKey = Tuple[int, int, int]
+
+# Сохраняемые значения дневной свечи, см. make_candle
+CANDLE_FIELDS = ("open", "high", "low", "close", "median", "count", "total", "sketch")
+
+
+def validate_resolution(resolution: str) -> str:
+    if resolution.lower() not in RESOLUTIONS:
+        raise ValidationError('Resolution must be "day", "week" or "month"')
+    return resolution.lower()
+
+
+def get_bucket_start(date: datetime.date, resolution: str) -> datetime.date:
+    if resolution == "week":
+        return date - datetime.timedelta(days=date.weekday())
+    if resolution == "month":
+        return date.replace(day=1)
+    return date
+
+
+def shift_bucket(date: datetime.date, resolution: str, count: int) -> datetime.date:
+    """
+    Moves the bucket start by count buckets (backwards if negative)
+    """
+    if resolution == "week":
+        return date + datetime.timedelta(weeks=count)
+    if resolution == "month":
+        month = date.year * 12 + date.month - 1 + count
+        return datetime.date(month // 12, month % 12 + 1, 1)
+    return date + datetime.timedelta(days=count)
+
+
+def get_median(sketch: KLLSketch) -> Optional[Decimal]:
+    (value,) = sketch.quantiles([0.5])
+    if value is None:
+        return None
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+def make_candle(prices: List[Decimal]) -> dict:
+    """
+    Builds candle values from prices in chronological order.
+    Prices themselves are not kept: the median of merged candles
+    is estimated with the quantile sketch
+    """
+    sketch = KLLSketch()
+    sketch.extend(prices)
+    return {
+        "open": prices[0],
+        "high": max(prices),
+        "low": min(prices),
+        "close": prices[-1],
+        "median": get_median(sketch),
+        "count": len(prices),
+        "total": sum(prices, Decimal(0)),
+        "sketch": sketch.to_dict(),
+    }
+
+
+def add_price(candle: dict, price: Decimal) -> dict:
+    """
+    Adds the price observed after all prices of the candle
+    """
+    return merge_candles([candle, make_candle([price])])
+
+
+def merge_candles(candles: List[dict]) -> dict:
+    """
+    Merges chronologically ordered candles into one
+    """
+    sketch = KLLSketch()
+    for candle in candles:
+        sketch.merge(KLLSketch.from_dict(candle["sketch"]))
+    return {
+        "open": candles[0]["open"],
+        "high": max(candle["high"] for candle in candles),
+        "low": min(candle["low"] for candle in candles),
+        "close": candles[-1]["close"],
+        "median": get_median(sketch),
+        "count": sum(candle["count"] for candle in candles),
+        "total": sum((candle["total"] for candle in candles), Decimal(0)),
+        "sketch": sketch.to_dict(),
+    }
+
+
+def collect_daily_candles(
+        observations: Iterable[Tuple[CandleKey, datetime.date, Decimal]]
+) -> Dict[Tuple[CandleKey, datetime.date], dict]:
+    """
+    Groups chronologically ordered price observations
+    ((recyclables_id, urgency_type, deal_type), date, price) into daily candles
+    """
+    prices = OrderedDict()
+    for key, date, price in observations:
+        prices.setdefault((key, date), []).append(price)
+    return {bucket: make_candle(values) for bucket, values in prices.items()}
+
+
+def rebucket(
+        candles: Iterable[dict],
+        resolution: str,
+        start: datetime.date,
+        points: int,
+        previous_close: Optional[Decimal] = None,
+) -> List[dict]:
+    """
+    Merges daily candles ordered by date into exactly `points` buckets
+    of the resolution starting at `start`. Empty buckets repeat the previous close
+    """
+    merged = OrderedDict()
+    for candle in candles:
+        bucket = merged.setdefault(
+            get_bucket_start(candle["date"], resolution), []
+        )
+        bucket.append(candle)
+
+    result = []
+    date = start
+    for _ in range(points):
+        bucket_candles = merged.get(date)
+        if bucket_candles:
+            candle = merge_candles(bucket_candles)
+            candle["average"] = (candle["total"] / candle["count"]).quantize(
+                Decimal("0.01")
+            )
+            previous_close = candle["close"]
+        else:
+            candle = {
+                "open": previous_close,
+                "high": previous_close,
+                "low": previous_close,
+                "close": previous_close,
+                "median": previous_close,
+                "average": previous_close,
+                "count": 0,
+            }
+        candle["date"] = date
+        result.append(candle)
+        date = shift_bucket(date, resolution, 1)
+    return result
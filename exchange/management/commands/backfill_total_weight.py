@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from exchange.models import RecyclablesApplication
+
+
+class Command(BaseCommand):
+    help = "Заполняет хранимый общий вес (total_weight) заявок по вторсырью"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Количество заявок, обновляемых одним запросом",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересчитать все заявки, а не только с незаполненным весом",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        qs = RecyclablesApplication.objects.all()
+        if not options["all"]:
+            qs = qs.filter(total_weight__isnull=True)
+
+        bounds = qs.aggregate(min_id=Min("id"), max_id=Max("id"))
+        if bounds["min_id"] is None:
+            self.stdout.write("Нет заявок для обновления")
+            return
+
+        updated = 0
+        # Обновление диапазонами первичного ключа, чтобы не держать
+        # блокировку на всей таблице
+        for start in range(bounds["min_id"], bounds["max_id"] + 1, batch_size):
+            with transaction.atomic():
+                updated += qs.filter(
+                    id__gte=start, id__lt=start + batch_size
+                ).update_total_weight()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Обновлено заявок: {updated}")
+        )
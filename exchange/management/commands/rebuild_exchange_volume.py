@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from exchange.models import DailyExchangeVolume
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает дневные счетчики объема торгов по заявкам"
+
+    def handle(self, *args, **options):
+        DailyExchangeVolume.objects.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Счетчиков: {DailyExchangeVolume.objects.count()}")
+        )
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from exchange.models import PriceCandle
+
+
+class Command(BaseCommand):
+    help = "Пересобирает дневные ценовые свечи по заявкам и отметкам цен контрактов"
+
+    def handle(self, *args, **options):
+        PriceCandle.objects.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Свечей: {PriceCandle.objects.count()}")
+        )
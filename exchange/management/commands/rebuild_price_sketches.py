@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from exchange.models import PriceQuantileSketch
+
+
+class Command(BaseCommand):
+    help = "Пересобирает скетчи распределения цен контрактов на поставку"
+
+    def handle(self, *args, **options):
+        PriceQuantileSketch.objects.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Скетчей: {PriceQuantileSketch.objects.count()}")
+        )
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0034_alter_specialapplication_chat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recyclablesapplication',
+            name='total_weight',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True, verbose_name='Общий вес'),
+        ),
+        migrations.AddIndex(
+            model_name='recyclablesapplication',
+            index=models.Index(fields=['recyclables', 'urgency_type', 'total_weight'], name='rec_apps_total_weight_idx'),
+        ),
+    ]
@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0035_recyclablesapplication_total_weight'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recyclablesapplication',
+            index=models.Index(fields=['latitude', 'longitude'], name='rec_apps_lat_lon_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+import common.model_fields
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_recyclablemarketsummary'),
+        ('exchange', '0036_recyclablesapplication_lat_lon_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceCandle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_deleted', models.BooleanField(default=False, verbose_name='Помечен как удаленный')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления')),
+                ('urgency_type', models.PositiveSmallIntegerField(choices=[(1, 'Готово к отгрузке'), (2, 'Контракт на поставку')], verbose_name='Срочность')),
+                ('deal_type', models.PositiveSmallIntegerField(choices=[(1, 'Покупка'), (2, 'Продажа')], verbose_name='Тип сделки')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('open', common.model_fields.AmountField(decimal_places=2, default=0.0, max_digits=13, verbose_name='Цена открытия')),
+                ('high', common.model_fields.AmountField(decimal_places=2, default=0.0, max_digits=13, verbose_name='Максимальная цена')),
+                ('low', common.model_fields.AmountField(decimal_places=2, default=0.0, max_digits=13, verbose_name='Минимальная цена')),
+                ('close', common.model_fields.AmountField(decimal_places=2, default=0.0, max_digits=13, verbose_name='Цена закрытия')),
+                ('median', common.model_fields.AmountField(decimal_places=2, default=0.0, max_digits=13, verbose_name='Медианная цена')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество цен')),
+                ('prices', django.contrib.postgres.fields.ArrayField(base_field=common.model_fields.AmountField(decimal_places=2, default=0.0, max_digits=13), default=list, size=None, verbose_name='Цены за день')),
+                ('recyclables', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_candles', to='product.recyclables', verbose_name='Вторсырье')),
+            ],
+            options={
+                'verbose_name': 'Ценовая свеча',
+                'verbose_name_plural': 'Ценовые свечи',
+                'db_table': 'price_candles',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pricecandle',
+            constraint=models.UniqueConstraint(fields=('recyclables', 'urgency_type', 'deal_type', 'date'), name='unique_price_candle'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_recyclablemarketsummary'),
+        ('exchange', '0037_pricecandle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyExchangeVolume',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата создания заявок')),
+                ('urgency_type', models.PositiveSmallIntegerField(choices=[(1, 'Готово к отгрузке'), (2, 'Контракт на поставку')], verbose_name='Срочность')),
+                ('deal_type', models.PositiveSmallIntegerField(choices=[(1, 'Покупка'), (2, 'Продажа')], verbose_name='Тип сделки')),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'На проверке'), (2, 'Опубликована'), (3, 'Завершена'), (4, 'Отклонена'), (5, 'Удалено перманентно')], verbose_name='Статус заявок')),
+                ('application_is_deleted', models.BooleanField(default=False, verbose_name='Заявки удалены')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Объем торгов')),
+                ('applications_count', models.IntegerField(default=0, verbose_name='Количество заявок')),
+                ('recyclables', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_exchange_volumes', to='product.recyclables', verbose_name='Вторсырье')),
+            ],
+            options={
+                'verbose_name': 'Объем торгов за день',
+                'verbose_name_plural': 'Объемы торгов по дням',
+                'db_table': 'daily_exchange_volumes',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyexchangevolume',
+            constraint=models.UniqueConstraint(fields=('date', 'recyclables', 'urgency_type', 'deal_type', 'status', 'application_is_deleted'), name='unique_daily_exchange_volume'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_recyclablemarketsummary'),
+        ('exchange', '0038_dailyexchangevolume'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceQuantileSketch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_deleted', models.BooleanField(default=False, verbose_name='Помечен как удаленный')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления')),
+                ('deal_type', models.PositiveSmallIntegerField(choices=[(1, 'Покупка'), (2, 'Продажа')], verbose_name='Тип сделки')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Количество цен')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Сумма цен')),
+                ('sketch', models.JSONField(default=dict, verbose_name='Скетч')),
+                ('recyclables', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_sketches', to='product.recyclables', verbose_name='Вторсырье')),
+            ],
+            options={
+                'verbose_name': 'Распределение цен',
+                'verbose_name_plural': 'Распределения цен',
+                'db_table': 'price_quantile_sketches',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pricequantilesketch',
+            constraint=models.UniqueConstraint(fields=('recyclables', 'deal_type'), name='unique_price_quantile_sketch'),
+        ),
+    ]
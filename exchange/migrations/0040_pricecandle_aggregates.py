@@ -0,0 +1,45 @@
+from decimal import Decimal
+
+from django.db import migrations, models
+
+from exchange.sketches import KLLSketch
+
+
+def fill_aggregates(apps, schema_editor):
+    PriceCandle = apps.get_model("exchange", "PriceCandle")
+    candles = []
+    for candle in PriceCandle.objects.exclude(prices=[]).iterator():
+        sketch = KLLSketch()
+        sketch.extend(candle.prices)
+        candle.total = sum(candle.prices, Decimal(0))
+        candle.sketch = sketch.to_dict()
+        candles.append(candle)
+        if len(candles) == 1000:
+            PriceCandle.objects.bulk_update(candles, ["total", "sketch"])
+            candles = []
+    PriceCandle.objects.bulk_update(candles, ["total", "sketch"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exchange', '0039_pricequantilesketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pricecandle',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Сумма цен'),
+        ),
+        migrations.AddField(
+            model_name='pricecandle',
+            name='sketch',
+            field=models.JSONField(default=dict, verbose_name='Скетч'),
+        ),
+        migrations.RunPython(fill_aggregates, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='pricecandle',
+            name='prices',
+        ),
+    ]
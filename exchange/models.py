@@ -1,4 +1,6 @@
+import heapq
 import uuid
+from typing import Optional
 
 from bulk_update_or_create import BulkUpdateOrCreateQuerySet
 from django.contrib.auth import get_user_model
@@ -8,7 +10,7 @@ from django.contrib.contenttypes.fields import (
 )
 from django.contrib.contenttypes.models import ContentType
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from decimal import Decimal
 
 from django.db.models import (
@@ -17,8 +19,16 @@ from django.db.models import (
     F,
     FloatField,
     Q,
+    Exists,
+    OuterRef,
+    Count,
+    DecimalField,
+    Sum,
+    Value,
 )
+from django.db.models.functions import Cast, Coalesce, TruncDate
 from django.urls import reverse
+from django.utils import timezone
 
 from chat.models import Chat
 from common.model_fields import (
@@ -39,10 +49,20 @@ from common.utils import (
     generate_random_sequence,
 )
 from company.models import Company, CompanyStatus
+from exchange.candles import (
+    CANDLE_FIELDS,
+    CandleKey,
+    add_price,
+    collect_daily_candles,
+    make_candle,
+)
+from exchange.sketches import KLLSketch
 from exchange.signals import deal_completed, application_status_changed
 
 User = get_user_model()
 
+EXCHANGE_VOLUME_FIELD = DecimalField(max_digits=20, decimal_places=2)
+
 
 class DocumentType(models.IntegerChoices):
     UNLOADING_AGREMEENT = 1, "Договор на отгрузку"
@@ -184,45 +204,99 @@ class SpecialApplicationPeriod(models.IntegerChoices):
 class RecyclablesApplicationQuerySet(
     BulkUpdateOrCreateQuerySet, models.QuerySet
 ):
-    def annotate_total_weight(self, *args, **kwargs):
-        return self.annotate(
-            total_weight=Case(
-                When(
-                    Q(full_weigth__gt=0) & Q(full_weigth__isnull=False),
-                    then=F("full_weigth"),
-                ),
-                When(
-                    urgency_type=UrgencyType.READY_FOR_SHIPMENT,
-                    then=F("bale_count") * F("bale_weight"),
-                ),
-                When(
-                    urgency_type=UrgencyType.SUPPLY_CONTRACT, then=F("volume")
+    @staticmethod
+    def get_total_weight_expression():
+        return Case(
+            When(
+                Q(full_weigth__gt=0) & Q(full_weigth__isnull=False),
+                then=F("full_weigth"),
+            ),
+            When(
+                urgency_type=UrgencyType.READY_FOR_SHIPMENT,
+                then=F("bale_count") * F("bale_weight"),
+            ),
+            When(
+                urgency_type=UrgencyType.SUPPLY_CONTRACT, then=F("volume")
+            ),
+            output_field=FloatField(),
+        )
+
+    def update_total_weight(self):
+        """
+        Recalculates stored total_weight on the database side,
+        must be called after queryset.update() of weight fields
+        """
+        return self.update(total_weight=self.get_total_weight_expression())
+
+    @staticmethod
+    def get_total_price_expression():
+        """
+        Same as RecyclablesApplication.total_price on the database side
+        """
+        return Case(
+            When(
+                urgency_type=UrgencyType.READY_FOR_SHIPMENT,
+                then=Cast("total_weight", EXCHANGE_VOLUME_FIELD) * F("price"),
+            ),
+            When(
+                urgency_type=UrgencyType.SUPPLY_CONTRACT,
+                then=Cast("volume", EXCHANGE_VOLUME_FIELD) * F("price"),
+            ),
+            default=Value(0),
+            output_field=EXCHANGE_VOLUME_FIELD,
+        )
+
+    def aggregate_total_price(self):
+        return self.aggregate(
+            total_price=Coalesce(
+                Sum(self.get_total_price_expression()),
+                Value(0),
+                output_field=EXCHANGE_VOLUME_FIELD,
+            )
+        )["total_price"]
+
+    def exchange_volume_rows(self):
+        """
+        Contributions of the applications to DailyExchangeVolume counters
+        """
+        return (
+            self.annotate(date=TruncDate("created_at"))
+            .values(
+                "date", "recyclables_id", "urgency_type", "deal_type", "status", "is_deleted"
+            )
+            .annotate(
+                total=Coalesce(
+                    Sum(self.get_total_price_expression()),
+                    Value(0),
+                    output_field=EXCHANGE_VOLUME_FIELD,
                 ),
-                output_field=FloatField(),
+                applications_count=Count("id"),
             )
+            .order_by()
         )
 
-    # TODO: make this stuff working
-    #
-    # def annotate_price(self):
-    #     return self.annotate(
-    #         actual_price=ExpressionWrapper(
-    #             Case(
-    #                 When(
-    #                     urgency_type=UrgencyType.SUPPLY_CONTRACT,
-    #                     then=Coalesce(F("volume"), 0) * F("price")
-    #                 ),
-    #                 When(
-    #                     urgency_type=UrgencyType.READY_FOR_SHIPMENT,
-    #                     then=Coalesce(F("bale_count"), 0) * Coalesce(F("bale_weight"), 0) * F("price"),
-    #                 )
-    #             ),
-    #             output_field=IntegerField(),
-    #         ),
-    #     )
-    #
-    # def aggregate_total_price(self):
-    #     return self.annotate_price().aggregate(Sum("actual_price"))
+    def saved_states(self):
+        """
+        Stored fields of the applications compared by the save receivers,
+        with the contribution of every application to DailyExchangeVolume
+        """
+        return self.annotate(
+            date=TruncDate("created_at"),
+            total=Coalesce(
+                self.get_total_price_expression(),
+                Value(0),
+                output_field=EXCHANGE_VOLUME_FIELD,
+            ),
+        ).values(
+            "price",
+            "status",
+            "is_deleted",
+            "recyclables_id",
+            "urgency_type",
+            "deal_type",
+            "date",
+            "total",
+        )
 
 
 class BaseRecyclablesApplication(BaseModel):
@@ -323,6 +397,11 @@ class RecyclablesApplication(BaseRecyclablesApplication, ApplicationSaveMixin):
     )
 
     full_weigth = models.PositiveIntegerField("Полный вес заявки", null=True)
+    # Хранимый общий вес (full_weigth / bale_count * bale_weight / volume),
+    # пересчитывается в save() и update_total_weight()
+    total_weight = models.FloatField(
+        "Общий вес", null=True, blank=True, editable=False, db_index=True
+    )
 
     # Address
     city = models.ForeignKey(
@@ -344,12 +423,33 @@ class RecyclablesApplication(BaseRecyclablesApplication, ApplicationSaveMixin):
         verbose_name = "Заявка по вторсырью"
         verbose_name_plural = "Заявки по вторсырью"
         db_table = "recyclables_applications"
+        indexes = [
+            models.Index(
+                fields=["recyclables", "urgency_type", "total_weight"],
+                name="rec_apps_total_weight_idx",
+            ),
+            models.Index(
+                fields=["latitude", "longitude"],
+                name="rec_apps_lat_lon_idx",
+            ),
+        ]
+
+    # Поля, от которых зависит total_weight
+    TOTAL_WEIGHT_SOURCE_FIELDS = (
+        "full_weigth",
+        "urgency_type",
+        "bale_count",
+        "bale_weight",
+        "volume",
+    )
 
     @staticmethod
     def get_total_weight(application):
         if application.full_weigth:
             return application.full_weigth
         if application.urgency_type == UrgencyType.READY_FOR_SHIPMENT:
+            if application.bale_count is None or application.bale_weight is None:
+                return None
             return application.bale_count * application.bale_weight
         return application.volume
 
@@ -412,6 +512,12 @@ class RecyclablesApplication(BaseRecyclablesApplication, ApplicationSaveMixin):
             using=None,
             update_fields=None,
     ):
+        self.total_weight = self.get_total_weight(self)
+        if update_fields is not None and set(update_fields) & set(
+                self.TOTAL_WEIGHT_SOURCE_FIELDS
+        ):
+            update_fields = {*update_fields, "total_weight"}
+
         old_status = self.status
         super().save(force_insert, force_update, using, update_fields)
         new_status = self.status
@@ -658,6 +764,360 @@ class ContractsStatisticsMark(BaseModel):
     price = AmountField("Цена за единицу веса")
 
 
+class PriceCandleQuerySet(models.QuerySet):
+    def append_price(self, recyclables_id, urgency_type, deal_type, price, moment=None):
+        """
+        Adds price observation to the daily candle of the moment
+        """
+        date = timezone.localdate(moment or timezone.now())
+        price = Decimal(price)
+        with transaction.atomic():
+            candle, created = self.select_for_update().get_or_create(
+                recyclables_id=recyclables_id,
+                urgency_type=urgency_type,
+                deal_type=deal_type,
+                date=date,
+                defaults=make_candle([price]),
+            )
+            if not created:
+                for field, value in add_price(candle.get_values(), price).items():
+                    setattr(candle, field, value)
+                candle.save()
+        return candle
+
+    def refresh(self, key: CandleKey, date):
+        """
+        Recollects the daily candle from the price observations of the day.
+        An edited price replaces the previous one: the observation of an application
+        is its current price at the day the application was created (as in rebuild)
+        """
+        recyclables_id, urgency_type, deal_type = key
+        lookup = {
+            "recyclables_id": recyclables_id,
+            "urgency_type": urgency_type,
+            "deal_type": deal_type,
+            "date": date,
+        }
+        with transaction.atomic():
+            # Наблюдения читаются после блокировки свечи,
+            # параллельное обновление дня увидит уже зафиксированные изменения
+            self.select_for_update().filter(**lookup).first()
+            prices = [
+                price for _, _, price in self.get_price_observations(key, date)
+            ]
+            if not prices:
+                self.filter(**lookup).delete()
+                return
+            values = make_candle(prices)
+            self.bulk_create(
+                [PriceCandle(**lookup, **values)],
+                update_conflicts=True,
+                unique_fields=["recyclables", "urgency_type", "deal_type", "date"],
+                update_fields=list(values),
+            )
+
+    @staticmethod
+    def get_price_observations(key: Optional[CandleKey] = None, date=None):
+        """
+        Chronologically ordered price observations for candles:
+        ready for shipment prices are taken from published applications,
+        supply contract prices from statistics marks
+        (or from applications which have no marks).
+        Optionally limited to the candle key and the day
+        """
+        applications = RecyclablesApplication.objects.filter(
+            status=ApplicationStatus.PUBLISHED, is_deleted=False
+        ).exclude(
+            Q(urgency_type=UrgencyType.SUPPLY_CONTRACT)
+            & Exists(
+                ContractsStatisticsMark.objects.filter(
+                    recyclable_application_id=OuterRef("pk")
+                )
+            )
+        )
+        marks = ContractsStatisticsMark.objects.filter(is_deleted=False)
+        if key is not None:
+            recyclables_id, urgency_type, deal_type = key
+            applications = applications.filter(
+                recyclables_id=recyclables_id,
+                urgency_type=urgency_type,
+                deal_type=deal_type,
+            )
+            marks = (
+                marks.filter(recyclable_id=recyclables_id, deal_type=deal_type)
+                if urgency_type == UrgencyType.SUPPLY_CONTRACT
+                else marks.none()
+            )
+        if date is not None:
+            applications = applications.filter(created_at__date=date)
+            marks = marks.filter(created_at__date=date)
+        applications = applications.order_by("created_at").values_list(
+            "recyclables_id", "urgency_type", "deal_type", "created_at", "price"
+        )
+        marks = marks.order_by("created_at").values_list(
+            "recyclable_id", "deal_type", "created_at", "price"
+        )
+        observations = heapq.merge(
+            (
+                ((recyclables_id, urgency_type, deal_type), created_at, price)
+                for recyclables_id, urgency_type, deal_type, created_at, price
+                in applications.iterator()
+            ),
+            (
+                ((recyclable_id, UrgencyType.SUPPLY_CONTRACT, deal_type), created_at, price)
+                for recyclable_id, deal_type, created_at, price in marks.iterator()
+            ),
+            key=lambda observation: observation[1],
+        )
+        for key, created_at, price in observations:
+            yield key, timezone.localdate(created_at), price
+
+    def rebuild(self):
+        """
+        Replaces all candles with candles collected from price observations
+        """
+        candles = collect_daily_candles(self.get_price_observations())
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                [
+                    PriceCandle(
+                        recyclables_id=key[0],
+                        urgency_type=key[1],
+                        deal_type=key[2],
+                        date=date,
+                        **values,
+                    )
+                    for (key, date), values in candles.items()
+                ],
+                batch_size=1000,
+            )
+
+
+class PriceCandle(BaseModel):
+    """
+    Daily price candle of recyclable by urgency type and deal type
+    """
+
+    recyclables = models.ForeignKey(
+        "product.Recyclables",
+        verbose_name="Вторсырье",
+        on_delete=models.CASCADE,
+        related_name="price_candles",
+    )
+    urgency_type = get_field_from_choices("Срочность", UrgencyType)
+    deal_type = get_field_from_choices("Тип сделки", DealType)
+    date = models.DateField("Дата")
+    open = AmountField("Цена открытия")
+    high = AmountField("Максимальная цена")
+    low = AmountField("Минимальная цена")
+    close = AmountField("Цена закрытия")
+    median = AmountField("Медианная цена")
+    count = models.PositiveIntegerField("Количество цен", default=0)
+    total = models.DecimalField("Сумма цен", max_digits=20, decimal_places=2, default=0)
+    # Скетч цен дня для оценки медианы недель и месяцев (KLLSketch.to_dict)
+    sketch = models.JSONField("Скетч", default=dict)
+
+    objects = PriceCandleQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Ценовая свеча"
+        verbose_name_plural = "Ценовые свечи"
+        db_table = "price_candles"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recyclables", "urgency_type", "deal_type", "date"],
+                name="unique_price_candle",
+            )
+        ]
+
+    def get_values(self) -> dict:
+        return {field: getattr(self, field) for field in CANDLE_FIELDS}
+
+
+class PriceQuantileSketchQuerySet(models.QuerySet):
+    def add_price(self, recyclables_id, deal_type, price):
+        with transaction.atomic():
+            sketch, _ = self.select_for_update().get_or_create(
+                recyclables_id=recyclables_id, deal_type=deal_type
+            )
+            sketch.add_prices([price])
+            sketch.save()
+        return sketch
+
+    def refresh(self, recyclables_id, deal_type):
+        """
+        Recreates the sketch of one recyclable and deal type from its marks:
+        the sketch cannot remove a price of a deleted or edited mark
+        """
+        prices = (
+            ContractsStatisticsMark.objects.filter(
+                recyclable_id=recyclables_id, deal_type=deal_type, is_deleted=False
+            )
+            .order_by("created_at")
+            .values_list("price", flat=True)
+        )
+        with transaction.atomic():
+            sketch, _ = self.select_for_update().get_or_create(
+                recyclables_id=recyclables_id, deal_type=deal_type
+            )
+            sketch.count, sketch.total, sketch.sketch = 0, Decimal(0), {}
+            sketch.add_prices(prices.iterator())
+            if sketch.count:
+                sketch.save()
+            else:
+                sketch.delete()
+
+    def rebuild(self):
+        """
+        Recreates sketches from all contracts statistics marks
+        """
+        marks = (
+            ContractsStatisticsMark.objects.filter(is_deleted=False)
+            .order_by("recyclable_id", "deal_type", "created_at")
+            .values_list("recyclable_id", "deal_type", "price")
+        )
+        sketches = {}
+        for recyclables_id, deal_type, price in marks.iterator():
+            key = (recyclables_id, deal_type)
+            if key not in sketches:
+                sketches[key] = PriceQuantileSketch(
+                    recyclables_id=recyclables_id, deal_type=deal_type
+                )
+            sketches[key].add_prices([price])
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(sketches.values(), batch_size=500)
+
+
+class PriceQuantileSketch(BaseModel):
+    """
+    Streaming quantile sketch of supply contracts prices
+    (ContractsStatisticsMark) by recyclable and deal type
+    """
+
+    recyclables = models.ForeignKey(
+        "product.Recyclables",
+        verbose_name="Вторсырье",
+        on_delete=models.CASCADE,
+        related_name="price_sketches",
+    )
+    deal_type = get_field_from_choices("Тип сделки", DealType)
+    count = models.PositiveIntegerField("Количество цен", default=0)
+    total = models.DecimalField("Сумма цен", max_digits=20, decimal_places=2, default=0)
+    sketch = models.JSONField("Скетч", default=dict)
+
+    objects = PriceQuantileSketchQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Распределение цен"
+        verbose_name_plural = "Распределения цен"
+        db_table = "price_quantile_sketches"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recyclables", "deal_type"],
+                name="unique_price_quantile_sketch",
+            )
+        ]
+
+    def get_sketch(self) -> KLLSketch:
+        return KLLSketch.from_dict(self.sketch) if self.sketch else KLLSketch()
+
+    def add_prices(self, prices):
+        sketch = self.get_sketch()
+        for price in prices:
+            sketch.update(price)
+            self.count += 1
+            self.total += Decimal(price)
+        self.sketch = sketch.to_dict()
+
+    def get_quantiles(self, fractions):
+        return self.get_sketch().quantiles(fractions)
+
+
+class DailyExchangeVolumeQuerySet(models.QuerySet):
+    def add(self, rows, sign=1):
+        """
+        Adds (sign=1) or subtracts (sign=-1) exchange_volume_rows() of applications
+        """
+        for row in rows:
+            row = dict(row)
+            key = {
+                "date": row.pop("date"),
+                "recyclables_id": row.pop("recyclables_id"),
+                "urgency_type": row.pop("urgency_type"),
+                "deal_type": row.pop("deal_type"),
+                "status": row.pop("status"),
+                "application_is_deleted": row.pop("is_deleted"),
+            }
+            total = sign * row["total"]
+            applications_count = sign * row["applications_count"]
+            with transaction.atomic():
+                updated = self.filter(**key).update(
+                    total=F("total") + total,
+                    applications_count=F("applications_count") + applications_count,
+                )
+                if updated:
+                    continue
+                try:
+                    with transaction.atomic():
+                        self.create(
+                            **key, total=total, applications_count=applications_count
+                        )
+                except IntegrityError:
+                    # Счетчик создан параллельным запросом
+                    self.filter(**key).update(
+                        total=F("total") + total,
+                        applications_count=F("applications_count") + applications_count,
+                    )
+
+    def rebuild(self):
+        with transaction.atomic():
+            self.all().delete()
+            self.add(RecyclablesApplication.objects.exchange_volume_rows().iterator())
+
+
+class DailyExchangeVolume(models.Model):
+    """
+    Running totals of applications price (exchange volume) by day of creation
+    and the most used filters of applications
+    """
+
+    date = models.DateField("Дата создания заявок")
+    recyclables = models.ForeignKey(
+        "product.Recyclables",
+        verbose_name="Вторсырье",
+        on_delete=models.CASCADE,
+        related_name="daily_exchange_volumes",
+    )
+    urgency_type = get_field_from_choices("Срочность", UrgencyType)
+    deal_type = get_field_from_choices("Тип сделки", DealType)
+    status = get_field_from_choices("Статус заявок", ApplicationStatus)
+    application_is_deleted = models.BooleanField("Заявки удалены", default=False)
+    total = models.DecimalField("Объем торгов", max_digits=20, decimal_places=2, default=0)
+    applications_count = models.IntegerField("Количество заявок", default=0)
+
+    objects = DailyExchangeVolumeQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Объем торгов за день"
+        verbose_name_plural = "Объемы торгов по дням"
+        db_table = "daily_exchange_volumes"
+        constraints = [
+            models.UniqueConstraint(
+                fields=[
+                    "date",
+                    "recyclables",
+                    "urgency_type",
+                    "deal_type",
+                    "status",
+                    "application_is_deleted",
+                ],
+                name="unique_daily_exchange_volume",
+            )
+        ]
+
+
 class EquipmentApplication(
     BaseModel, AddressFieldsModelMixin, ApplicationSaveMixin
 ):
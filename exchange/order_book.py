@@ -0,0 +1,285 @@
+import bisect
+import heapq
+import threading
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.core.cache import cache
+
+from exchange.models import ApplicationStatus, DealType, RecyclablesApplication
+
+BookKey = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class OrderBookEntry:
+    application_id: int
+    company_id: int
+    deal_type: int
+    price: Decimal
+    created_at: datetime
+    total_weight: Optional[float]
+
+    @classmethod
+    def from_application(cls, application: RecyclablesApplication):
+        return cls(
+            application_id=application.pk,
+            company_id=application.company_id,
+            deal_type=application.deal_type,
+            price=application.price,
+            created_at=application.created_at,
+            total_weight=application.total_weight,
+        )
+
+
+def is_in_book(application: RecyclablesApplication) -> bool:
+    """
+    Only published and not deleted applications take part in the book
+    """
+    return (
+            application.status == ApplicationStatus.PUBLISHED
+            and not application.is_deleted
+    )
+
+
+class OrderBook:
+    """
+    Order book of one recyclable and urgency type.
+    Bids and asks are kept in lists sorted in price-time priority
+    by (price, created_at, application_id), so the best levels are read
+    without sorting and entries are found with bisect
+    """
+
+    def __init__(self):
+        self.entries: Dict[int, OrderBookEntry] = {}
+        self.bids: List[tuple] = []
+        self.asks: List[tuple] = []
+
+    @staticmethod
+    def _sort_key(entry: OrderBookEntry) -> tuple:
+        # Покупка: сначала самая высокая цена, продажа: самая низкая,
+        # при равной цене - более ранняя заявка
+        price = -entry.price if entry.deal_type == DealType.BUY else entry.price
+        return price, entry.created_at, entry.application_id
+
+    def _side(self, deal_type: int) -> List[tuple]:
+        return self.bids if deal_type == DealType.BUY else self.asks
+
+    def add(self, entry: OrderBookEntry):
+        self.remove(entry.application_id)
+        self.entries[entry.application_id] = entry
+        bisect.insort(self._side(entry.deal_type), self._sort_key(entry))
+
+    def remove(self, application_id: int):
+        entry = self.entries.pop(application_id, None)
+        if entry is None:
+            return
+        side = self._side(entry.deal_type)
+        key = self._sort_key(entry)
+        index = bisect.bisect_left(side, key)
+        if index < len(side) and side[index] == key:
+            del side[index]
+
+    def _iter_entries(self, deal_type: int) -> Iterator[OrderBookEntry]:
+        for *_, application_id in self._side(deal_type):
+            yield self.entries[application_id]
+
+    def best(self, deal_type: int) -> Optional[OrderBookEntry]:
+        return next(self._iter_entries(deal_type), None)
+
+    def sorted_entries(self, deal_type: int) -> List[OrderBookEntry]:
+        return list(self._iter_entries(deal_type))
+
+    def depth(self, deal_type: int, levels: int) -> List[dict]:
+        """
+        Aggregates entries by price level, best levels first
+        """
+        result = []
+        for entry in self._iter_entries(deal_type):
+            if result and result[-1]["price"] == entry.price:
+                level = result[-1]
+            else:
+                if len(result) == levels:
+                    break
+                level = {"price": entry.price, "count": 0, "total_weight": 0.0}
+                result.append(level)
+            level["count"] += 1
+            level["total_weight"] += entry.total_weight or 0.0
+        return result
+
+    def crossable_pairs(self, limit: int) -> List[dict]:
+        """
+        Greedily matches the best bids with the best asks while bid price
+        is not lower than ask price. Applications of the same company are not matched
+        """
+        best_bid = self.best(DealType.BUY)
+        if best_bid is None:
+            return []
+        # Очереди продаж по компаниям и куча из лучших продаж каждой компании:
+        # для покупки берется лучшая продажа другой компании
+        asks_by_company = defaultdict(deque)
+        for ask in self._iter_entries(DealType.SELL):
+            if ask.price > best_bid.price:
+                break
+            asks_by_company[ask.company_id].append(ask)
+        heads = [
+            (self._sort_key(asks[0]), company_id)
+            for company_id, asks in asks_by_company.items()
+        ]
+        heapq.heapify(heads)
+
+        pairs = []
+        for bid in self._iter_entries(DealType.BUY):
+            if len(pairs) == limit or not heads:
+                break
+            if heads[0][0][0] > bid.price:
+                # Следующие покупки не дороже текущей
+                break
+            own = heapq.heappop(heads) if heads[0][1] == bid.company_id else None
+            if heads and heads[0][0][0] <= bid.price:
+                _, company_id = heapq.heappop(heads)
+                asks = asks_by_company[company_id]
+                ask = asks.popleft()
+                if asks:
+                    heapq.heappush(heads, (self._sort_key(asks[0]), company_id))
+                pairs.append(
+                    {
+                        "buying_id": bid.application_id,
+                        "selling_id": ask.application_id,
+                        "buying_price": bid.price,
+                        "selling_price": ask.price,
+                    }
+                )
+            if own is not None:
+                heapq.heappush(heads, own)
+        return pairs
+
+
+class OrderBookRegistry:
+    """
+    Per process registry of order books keyed by (recyclables_id, urgency_type).
+    A book is loaded from the database on first access and then updated incrementally.
+    Every change bumps the version of the key in the shared cache, so books
+    of other worker processes are reloaded on their next access
+    """
+
+    version_key_template = "order_book_version:{}:{}"
+
+    def __init__(self):
+        self.books: Dict[BookKey, OrderBook] = {}
+        self.versions: Dict[BookKey, int] = {}
+        self.locations: Dict[int, BookKey] = {}
+        self.lock = threading.RLock()
+
+    def _get_version(self, key: BookKey) -> int:
+        return cache.get(self.version_key_template.format(*key), 0)
+
+    def _bump_version(self, key: BookKey) -> int:
+        cache_key = self.version_key_template.format(*key)
+        try:
+            return cache.incr(cache_key)
+        except ValueError:
+            cache.set(cache_key, 1, None)
+            return 1
+
+    def _load(self, key: BookKey) -> OrderBook:
+        version = self._get_version(key)
+        book = OrderBook()
+        applications = RecyclablesApplication.objects.filter(
+            recyclables_id=key[0],
+            urgency_type=key[1],
+            status=ApplicationStatus.PUBLISHED,
+            is_deleted=False,
+        ).only(
+            "id", "company", "deal_type", "price", "created_at", "total_weight"
+        )
+        for application in applications.iterator():
+            book.add(OrderBookEntry.from_application(application))
+            self.locations[application.pk] = key
+        self.books[key] = book
+        self.versions[key] = version
+        return book
+
+    def get_book(self, recyclables_id: int, urgency_type: int) -> OrderBook:
+        key = (int(recyclables_id), int(urgency_type))
+        with self.lock:
+            book = self.books.get(key)
+            if book is None or self.versions.get(key) != self._get_version(key):
+                book = self._load(key)
+            return book
+
+    def rebuild(self):
+        """
+        Reloads all books that have published applications
+        """
+        keys = (
+            RecyclablesApplication.objects.filter(
+                status=ApplicationStatus.PUBLISHED, is_deleted=False
+            )
+            .values_list("recyclables_id", "urgency_type")
+            .distinct()
+        )
+        with self.lock:
+            self.books.clear()
+            self.versions.clear()
+            self.locations.clear()
+            for key in keys:
+                self._load(key)
+
+    def _remove(self, application_id: int) -> Optional[BookKey]:
+        key = self.locations.pop(application_id, None)
+        if key is not None and key in self.books:
+            self.books[key].remove(application_id)
+        return key
+
+    def update(self, application: RecyclablesApplication):
+        key = (application.recyclables_id, application.urgency_type)
+        with self.lock:
+            old_key = self._remove(application.pk)
+            if is_in_book(application):
+                self._apply(key, OrderBookEntry.from_application(application))
+            else:
+                self._bump(key)
+            if old_key is not None and old_key != key:
+                self._bump(old_key)
+
+    def discard(self, application: RecyclablesApplication):
+        with self.lock:
+            self._remove(application.pk)
+            self._bump((application.recyclables_id, application.urgency_type))
+
+    def invalidate(self, recyclables_id: int, urgency_type: int):
+        """
+        Forces reloading of the book, used after bulk operations that bypass save()
+        """
+        key = (int(recyclables_id), int(urgency_type))
+        with self.lock:
+            self._bump_version(key)
+            self.books.pop(key, None)
+
+    def _apply(self, key: BookKey, entry: Optional[OrderBookEntry]):
+        book = self.books.get(key)
+        current_version = self._get_version(key)
+        version = self._bump_version(key)
+        # Книга этого процесса актуальна и никто не менял ее параллельно,
+        # достаточно инкрементального обновления
+        if (
+                book is not None
+                and self.versions.get(key) == current_version
+                and version == current_version + 1
+        ):
+            if entry is not None:
+                book.add(entry)
+                self.locations[entry.application_id] = key
+            self.versions[key] = version
+        else:
+            self.books.pop(key, None)
+
+    def _bump(self, key: BookKey):
+        self._apply(key, None)
+
+
+order_book = OrderBookRegistry()
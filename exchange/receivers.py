@@ -0,0 +1,273 @@
+from decimal import Decimal
+from functools import partial
+from typing import Optional
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from chat.models import ChatParticipant
+from common.cache import bump_model_version
+
+from exchange.candles import CandleKey
+from exchange.models import (
+    ApplicationStatus,
+    ContractsStatisticsMark,
+    DailyExchangeVolume,
+    EquipmentDeal,
+    PriceCandle,
+    PriceQuantileSketch,
+    RecyclablesApplication,
+    RecyclablesDeal,
+    SpecialApplication,
+    SpecialApps,
+    UrgencyType,
+)
+from exchange.order_book import order_book
+from exchange.services import invalidate_companies_offers
+
+
+# Сохраненное состояние заявки читается одним запросом до сохранения
+# и используется всеми обработчиками post_save, в том числе в product.receivers
+
+@receiver(pre_save, sender=RecyclablesApplication)
+def remember_previous_state(sender, instance, **kwargs):
+    instance._previous_state = (
+        RecyclablesApplication.objects.filter(pk=instance.pk).saved_states().first()
+        if instance.pk
+        else None
+    )
+
+
+def get_exchange_volume_rows(state) -> list:
+    """
+    Contribution of one application to DailyExchangeVolume
+    in the format of exchange_volume_rows()
+    """
+    if state is None:
+        return []
+    return [
+        {
+            "date": state["date"],
+            "recyclables_id": state["recyclables_id"],
+            "urgency_type": state["urgency_type"],
+            "deal_type": state["deal_type"],
+            "status": state["status"],
+            "is_deleted": state["is_deleted"],
+            "total": state["total"],
+            "applications_count": 1,
+        }
+    ]
+
+
+# Книга заявок обновляется только после фиксации транзакции,
+# чтобы откаченные изменения в нее не попадали.
+# Смена статуса тоже проходит через save, отдельный обработчик
+# application_status_changed не нужен
+
+@receiver(post_save, sender=RecyclablesApplication)
+def update_order_book_on_save(sender, instance, **kwargs):
+    transaction.on_commit(partial(order_book.update, instance))
+
+
+@receiver(post_delete, sender=RecyclablesApplication)
+def discard_from_order_book(sender, instance, **kwargs):
+    transaction.on_commit(partial(order_book.discard, instance))
+
+
+@receiver([post_save, post_delete], sender=RecyclablesApplication)
+def invalidate_offers_on_application_change(sender, instance, **kwargs):
+    transaction.on_commit(partial(invalidate_companies_offers, instance.recyclables_id))
+
+
+@receiver([post_save, post_delete], sender=RecyclablesDeal)
+def invalidate_offers_on_deal_change(sender, instance, **kwargs):
+    recyclable_id = instance.application.recyclables_id
+    transaction.on_commit(partial(invalidate_companies_offers, recyclable_id))
+
+
+# Свечи по контрактам на поставку пополняются новыми отметками цен,
+# по готовому к отгрузке - ценами опубликованных заявок.
+# Изменение цены или снятие заявки с публикации заменяет ее цену
+# в свече дня создания заявки: свеча этого дня собирается заново
+
+@receiver([post_save, post_delete], sender=ContractsStatisticsMark)
+def update_statistics_mark_price_candle(sender, instance, created=False, **kwargs):
+    if created:
+        transaction.on_commit(
+            partial(
+                PriceCandle.objects.append_price,
+                instance.recyclable_id,
+                UrgencyType.SUPPLY_CONTRACT,
+                instance.deal_type,
+                instance.price,
+                instance.created_at,
+            )
+        )
+        return
+    transaction.on_commit(
+        partial(
+            PriceCandle.objects.refresh,
+            (instance.recyclable_id, UrgencyType.SUPPLY_CONTRACT, instance.deal_type),
+            timezone.localdate(instance.created_at),
+        )
+    )
+
+
+# Новая отметка добавляется в скетч, при удалении отметки
+# или изменении ее цены скетч пересобирается: KLL не умеет удалять значения
+
+@receiver(pre_save, sender=ContractsStatisticsMark)
+def remember_previous_mark_state(sender, instance, **kwargs):
+    instance._previous_state = (
+        ContractsStatisticsMark.objects.filter(pk=instance.pk)
+        .values("recyclable_id", "deal_type", "price", "is_deleted")
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=ContractsStatisticsMark)
+def add_statistics_mark_price_to_sketch(sender, instance, created, **kwargs):
+    if created:
+        if not instance.is_deleted:
+            transaction.on_commit(
+                partial(
+                    PriceQuantileSketch.objects.add_price,
+                    instance.recyclable_id,
+                    instance.deal_type,
+                    instance.price,
+                )
+            )
+        return
+    previous = getattr(instance, "_previous_state", None)
+    state = {
+        "recyclable_id": instance.recyclable_id,
+        "deal_type": instance.deal_type,
+        "price": Decimal(str(instance.price)),
+        "is_deleted": instance.is_deleted,
+    }
+    if previous == state:
+        return
+    keys = {(instance.recyclable_id, instance.deal_type)}
+    if previous is not None:
+        keys.add((previous["recyclable_id"], previous["deal_type"]))
+    for recyclables_id, deal_type in keys:
+        transaction.on_commit(
+            partial(PriceQuantileSketch.objects.refresh, recyclables_id, deal_type)
+        )
+
+
+@receiver(post_delete, sender=ContractsStatisticsMark)
+def remove_statistics_mark_price_from_sketch(sender, instance, **kwargs):
+    if not instance.is_deleted:
+        transaction.on_commit(
+            partial(
+                PriceQuantileSketch.objects.refresh,
+                instance.recyclable_id,
+                instance.deal_type,
+            )
+        )
+
+
+def get_price_candle_key(state) -> Optional[CandleKey]:
+    """
+    Candle the application price is observed in,
+    supply contracts candles are built from statistics marks
+    """
+    if (
+            state is None
+            or state["urgency_type"] != UrgencyType.READY_FOR_SHIPMENT
+            or state["status"] != ApplicationStatus.PUBLISHED
+            or state["is_deleted"]
+    ):
+        return None
+    return state["recyclables_id"], state["urgency_type"], state["deal_type"]
+
+
+def get_application_state(instance) -> dict:
+    return {
+        "price": Decimal(str(instance.price)),
+        "status": instance.status,
+        "is_deleted": instance.is_deleted,
+        "recyclables_id": instance.recyclables_id,
+        "urgency_type": instance.urgency_type,
+        "deal_type": instance.deal_type,
+    }
+
+
+def refresh_application_price_candles(instance, previous_state, state):
+    if previous_state is not None and state is not None and all(
+            previous_state[field] == value for field, value in state.items()
+    ):
+        return
+    keys = {get_price_candle_key(previous_state), get_price_candle_key(state)} - {None}
+    date = timezone.localdate(instance.created_at)
+    for key in keys:
+        transaction.on_commit(partial(PriceCandle.objects.refresh, key, date))
+
+
+@receiver(post_save, sender=RecyclablesApplication)
+def update_application_price_candle(sender, instance, **kwargs):
+    refresh_application_price_candles(
+        instance,
+        getattr(instance, "_previous_state", None),
+        get_application_state(instance),
+    )
+
+
+@receiver(post_delete, sender=RecyclablesApplication)
+def remove_application_price_from_candle(sender, instance, **kwargs):
+    refresh_application_price_candles(
+        instance, get_application_state(instance), None
+    )
+
+
+# Счетчики объема торгов обновляются в той же транзакции, что и заявка:
+# вклад заявки до изменения вычитается, после изменения - добавляется
+
+@receiver(post_save, sender=RecyclablesApplication)
+def update_exchange_volume_on_save(sender, instance, **kwargs):
+    rows = get_exchange_volume_rows(
+        RecyclablesApplication.objects.filter(pk=instance.pk).saved_states().first()
+    )
+    previous = get_exchange_volume_rows(getattr(instance, "_previous_state", None))
+    if rows == previous:
+        return
+    with transaction.atomic():
+        DailyExchangeVolume.objects.add(previous, sign=-1)
+        DailyExchangeVolume.objects.add(rows)
+
+
+@receiver(pre_delete, sender=RecyclablesApplication)
+def update_exchange_volume_on_delete(sender, instance, **kwargs):
+    DailyExchangeVolume.objects.add(
+        RecyclablesApplication.objects.filter(pk=instance.pk).exchange_volume_rows(),
+        sign=-1,
+    )
+
+
+@receiver([post_save, post_delete], sender=RecyclablesApplication)
+@receiver([post_save, post_delete], sender=RecyclablesDeal)
+def bump_response_cache_version(sender, **kwargs):
+    transaction.on_commit(partial(bump_model_version, sender))
+
+
+# Участники чатов сделок и специальных заявок, см. ChatParticipant
+
+@receiver([post_save, post_delete], sender=RecyclablesDeal)
+@receiver([post_save, post_delete], sender=EquipmentDeal)
+def refresh_deal_chat_participants(sender, instance, **kwargs):
+    transaction.on_commit(partial(ChatParticipant.objects.refresh, [instance.chat_id]))
+
+
+@receiver([post_save, post_delete], sender=SpecialApps)
+def refresh_special_application_chat_participants(sender, instance, **kwargs):
+    chat_id = (
+        SpecialApplication.objects.filter(pk=instance.special_application_id)
+        .values_list("chat_id", flat=True)
+        .first()
+    )
+    transaction.on_commit(partial(ChatParticipant.objects.refresh, [chat_id]))
@@ -1,7 +1,10 @@
 from typing import List, Tuple
 
+import numpy as np
+from django.core.cache import cache
+from django.db.models.expressions import RawSQL
 from rest_framework.exceptions import ValidationError
-from shapely import Polygon, Point
+from shapely import Polygon, contains_xy, prepare
 
 
 def parse_coordinates(raw_coordinates: List) -> List[List[float]]:
@@ -66,27 +69,53 @@ def filter_qs_by_coordinates(qs, raw_coordinates):
     min_longitude, max_longitude = get_longitude_borders(list_of_coordinates)
     # Creating polygon from coordinates
     polygon = Polygon(list_of_coordinates)
-    # Filtering firstly by extremum values
+    # Filtering firstly by extremum values (uses latitude/longitude index)
     qs = qs.filter(
         latitude__gte=min_latitude,
         latitude__lte=max_latitude,
         longitude__gte=min_longitude,
         longitude__lte=max_longitude,
     )
-    # Secondly, check if objects in given polygon
-    filtered_ids = list(
-        map(
-            lambda filtered_recyclable: filtered_recyclable.pk,
-            filter(
-                lambda recyclable: polygon.contains(
-                    Point(
-                        float(recyclable.latitude),
-                        float(recyclable.longitude),
-                    )
-                ),
-                qs,
-            ),
-        )
+    # Polygon is a rectangle, so the extremum filter is already exact
+    if polygon.equals(polygon.envelope):
+        return qs
+
+    # Secondly, check if objects in given polygon.
+    # Only (id, latitude, longitude) are fetched and checked in one vectorized call
+    rows = np.array(
+        qs.order_by().values_list("pk", "latitude", "longitude"), dtype=float
+    ).reshape(-1, 3)
+    prepare(polygon)
+    inside = contains_xy(polygon, rows[:, 1], rows[:, 2])
+    filtered_ids = rows[inside, 0].astype(np.int64).tolist()
+
+    # Ids are passed as a single array parameter of the subquery
+    # instead of building IN clause with a placeholder per id
+    return qs.filter(
+        pk__in=RawSQL("SELECT unnest(%s::bigint[])", (filtered_ids,))
     )
-    qs = qs.filter(id__in=filtered_ids)
-    return qs
+
+
+# Данные компаний (адрес, отзывы) не инвалидируют кэш, поэтому он ограничен по времени
+COMPANIES_OFFERS_CACHE_TIMEOUT = 5 * 60
+
+
+def get_companies_offers_version(recyclable_id) -> int:
+    return cache.get(f"companies_offers_version:{recyclable_id}", 0)
+
+
+def get_companies_offers_cache_key(recyclable_id, ordering=None) -> str:
+    version = get_companies_offers_version(recyclable_id)
+    return f"companies_offers:{recyclable_id}:{version}:{ordering or ''}"
+
+
+def invalidate_companies_offers(recyclable_id):
+    """
+    Bumps the version of cached companies offers of the recyclable,
+    so all cached orderings become outdated at once
+    """
+    key = f"companies_offers_version:{recyclable_id}"
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
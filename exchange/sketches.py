@@ -0,0 +1,94 @@
+import math
+import random
+from typing import Iterable, List, Optional
+
+DEFAULT_K = 200
+COMPACTOR_RATIO = 2 / 3
+
+
+class KLLSketch:
+    """
+    Mergeable streaming quantile sketch (Karnin, Lang, Liberty).
+    Keeps O(k) items regardless of the number of added values,
+    an item of compactor h stands for 2 ** h original values
+    """
+
+    def __init__(self, k: int = DEFAULT_K, compactors: Optional[List[List[float]]] = None):
+        self.k = k
+        self.compactors = compactors or [[]]
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KLLSketch":
+        return cls(k=data.get("k", DEFAULT_K), compactors=data.get("compactors"))
+
+    def to_dict(self) -> dict:
+        return {"k": self.k, "compactors": self.compactors}
+
+    @property
+    def size(self) -> int:
+        return sum(len(compactor) for compactor in self.compactors)
+
+    @property
+    def max_size(self) -> int:
+        return sum(self.capacity(height) for height in range(len(self.compactors)))
+
+    def capacity(self, height: int) -> int:
+        depth = len(self.compactors) - height - 1
+        return int(math.ceil(self.k * COMPACTOR_RATIO ** depth)) + 1
+
+    def update(self, value: float):
+        self.compactors[0].append(float(value))
+        if self.size >= self.max_size:
+            self.compress()
+
+    def extend(self, values: Iterable[float]):
+        for value in values:
+            self.update(value)
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for height, compactor in enumerate(other.compactors):
+            self.compactors[height].extend(compactor)
+        while self.size >= self.max_size:
+            self.compress()
+
+    def compress(self):
+        for height in range(len(self.compactors)):
+            compactor = self.compactors[height]
+            if len(compactor) < self.capacity(height):
+                continue
+            if height + 1 == len(self.compactors):
+                self.compactors.append([])
+            compactor.sort()
+            # Нечетный элемент остается на своем уровне
+            leftover = [compactor.pop()] if len(compactor) % 2 else []
+            offset = random.randint(0, 1)
+            self.compactors[height + 1].extend(compactor[offset::2])
+            self.compactors[height] = leftover
+            if self.size < self.max_size:
+                break
+
+    def quantiles(self, fractions: Iterable[float]) -> List[Optional[float]]:
+        """
+        Approximate values at the given fractions of the distribution (0..1)
+        """
+        items = sorted(
+            (value, 2 ** height)
+            for height, compactor in enumerate(self.compactors)
+            for value in compactor
+        )
+        total = sum(weight for _, weight in items)
+        result = []
+        for fraction in fractions:
+            if not items:
+                result.append(None)
+                continue
+            rank = fraction * total
+            cumulative = 0
+            for value, weight in items:
+                cumulative += weight
+                if cumulative >= rank:
+                    break
+            result.append(value)
+        return result
@@ -0,0 +1,227 @@
+import datetime
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from company.models import Company, CompanyStatus
+from exchange.models import (
+    ApplicationStatus,
+    DealType,
+    EquipmentApplication,
+    ContractsStatisticsMark,
+    PriceCandle,
+    PriceQuantileSketch,
+    RecyclablesApplication,
+    UrgencyType,
+)
+from exchange.api.serializers import RecyclablesDealsForOffers
+from exchange.api.views import RecyclablesDealViewSet
+from exchange.order_book import OrderBook, OrderBookEntry, order_book
+from product.models import Recyclables, RecyclablesCategory
+
+
+def create_company(**kwargs) -> Company:
+    kwargs.setdefault("name", "Тестовая компания")
+    kwargs.setdefault("inn", str(Company.objects.count() + 1))
+    kwargs.setdefault("phone", "+79990000000")
+    return Company.objects.create(**kwargs)
+
+
+class EquipmentApplicationSaveTestCase(TestCase):
+    def test_create_and_update(self):
+        application = EquipmentApplication.objects.create(
+            company=create_company(),
+            deal_type=DealType.SELL,
+            price=Decimal("1000"),
+            count=1,
+            manufacture_date=datetime.date(2020, 1, 1),
+        )
+        application.count = 2
+        application.save(update_fields=["count"])
+
+        application.refresh_from_db()
+        self.assertEqual(application.count, 2)
+
+
+class OrderBookTestCase(TestCase):
+    def test_add_same_application_twice(self):
+        book = OrderBook()
+        entry = OrderBookEntry(
+            application_id=1,
+            company_id=1,
+            deal_type=DealType.SELL,
+            price=Decimal("10"),
+            created_at=timezone.now(),
+            total_weight=100.0,
+        )
+        # Равные элементы кучи не должны доходить до сравнения OrderBookEntry
+        book.add(entry)
+        book.add(OrderBookEntry(**{**entry.__dict__, "total_weight": 200.0}))
+
+        self.assertEqual(book.best(DealType.SELL).total_weight, 200.0)
+        self.assertEqual(len(book.sorted_entries(DealType.SELL)), 1)
+
+    def test_crossable_pairs_skip_own_company(self):
+        book = OrderBook()
+        now = timezone.now()
+        for application_id, company_id, deal_type, price in (
+                (1, 1, DealType.BUY, "12"),
+                (2, 2, DealType.BUY, "11"),
+                (3, 1, DealType.SELL, "9"),
+                (4, 3, DealType.SELL, "10"),
+                (5, 3, DealType.SELL, "13"),
+        ):
+            book.add(
+                OrderBookEntry(
+                    application_id=application_id,
+                    company_id=company_id,
+                    deal_type=deal_type,
+                    price=Decimal(price),
+                    created_at=now,
+                    total_weight=100.0,
+                )
+            )
+
+        self.assertEqual(
+            [(pair["buying_id"], pair["selling_id"]) for pair in book.crossable_pairs(10)],
+            [(1, 4), (2, 3)],
+        )
+        self.assertEqual(
+            [level["price"] for level in book.depth(DealType.SELL, 2)],
+            [Decimal("9"), Decimal("10")],
+        )
+
+    def test_update_application_twice(self):
+        recyclables = Recyclables.objects.create(
+            name="Картон",
+            category=RecyclablesCategory.objects.create(name="Бумага"),
+        )
+        application = RecyclablesApplication.objects.create(
+            company=create_company(status=CompanyStatus.VERIFIED),
+            recyclables=recyclables,
+            deal_type=DealType.SELL,
+            urgency_type=UrgencyType.READY_FOR_SHIPMENT,
+            status=ApplicationStatus.PUBLISHED,
+            price=Decimal("10"),
+            full_weigth=100,
+        )
+        # Книга загружена, дальше она обновляется инкрементально
+        order_book.get_book(recyclables.pk, UrgencyType.READY_FOR_SHIPMENT)
+
+        for full_weigth in (200, 300):
+            with self.captureOnCommitCallbacks(execute=True):
+                application.full_weigth = full_weigth
+                application.save()
+
+        book = order_book.get_book(recyclables.pk, UrgencyType.READY_FOR_SHIPMENT)
+        self.assertEqual(
+            [entry.total_weight for entry in book.sorted_entries(DealType.SELL)],
+            [300],
+        )
+
+
+class PriceCandleTestCase(TestCase):
+    def test_edited_price_replaces_previous(self):
+        recyclables = Recyclables.objects.create(
+            name="Картон",
+            category=RecyclablesCategory.objects.create(name="Бумага"),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            application = RecyclablesApplication.objects.create(
+                company=create_company(status=CompanyStatus.VERIFIED),
+                recyclables=recyclables,
+                deal_type=DealType.SELL,
+                urgency_type=UrgencyType.READY_FOR_SHIPMENT,
+                status=ApplicationStatus.PUBLISHED,
+                price=Decimal("10"),
+                full_weigth=100,
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            application.price = Decimal("20")
+            application.save()
+
+        candle = PriceCandle.objects.get(recyclables=recyclables)
+        self.assertEqual(candle.count, 1)
+        self.assertEqual(candle.total, Decimal("20"))
+        self.assertEqual((candle.open, candle.high, candle.low), (20, 20, 20))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            application.status = ApplicationStatus.CLOSED
+            application.save()
+
+        self.assertFalse(PriceCandle.objects.filter(recyclables=recyclables).exists())
+
+
+class CompaniesOffersQueriesTestCase(TestCase):
+    """
+    Number of queries of companies_offers does not depend on the number of companies
+    """
+
+    def setUp(self):
+        self.recyclables = Recyclables.objects.create(
+            name="Картон",
+            category=RecyclablesCategory.objects.create(name="Бумага"),
+        )
+
+    def create_buyer(self):
+        RecyclablesApplication.objects.create(
+            company=create_company(),
+            recyclables=self.recyclables,
+            deal_type=DealType.BUY,
+            urgency_type=UrgencyType.READY_FOR_SHIPMENT,
+            price=Decimal("10"),
+            full_weigth=100,
+        )
+
+    def count_queries(self) -> int:
+        with CaptureQueriesContext(connection) as context:
+            data = RecyclablesDealsForOffers(
+                RecyclablesDealViewSet().get_companies_offers_queryset(
+                    self.recyclables.pk
+                ),
+                many=True,
+            ).data
+        self.assertTrue(all(row["total_applications_count"] == 1 for row in data))
+        return len(context.captured_queries)
+
+    def test_queries_count(self):
+        self.create_buyer()
+        queries = self.count_queries()
+        for _ in range(3):
+            self.create_buyer()
+
+        self.assertEqual(self.count_queries(), queries)
+
+
+class PriceQuantileSketchTestCase(TestCase):
+    def test_deleted_mark_is_removed_from_sketch(self):
+        recyclables = Recyclables.objects.create(
+            name="Картон",
+            category=RecyclablesCategory.objects.create(name="Бумага"),
+        )
+        marks = []
+        for price in ("10", "20"):
+            with self.captureOnCommitCallbacks(execute=True):
+                marks.append(
+                    ContractsStatisticsMark.objects.create(
+                        company_id=1,
+                        company_name="Тестовая компания",
+                        recyclable_application_id=1,
+                        recyclable_id=recyclables.pk,
+                        recyclable_name=recyclables.name,
+                        recyclable_category_id=recyclables.category_id,
+                        recyclable_category_name="Бумага",
+                        deal_type=DealType.SELL,
+                        price=Decimal(price),
+                    )
+                )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            marks[0].is_deleted = True
+            marks[0].save()
+
+        sketch = PriceQuantileSketch.objects.get(recyclables=recyclables)
+        self.assertEqual((sketch.count, sketch.total), (1, Decimal("20")))
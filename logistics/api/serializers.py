@@ -1,5 +1,4 @@
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Q
 from rest_framework import serializers
 from rest_framework.generics import get_object_or_404
 
@@ -94,9 +93,13 @@ class TransportApplicationSerializer(
                 and not self.context.get("request").user.is_anonymous
                 and self.context.get("request").user.role == UserRole.LOGIST
         ):
-            my_offer = LogisticsOffer.objects.filter(
-                logist=self.context.get("request").user, application=instance
-            ).first()
+            # Предложения логиста могут быть загружены заранее, см. logist_feed
+            if hasattr(instance, "logist_offers"):
+                my_offer = next(iter(instance.logist_offers), None)
+            else:
+                my_offer = LogisticsOffer.objects.filter(
+                    logist=self.context.get("request").user, application=instance
+                ).first()
             if my_offer:
                 return LogisticsOfferSerializer(
                     my_offer, exclude=("application",)
@@ -333,7 +336,5 @@ class LogisticsOfferSerializer(NonNullDynamicFieldsModelSerializer):
                 self.context
         ):  # FIXME: разобраться почему не передается контекст при создании оффера
             user = self.context["request"].user
-            chat.unread_count = chat.messages.filter(
-                Q(is_read=False) & ~Q(author=user)
-            ).count()
+            chat.unread_count = chat.messages.unread_for(user).count()
         return ChatSerializer(chat, context=self.context).data
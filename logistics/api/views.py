@@ -4,7 +4,7 @@ from typing import Callable, Optional, Tuple, Union
 
 from django.contrib.contenttypes.models import ContentType
 from django.db.models import Count, QuerySet, Model
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Prefetch, Sum
 from django_filters import MultipleChoiceFilter
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet
 from drf_yasg.utils import swagger_auto_schema
@@ -15,13 +15,14 @@ from djangorestframework_camel_case.parser import (
 )
 from rest_framework import viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 from rest_framework_nested.viewsets import NestedViewSetMixin
 
+from common.pagination import KeysetPagination
 from common.serializers import EmptySerializer
 from common.views import MultiSerializerMixin, DocumentsMixin
 from company.models import City, Region
@@ -57,6 +58,7 @@ from logistics.api.serializers import (
 )
 from logistics.models import (
     Contractor,
+    LogisticsLaneStats,
     TransportApplication,
     LogisticsOffer,
     TransportApplicationStatus,
@@ -143,7 +145,7 @@ class TransportApplicationFilterBackend(filters.BaseFilterBackend):
                 return queryset.none()
 
             if logist_status_filter:
-                return queryset.filter(logist_status__in=logist_status_filter)
+                return queryset.filter_logist_status(user, logist_status_filter)
             else:
                 return queryset.none()
 
@@ -170,6 +172,7 @@ class TransportApplicationViewSet(
         "list": TransportApplicationSerializer,
         "retrieve": TransportApplicationSerializer,
         "create": CreateTransportApplicationSerializer,
+        "logist_feed": TransportApplicationSerializer,
     }
     default_serializer_class = UpdateTransportApplicationSerializer
     filter_backends = (
@@ -212,6 +215,45 @@ class TransportApplicationViewSet(
         """
         return super().list(request, *args, **kwargs)
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            api.Parameter(
+                "logistStatus",
+                api.IN_QUERY,
+                type=api.TYPE_ARRAY,
+                items=api.Items(api.TYPE_INTEGER),
+                required=False,
+                description="ID статуса заявки для логиста",
+            ),
+            api.Parameter(
+                "cursor",
+                api.IN_QUERY,
+                type=api.TYPE_STRING,
+                required=False,
+                description="Курсор страницы из next/previous",
+            ),
+        ]
+    )
+    @action(methods=["GET"], detail=False)
+    def logist_feed(self, request):
+        """
+        Лента заявок логиста (новые, в процессе, принятые, отклоненные)
+        с keyset пагинацией по дате создания
+        """
+        if request.user.is_anonymous or request.user.role != UserRole.LOGIST:
+            raise PermissionDenied
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(
+            Prefetch(
+                "offers",
+                queryset=LogisticsOffer.objects.filter(logist=request.user).order_by("pk"),
+                to_attr="logist_offers",
+            )
+        )
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @action(
         detail=True,
         methods=["get"],
@@ -312,9 +354,8 @@ class LogisticsOffersViewSet(
 
 
 class AnalyticsViewSet(GenericViewSet):
-    queryset = TransportApplication.objects.get_completed().select_related(
-        "shipping_city", "delivery_city"
-    )
+    # Статистика выполненных заявок по направлениям и дням, см. LogisticsLaneStats
+    queryset = LogisticsLaneStats.objects.all()
 
     serializer_class = EmptySerializer
 
@@ -350,10 +391,14 @@ class AnalyticsViewSet(GenericViewSet):
             city_qs, pk=shipping_city
         ), get_object_or_404(city_qs, pk=delivery_city)
 
-        applications = self.get_queryset().filter(
+        stats = self.get_queryset().filter(
             shipping_city=shipping_city, delivery_city=delivery_city
+        ).aggregate(total_amount=Sum("total_amount"), offers_count=Sum("offers_count"))
+        average_price = (
+            stats["total_amount"] / stats["offers_count"]
+            if stats["offers_count"]
+            else 0.0
         )
-        average_price = applications.get_average_delivery_price() or 0.0
         return Response({"average_price": average_price})
 
     @swagger_auto_schema(
@@ -396,14 +441,19 @@ class AnalyticsViewSet(GenericViewSet):
             city, region
         )
 
-        applications = self._get_filtered_applications(
+        stats = self._get_filtered_stats(
             location, lower_date_bound, location_filter_func
         )
-        total_sum = applications.get_total_delivery_sum()
-        total_weight = applications.get_total_weight()
-        total_count = applications.count()
+        totals = stats.aggregate(
+            total_sum=Sum("total_amount"),
+            total_weight=Sum("total_weight"),
+            total_count=Sum("applications_count"),
+        )
+        total_sum = totals["total_sum"] or 0.0
+        total_weight = totals["total_weight"] or 0.0
+        total_count = totals["total_count"] or 0
 
-        graph_data = self._get_graph_data(TruncClass, applications)
+        graph_data = self._get_graph_data(TruncClass, stats)
 
         return Response(
             {
@@ -434,13 +484,11 @@ class AnalyticsViewSet(GenericViewSet):
         return list(map(int, args))
 
     @staticmethod
-    def _get_graph_data(TruncClass, applications):
-        truncated_applications = applications.annotate(
-            truncated_date=TruncClass("deals__delivery_date")
-        ).order_by("truncated_date", "-created_at")
+    def _get_graph_data(TruncClass, stats):
         with_count = (
-            truncated_applications.values("truncated_date")
-            .annotate(count=Count("id"))
+            stats.annotate(truncated_date=TruncClass("date"))
+            .values("truncated_date")
+            .annotate(count=Sum("applications_count"))
             .order_by("truncated_date")
         )
         graph_data = with_count.values_list("count", "truncated_date")
@@ -466,7 +514,7 @@ class AnalyticsViewSet(GenericViewSet):
             return self._filter_by_region, region
         return None, None
 
-    def _get_filtered_applications(
+    def _get_filtered_stats(
         self,
         location: Union[City, Region],
         lower_date_bound: datetime.datetime,
@@ -480,10 +528,10 @@ class AnalyticsViewSet(GenericViewSet):
 
         additional_filters = {}
         if lower_date_bound:
-            additional_filters["deals__delivery_date__gte"] = lower_date_bound
+            additional_filters["date__gte"] = lower_date_bound
 
-        applications = self.get_queryset().filter(**additional_filters)
+        stats = self.get_queryset().filter(**additional_filters)
 
         if location and location_filter:
-            applications = location_filter(applications, location)
-        return applications
+            stats = location_filter(stats, location)
+        return stats
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from logistics.models import LogisticsLaneStats
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает статистику направлений по выполненным заявкам на транспорт"
+
+    def handle(self, *args, **options):
+        LogisticsLaneStats.objects.refresh()
+        self.stdout.write(
+            self.style.SUCCESS(f"Строк статистики: {LogisticsLaneStats.objects.count()}")
+        )
@@ -0,0 +1,37 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0028_geocodecache'),
+        ('logistics', '0020_alter_contractor_address'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogisticsLaneStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(db_index=True, null=True, verbose_name='Дата доставки по сделке')),
+                ('applications_count', models.PositiveIntegerField(default=0, verbose_name='Количество заявок')),
+                ('offers_count', models.PositiveIntegerField(default=0, verbose_name='Количество одобренных предложений')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=20, verbose_name='Сумма одобренных предложений')),
+                ('min_amount', models.DecimalField(decimal_places=2, max_digits=13, null=True, verbose_name='Минимальная стоимость доставки')),
+                ('max_amount', models.DecimalField(decimal_places=2, max_digits=13, null=True, verbose_name='Максимальная стоимость доставки')),
+                ('total_weight', models.FloatField(default=0, verbose_name='Общий вес')),
+                ('delivery_city', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='delivery_lane_stats', to='company.city', verbose_name='Город доставки')),
+                ('shipping_city', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='shipping_lane_stats', to='company.city', verbose_name='Город отгрузки')),
+            ],
+            options={
+                'verbose_name': 'Статистика направления',
+                'verbose_name_plural': 'Статистика направлений',
+                'db_table': 'logistics_lane_stats',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='logisticslanestats',
+            index=models.Index(fields=['shipping_city', 'delivery_city', 'date'], name='logistics_lane_stats_lane_idx'),
+        ),
+    ]
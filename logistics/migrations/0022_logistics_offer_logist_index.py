@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0021_logisticslanestats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logisticsoffer',
+            index=models.Index(fields=['application', 'logist', 'status'], name='logistic_offers_logist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transportapplication',
+            index=models.Index(fields=['created_at', 'id'], name='transport_app_created_idx'),
+        ),
+    ]
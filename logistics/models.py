@@ -7,8 +7,23 @@ from django.contrib.contenttypes.fields import (
     GenericRelation,
 )
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
-from django.db.models import Case, When, Q, OuterRef, Value, Avg, Sum
+from django.db import connection, models, transaction
+from django.db.models import (
+    Avg,
+    Case,
+    Count,
+    Exists,
+    F,
+    Max,
+    Min,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
 from phonenumber_field.modelfields import PhoneNumberField
 
 from chat.models import Chat
@@ -113,42 +128,56 @@ class TransportApplicationQuerySet(
     BulkUpdateOrCreateQuerySet, models.QuerySet
 ):
     def annotate_logist_status(self, user, *args, **kwargs):
+        """
+        Status of the application for the logist by his offers:
+        approved, pending or declined offer in this order, new if there are none.
+        One subquery per row over the (application, logist, status) index
+        """
+        logist_offers = LogisticsOffer.objects.filter(
+            application=OuterRef("pk"), logist=user
+        )
         return self.annotate(
-            logist_status=Case(
-                When(
-                    condition=Q(
-                        id__in=LogisticsOffer.objects.filter(
-                            logist=user,
-                            application=OuterRef("pk"),
-                            status=LogisticOfferStatus.APPROVED,
-                        ).values("application")
-                    ),
-                    then=Value(LogistTransportApplicationStatus.APPROVED),
-                ),
-                When(
-                    condition=Q(
-                        id__in=LogisticsOffer.objects.filter(
-                            logist=user,
-                            application=OuterRef("pk"),
-                            status=LogisticOfferStatus.PENDING,
-                        ).values("application")
-                    ),
-                    then=Value(LogistTransportApplicationStatus.PENDING),
-                ),
-                When(
-                    condition=Q(
-                        id__in=LogisticsOffer.objects.filter(
-                            logist=user,
-                            application=OuterRef("pk"),
-                            status=LogisticOfferStatus.DECLINED,
-                        ).values("application")
-                    ),
-                    then=Value(LogistTransportApplicationStatus.DECLINED),
+            logist_status=Coalesce(
+                Subquery(
+                    logist_offers.annotate(
+                        priority=Case(
+                            When(status=LogisticOfferStatus.APPROVED, then=Value(0)),
+                            When(status=LogisticOfferStatus.PENDING, then=Value(1)),
+                            default=Value(2),
+                        ),
+                        logist_status=Case(
+                            When(
+                                status=LogisticOfferStatus.APPROVED,
+                                then=Value(LogistTransportApplicationStatus.APPROVED),
+                            ),
+                            When(
+                                status=LogisticOfferStatus.PENDING,
+                                then=Value(LogistTransportApplicationStatus.PENDING),
+                            ),
+                            default=Value(LogistTransportApplicationStatus.DECLINED),
+                        ),
+                    )
+                    .order_by("priority")
+                    .values("logist_status")[:1]
                 ),
-                default=Value(LogistTransportApplicationStatus.NEW),
+                Value(LogistTransportApplicationStatus.NEW),
             )
         )
 
+    def filter_logist_status(self, user, statuses):
+        """
+        Filters annotate_logist_status() result, applications without
+        the logist offers are cut off first unless new ones are requested
+        """
+        queryset = self
+        if LogistTransportApplicationStatus.NEW not in statuses:
+            queryset = queryset.filter(
+                Exists(
+                    LogisticsOffer.objects.filter(application=OuterRef("pk"), logist=user)
+                )
+            )
+        return queryset.filter(logist_status__in=statuses)
+
     def get_average_delivery_price(self):
         return (
                 self.aggregate(
@@ -260,6 +289,12 @@ class TransportApplication(DeliveryFieldsModelMixin, BaseModel):
         db_table = "transport_applications"
 
         unique_together = [["object_id", "content_type"]]
+        indexes = [
+            # Keyset пагинация ленты логиста
+            models.Index(
+                fields=["created_at", "id"], name="transport_app_created_idx"
+            ),
+        ]
 
     def get_approved_offer(self):
         return self.offers.get(status=LogisticOfferStatus.APPROVED)
@@ -296,6 +331,12 @@ class LogisticsOffer(BaseNameModel):
         db_table = "logistic_offers"
         verbose_name = "Предложение логиста"
         verbose_name_plural = "Предложения логистов"
+        indexes = [
+            models.Index(
+                fields=["application", "logist", "status"],
+                name="logistic_offers_logist_idx",
+            ),
+        ]
 
     def decline_all_other_offers(self):
         """
@@ -319,3 +360,148 @@ class LogisticsOffer(BaseNameModel):
                 name=f"Предложение по логистике № {self.pk} к заявке № {self.application.pk}"
             )
             self.save()
+
+
+# Ключ advisory-блокировки пересчета статистики направлений:
+# полный пересчет берет ее монопольно, пересчет направлений - разделяемо
+# вместе с блокировками (город отгрузки, город доставки) своих направлений
+LANE_STATS_LOCK_ID = 190_365_001
+
+
+class LogisticsLaneStatsQuerySet(models.QuerySet):
+    @staticmethod
+    def get_lane_rows(applications):
+        """
+        Completed transport applications aggregated by lane and deal delivery date
+        """
+        return (
+            applications.get_completed()
+            .values("shipping_city_id", "delivery_city_id", date=F("deals__delivery_date"))
+            .annotate(
+                applications_count=Count("id"),
+                offers_count=Count("approved_logistics_offer"),
+                total_amount=Sum("approved_logistics_offer__amount"),
+                min_amount=Min("approved_logistics_offer__amount"),
+                max_amount=Max("approved_logistics_offer__amount"),
+                total_weight=Sum("weight"),
+            )
+            .order_by()
+        )
+
+    @staticmethod
+    def lock(lanes=None):
+        """
+        Serializes concurrent refreshes of the same lanes until the end
+        of the transaction, so their delete and insert do not interleave
+        """
+        with connection.cursor() as cursor:
+            if lanes is None:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LANE_STATS_LOCK_ID])
+                return
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock_shared(%s)", [LANE_STATS_LOCK_ID]
+            )
+            # Единый порядок захвата исключает взаимные блокировки
+            for shipping_city_id, delivery_city_id in sorted(
+                    {(shipping or 0, delivery or 0) for shipping, delivery in lanes}
+            ):
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(%s, %s)",
+                    [shipping_city_id, delivery_city_id],
+                )
+
+    def refresh(self, lanes=None):
+        """
+        Recalculates statistics of (shipping_city_id, delivery_city_id) lanes,
+        all lanes if they are not passed
+        """
+        applications = TransportApplication.objects.all()
+        stats = self.all()
+        if lanes is not None:
+            lanes = set(lanes)
+            lanes_filter = Q(pk__in=[])
+            for shipping_city_id, delivery_city_id in lanes:
+                lanes_filter |= Q(
+                    Q(shipping_city_id=shipping_city_id)
+                    if shipping_city_id
+                    else Q(shipping_city__isnull=True),
+                    Q(delivery_city_id=delivery_city_id)
+                    if delivery_city_id
+                    else Q(delivery_city__isnull=True),
+                )
+            applications = applications.filter(lanes_filter)
+            stats = stats.filter(lanes_filter)
+
+        with transaction.atomic():
+            self.lock(lanes)
+            stats.delete()
+            self.bulk_create(
+                [
+                    self.model(
+                        **{
+                            **row,
+                            "total_amount": row["total_amount"] or 0,
+                            "total_weight": row["total_weight"] or 0,
+                        }
+                    )
+                    for row in self.get_lane_rows(applications)
+                ],
+                batch_size=1000,
+            )
+
+
+class LogisticsLaneStats(models.Model):
+    """
+    Completed transport applications and their approved offers amounts
+    by lane (shipping and delivery cities) and day of deal delivery,
+    used by logistics analytics instead of the transport applications
+    """
+
+    shipping_city = models.ForeignKey(
+        "company.City",
+        verbose_name="Город отгрузки",
+        on_delete=models.CASCADE,
+        related_name="shipping_lane_stats",
+        null=True,
+    )
+    delivery_city = models.ForeignKey(
+        "company.City",
+        verbose_name="Город доставки",
+        on_delete=models.CASCADE,
+        related_name="delivery_lane_stats",
+        null=True,
+    )
+    date = models.DateField("Дата доставки по сделке", null=True, db_index=True)
+    applications_count = models.PositiveIntegerField("Количество заявок", default=0)
+    offers_count = models.PositiveIntegerField(
+        "Количество одобренных предложений", default=0
+    )
+    total_amount = models.DecimalField(
+        "Сумма одобренных предложений", max_digits=20, decimal_places=2, default=0
+    )
+    min_amount = models.DecimalField(
+        "Минимальная стоимость доставки", max_digits=13, decimal_places=2, null=True
+    )
+    max_amount = models.DecimalField(
+        "Максимальная стоимость доставки", max_digits=13, decimal_places=2, null=True
+    )
+    total_weight = models.FloatField("Общий вес", default=0)
+
+    objects = LogisticsLaneStatsQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Статистика направления"
+        verbose_name_plural = "Статистика направлений"
+        db_table = "logistics_lane_stats"
+        indexes = [
+            models.Index(
+                fields=["shipping_city", "delivery_city", "date"],
+                name="logistics_lane_stats_lane_idx",
+            ),
+        ]
+
+    @property
+    def average_amount(self):
+        if not self.offers_count:
+            return None
+        return self.total_amount / self.offers_count
@@ -0,0 +1,119 @@
+from functools import partial
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from chat.models import ChatParticipant
+from company.city_index import city_index
+from config.settings import CITY_INDEX_MAX_DISTANCE_KM
+from exchange.models import RecyclablesDeal
+from logistics.models import (
+    LogisticsLaneStats,
+    LogisticsOffer,
+    TransportApplication,
+    TransportApplicationStatus,
+)
+
+
+@receiver(pre_save, sender=TransportApplication)
+def set_transport_application_cities(sender, instance, **kwargs):
+    """
+    Fills missing shipping and delivery cities by coordinates
+    from the local city index, without requests to the geocoder
+    """
+    for prefix in ("shipping", "delivery"):
+        latitude = getattr(instance, f"{prefix}_latitude")
+        longitude = getattr(instance, f"{prefix}_longitude")
+        if getattr(instance, f"{prefix}_city_id") or latitude is None or longitude is None:
+            continue
+        nearest = city_index.nearest(latitude, longitude, CITY_INDEX_MAX_DISTANCE_KM)
+        if nearest:
+            setattr(instance, f"{prefix}_city_id", nearest[0])
+
+
+# Статистика направлений пересчитывается после фиксации транзакции
+# только для направлений выполненных заявок, затронутых изменением
+
+def refresh_lane_stats(lanes):
+    if lanes:
+        transaction.on_commit(partial(LogisticsLaneStats.objects.refresh, lanes))
+
+
+def get_completed_lanes(applications):
+    return set(
+        applications.get_completed().values_list("shipping_city_id", "delivery_city_id")
+    )
+
+
+@receiver(pre_save, sender=TransportApplication)
+def remember_previous_lane(sender, instance, **kwargs):
+    instance._previous_completed_lanes = (
+        get_completed_lanes(TransportApplication.objects.filter(pk=instance.pk))
+        if instance.pk
+        else set()
+    )
+
+
+@receiver(post_save, sender=TransportApplication)
+@receiver(post_delete, sender=TransportApplication)
+def refresh_transport_application_lane_stats(sender, instance, **kwargs):
+    lanes = set(getattr(instance, "_previous_completed_lanes", set()))
+    if instance.status == TransportApplicationStatus.COMPLETED:
+        lanes.add((instance.shipping_city_id, instance.delivery_city_id))
+    refresh_lane_stats(lanes)
+
+
+@receiver([post_save, post_delete], sender=LogisticsOffer)
+def refresh_offer_lane_stats(sender, instance, **kwargs):
+    refresh_lane_stats(
+        get_completed_lanes(
+            TransportApplication.objects.filter(approved_logistics_offer=instance)
+        )
+    )
+
+
+@receiver(post_save, sender=RecyclablesDeal)
+def refresh_deal_lane_stats(sender, instance, **kwargs):
+    # Статистика разбита по дате доставки сделки
+    refresh_lane_stats(
+        get_completed_lanes(
+            TransportApplication.objects.filter(
+                content_type=ContentType.objects.get_for_model(RecyclablesDeal),
+                object_id=instance.pk,
+            )
+        )
+    )
+
+
+# Участники чатов предложений: логист и, для выбранного предложения,
+# компания автора заявки, см. ChatParticipant
+
+@receiver([post_save, post_delete], sender=LogisticsOffer)
+def refresh_offer_chat_participants(sender, instance, **kwargs):
+    transaction.on_commit(partial(ChatParticipant.objects.refresh, [instance.chat_id]))
+
+
+@receiver(pre_save, sender=TransportApplication)
+def remember_previous_approved_offer(sender, instance, **kwargs):
+    instance._previous_approved_offer_id = (
+        TransportApplication.objects.filter(pk=instance.pk)
+        .values_list("approved_logistics_offer_id", flat=True)
+        .first()
+        if instance.pk
+        else None
+    )
+
+
+@receiver(post_save, sender=TransportApplication)
+def refresh_approved_offer_chat_participants(sender, instance, **kwargs):
+    previous_offer_id = getattr(instance, "_previous_approved_offer_id", None)
+    if previous_offer_id == instance.approved_logistics_offer_id:
+        return
+    chat_ids = list(
+        LogisticsOffer.objects.filter(
+            pk__in=[previous_offer_id, instance.approved_logistics_offer_id]
+        ).values_list("chat_id", flat=True)
+    )
+    transaction.on_commit(partial(ChatParticipant.objects.refresh, chat_ids))
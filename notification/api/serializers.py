@@ -10,9 +10,15 @@ from pydantic import BaseModel
 class NotificationSerializer(NonNullDynamicFieldsModelSerializer):
     object_url = serializers.SerializerMethodField()
     content_type = serializers.SerializerMethodField()
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
+        exclude = ("audience_role", "audience_company")
+
+    def get_is_read(self, instance: Notification):
+        # Для рассылок отметка о прочтении своя у каждого пользователя
+        return getattr(instance, "user_is_read", instance.is_read)
 
     def get_object_url(self, instance: Notification):
         from chat.models import Message
@@ -1,4 +1,3 @@
-from django.db.models import Q
 from rest_framework import generics, filters
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
@@ -12,7 +11,6 @@ from notification.api.serializers import (
     NotificationCount,
 )
 from notification.models import Notification
-from user.models import UserRole
 
 
 class NotificationViewSet(
@@ -41,38 +39,47 @@ class NotificationViewSet(
         )
 
         user = self.request.user
-
-        user_notification_query_node = Q(user=user)
-
         if user.is_anonymous:
             return qs.none()
-        if user.role == UserRole.COMPANY_ADMIN or UserRole.COMPANY_STAFF:
-            return qs.filter(
-                Q(company=user.company) | user_notification_query_node
-            )
-        if user.role == UserRole.MANAGER:
-            return qs.filter(
-                Q(company__manager=user) | user_notification_query_node
-            )
-        if user.role == UserRole.LOGIST:
-            return qs.filter(user_notification_query_node)
-
-        if user.role in [UserRole.ADMIN, UserRole.SUPER_ADMIN]:
-            return qs
+        # Личные уведомления объединяются с рассылками для роли и подписчиков компаний
+        return qs.visible_to(user)
 
     def retrieve(self, request, *args, **kwargs):
         """Overriding retrieve method, so we can mark Notifications as read after request"""
         notification = self.get_object()
-        if not notification.is_read:
+        if notification.is_broadcast:
+            if not notification.user_is_read:
+                notification.set_read_state(request.user, is_read=True)
+                notification.user_is_read = True
+        elif not notification.is_read:
             notification.is_read = True
             notification.save()
         return Response(NotificationSerializer(notification).data)
 
+    def perform_update(self, serializer):
+        notification = serializer.instance
+        if not notification.is_broadcast:
+            return super().perform_update(serializer)
+        # Общая запись рассылки не меняется, отметка хранится для пользователя
+        is_read = serializer.validated_data.get("is_read", notification.user_is_read)
+        notification.set_read_state(self.request.user, is_read=is_read)
+        notification.user_is_read = is_read
+
+    def perform_destroy(self, instance):
+        if instance.is_broadcast:
+            instance.set_read_state(
+                self.request.user, is_read=instance.user_is_read, is_dismissed=True
+            )
+            return
+        super().perform_destroy(instance)
+
     @action(detail=False, methods=["GET"])
     def unread_count(self, request):
         # Посылает количество непрочитанных оповещений на страницу профиля компании
-        return Response(
-            NotificationCount(
-                unread_count=self.get_queryset().filter(is_read=False).count()
-            ).dict()
-        )
+        unread_count = Notification.objects.get_unread_count(request.user)
+        return Response(NotificationCount(unread_count=unread_count).dict())
+
+    @action(detail=False, methods=["POST"])
+    def read_all(self, request):
+        Notification.objects.mark_all_read(request.user)
+        return self.unread_count(request)
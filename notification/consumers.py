@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from django.db import close_old_connections
+
+from common.utils import DecimalEncoder
+from notification.models import Notification
+from notification.push import get_user_groups
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes new notifications of the user, notifications coming within
+    NOTIFICATIONS_WS_COALESCE_DELAY are sent as one frame with the unread count
+    """
+
+    notification_groups = []
+
+    async def connect(self):
+        await database_sync_to_async(close_old_connections)()
+        self.user = self.scope["user"]
+        if not self.user or self.user.is_anonymous:
+            await self.close()
+            return
+
+        self.pending = {}
+        self.flush_task = None
+        self.notification_groups = await database_sync_to_async(get_user_groups)(self.user)
+        for group in self.notification_groups:
+            await self.channel_layer.group_add(group, self.channel_name)
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for group in self.notification_groups:
+            await self.channel_layer.group_discard(group, self.channel_name)
+        if getattr(self, "flush_task", None):
+            self.flush_task.cancel()
+
+        await database_sync_to_async(close_old_connections)()
+
+    # Receive notifications from the groups
+    async def notifications_message(self, event):
+        # Пользователь может состоять в нескольких группах уведомления
+        for notification in event["notifications"]:
+            self.pending[notification["id"]] = notification
+        if self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        await asyncio.sleep(settings.NOTIFICATIONS_WS_COALESCE_DELAY)
+        notifications, self.pending, self.flush_task = self.pending, {}, None
+        unread_count = await database_sync_to_async(
+            Notification.objects.get_unread_count
+        )(self.user)
+        await self.send_json(
+            json.dumps(
+                {
+                    "notifications": sorted(
+                        notifications.values(),
+                        key=lambda notification: notification["id"],
+                        reverse=True,
+                    ),
+                    "unread_count": unread_count,
+                },
+                cls=DecimalEncoder,
+            )
+        )
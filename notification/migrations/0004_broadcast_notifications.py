@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('company', '0028_geocodecache'),
+        ('notification', '0003_alter_notification_company'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='audience_role',
+            field=models.PositiveSmallIntegerField(blank=True, choices=[(1, 'Супер-Администратор ВторПрайс'), (2, 'Администратор ВторПрайс'), (3, 'Менеджер ВторПрайс'), (4, 'Логист ВторПрайс'), (5, 'Владелец компании'), (6, 'Сотрудник компании')], null=True, verbose_name='Роль получателей'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='audience_company',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='follower_notifications', to='company.company', verbose_name='Подписчики компании'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('audience_role__isnull', False)), fields=['audience_role', 'created_at'], name='notifications_role_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('audience_company__isnull', False)), fields=['audience_company', 'created_at'], name='notifications_followers_idx'),
+        ),
+        migrations.CreateModel(
+            name='NotificationReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_read', models.BooleanField(default=False, verbose_name='Прочитано')),
+                ('is_dismissed', models.BooleanField(default=False, verbose_name='Удалено')),
+                ('notification', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='notification.notification', verbose_name='Уведомление')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_read_states', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Состояние уведомления',
+                'verbose_name_plural': 'Состояния уведомлений',
+                'db_table': 'notification_read_states',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='notificationreadstate',
+            constraint=models.UniqueConstraint(fields=('notification', 'user'), name='unique_notification_read_state'),
+        ),
+    ]
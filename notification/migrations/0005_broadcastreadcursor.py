@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import migrations, models
+import django.db.models.deletion
+
+# UnreadCounterKind.NOTIFICATIONS, ключ см. user.services.unread_counters
+NOTIFICATIONS_KIND = 1
+UNREAD_COUNTER_KEY = "unread_counter:{}:{}"
+
+
+def reset_notification_counters(apps, schema_editor):
+    """
+    Counters included broadcasts, now they count personal notifications only.
+    They are recomputed on the next read
+    """
+    UnreadCounter = apps.get_model("user", "UnreadCounter")
+    counters = UnreadCounter.objects.filter(kind=NOTIFICATIONS_KIND)
+    user_ids = list(counters.values_list("user_id", flat=True))
+    counters.delete()
+    for i in range(0, len(user_ids), 1000):
+        cache.delete_many(
+            [
+                UNREAD_COUNTER_KEY.format(NOTIFICATIONS_KIND, user_id)
+                for user_id in user_ids[i:i + 1000]
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('user', '0010_unreadcounter'),
+        ('notification', '0004_broadcast_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastReadCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('read_up_to', models.DateTimeField(verbose_name='Рассылки прочитаны до')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='broadcast_read_cursor', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Прочитанные рассылки',
+                'verbose_name_plural': 'Прочитанные рассылки',
+                'db_table': 'notification_broadcast_read_cursors',
+            },
+        ),
+        migrations.RunPython(reset_notification_counters, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,190 @@
+from collections import Counter, defaultdict
+from functools import partial
+from typing import Optional
+
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.db import models, transaction
+from django.db.models import BooleanField, Case, Exists, F, OuterRef, Q, When
+from django.utils import timezone
 
+from common.model_fields import get_field_from_choices
 from common.models import BaseNameModel
+from user.models import Favorite, UnreadCounterKind, UserRole
+from user.services import unread_counters
 
 
 User = get_user_model()
 
+# Уведомление для всех пользователей роли или всех подписчиков компании
+BROADCAST_QUERY = Q(audience_role__isnull=False) | Q(audience_company__isnull=False)
+
+COMPANY_ROLES = (UserRole.COMPANY_ADMIN, UserRole.COMPANY_STAFF)
+ADMIN_ROLES = (UserRole.ADMIN, UserRole.SUPER_ADMIN)
+
+
+class NotificationQuerySet(models.QuerySet):
+    def get_broadcast_filter(self, user) -> Q:
+        """
+        Broadcast notifications addressed to the user: to his role since he joined
+        and to followers of companies since he added them to favorites
+        """
+        from company.models import Company
+
+        favorites = Favorite.objects.filter(
+            user=user, content_type=ContentType.objects.get_for_model(Company)
+        )
+        followed_since = favorites.filter(
+            object_id=OuterRef("audience_company_id"),
+            created_at__lte=OuterRef("created_at"),
+        )
+        return Q(audience_role=user.role, created_at__gte=user.date_joined) | Q(
+            Exists(followed_since),
+            audience_company__in=favorites.values("object_id"),
+        )
+
+    def get_personal_filter(self, user) -> Optional[Q]:
+        """
+        Personal notifications shown to the user depending on his role,
+        None for administrators, who see all of them
+        """
+        user_query = Q(user=user)
+        if user.role in COMPANY_ROLES:
+            if user.company_id:
+                user_query |= Q(company=user.company)
+            return user_query
+        if user.role == UserRole.MANAGER:
+            return Q(company__manager=user) | user_query
+        if user.role == UserRole.LOGIST:
+            return user_query
+        return None
+
+    def for_user(self, user, personal_filter: Q = None):
+        """
+        Personal notifications matching `personal_filter` (all of them if it is None)
+        merged with the broadcast ones, `user_is_read` is the read flag for the user.
+        A broadcast is read by the user if its read state says so or,
+        without the state, if it was created before his BroadcastReadCursor
+        """
+        read_states = NotificationReadState.objects.filter(
+            notification=OuterRef("pk"), user=user
+        )
+        read_by_cursor = BroadcastReadCursor.objects.filter(
+            user=user, read_up_to__gte=OuterRef("created_at")
+        )
+        queryset = self
+        if personal_filter is not None:
+            queryset = queryset.filter(
+                (personal_filter & ~BROADCAST_QUERY) | self.get_broadcast_filter(user)
+            )
+        return queryset.exclude(
+            BROADCAST_QUERY, Exists(read_states.filter(is_dismissed=True))
+        ).annotate(
+            user_is_read=Case(
+                When(
+                    BROADCAST_QUERY & Q(Exists(read_states)),
+                    then=Exists(read_states.filter(is_read=True)),
+                ),
+                When(BROADCAST_QUERY, then=Exists(read_by_cursor)),
+                default=F("is_read"),
+                output_field=BooleanField(),
+            )
+        )
+
+    def visible_to(self, user):
+        """
+        Notifications shown to the user depending on his role
+        """
+        return self.for_user(user, self.get_personal_filter(user))
+
+    def count_unread_personal(self, user) -> int:
+        """
+        Value of the user's unread counter, see change_recipients_unread_counts
+        """
+        queryset = self.filter(~BROADCAST_QUERY, is_read=False)
+        personal_filter = self.get_personal_filter(user)
+        if personal_filter is not None:
+            queryset = queryset.filter(personal_filter)
+        return queryset.count()
+
+    def count_unread_broadcasts(self, user) -> int:
+        """
+        Broadcasts are not added to the counters of their recipients,
+        unread ones are counted on read: created after BroadcastReadCursor
+        of the user and not read, or explicitly marked unread before it.
+        Both counts are served by the partial indexes of broadcasts
+        """
+        if self.get_personal_filter(user) is None:
+            broadcasts = self.filter(BROADCAST_QUERY)
+        else:
+            broadcasts = self.filter(self.get_broadcast_filter(user))
+        read_states = NotificationReadState.objects.filter(user=user)
+        read = read_states.filter(Q(is_read=True) | Q(is_dismissed=True))
+        read_up_to = (
+            BroadcastReadCursor.objects.filter(user=user)
+            .values_list("read_up_to", flat=True)
+            .first()
+        )
+        if read_up_to is None:
+            return broadcasts.exclude(pk__in=read.values("notification")).count()
+        unread_before = read_states.filter(is_read=False, is_dismissed=False)
+        return (
+            broadcasts.filter(created_at__gt=read_up_to)
+            .exclude(pk__in=read.values("notification"))
+            .count()
+            + broadcasts.filter(
+                created_at__lte=read_up_to,
+                pk__in=unread_before.values("notification"),
+            ).count()
+        )
+
+    def count_unread(self, user) -> int:
+        return self.count_unread_personal(user) + self.count_unread_broadcasts(user)
+
+    def get_unread_count(self, user) -> int:
+        """
+        Personal unread notifications from the counter plus unread broadcasts
+        """
+        return unread_counters.get_unread_count(
+            user,
+            UnreadCounterKind.NOTIFICATIONS,
+            partial(self.count_unread_personal, user),
+        ) + self.count_unread_broadcasts(user)
+
+    def mark_all_read(self, user):
+        """
+        Marks read personal notifications shown to the user (administrators
+        only those addressed to them) and broadcasts up to now
+        """
+        personal_filter = self.get_personal_filter(user)
+        if personal_filter is None:
+            personal_filter = Q(user=user)
+        with transaction.atomic():
+            notifications = list(
+                self.select_for_update(of=("self",))
+                .filter(personal_filter, ~BROADCAST_QUERY, is_read=False)
+                .only("company_id", "user_id", "audience_role", "audience_company_id")
+            )
+            self.filter(pk__in=[obj.pk for obj in notifications]).update(is_read=True)
+            Notification.change_recipients_unread_counts(notifications, -1)
+
+            BroadcastReadCursor.objects.update_or_create(
+                user=user, defaults={"read_up_to": timezone.now()}
+            )
+            # Отметки до курсора не нужны, кроме удаленных рассылок
+            NotificationReadState.objects.filter(user=user, is_dismissed=False).delete()
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        from notification.push import push_notifications
+
+        Notification.change_recipients_unread_counts(
+            [obj for obj in objs if not obj.is_read], 1
+        )
+        push_notifications(objs)
+        return objs
+
 
 class Notification(BaseNameModel):
     company = models.ForeignKey(
@@ -25,14 +202,147 @@ class Notification(BaseNameModel):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE, verbose_name="Пользователь", null=True
     )
+    # Получатели рассылки, одна запись на событие вместо записи на каждого пользователя
+    audience_role = get_field_from_choices(
+        "Роль получателей", UserRole, null=True, blank=True
+    )
+    audience_company = models.ForeignKey(
+        "company.Company",
+        on_delete=models.CASCADE,
+        verbose_name="Подписчики компании",
+        related_name="follower_notifications",
+        null=True,
+        blank=True,
+    )
+
+    objects = NotificationQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Уведомление"
         verbose_name_plural = "Уведомления"
         db_table = "notifications"
+        indexes = [
+            models.Index(
+                fields=["audience_role", "created_at"],
+                name="notifications_role_idx",
+                condition=Q(audience_role__isnull=False),
+            ),
+            models.Index(
+                fields=["audience_company", "created_at"],
+                name="notifications_followers_idx",
+                condition=Q(audience_company__isnull=False),
+            ),
+        ]
+
+    @property
+    def is_broadcast(self) -> bool:
+        return self.audience_role is not None or self.audience_company_id is not None
+
+    @staticmethod
+    def change_recipients_unread_counts(notifications, delta: int):
+        """
+        Changes unread counters of everyone personal notifications are shown to,
+        see NotificationQuerySet.visible_to. Broadcasts are skipped,
+        they are counted on read by NotificationQuerySet.count_unread_broadcasts
+        """
+        from company.models import Company
+
+        notifications = [
+            notification for notification in notifications
+            if not notification.is_broadcast
+        ]
+        if not notifications:
+            return
+        company_ids = {
+            notification.company_id for notification in notifications
+        } - {None}
+        # Получатели уведомлений компаний: сотрудники и менеджер компании
+        company_users = defaultdict(set)
+        for user_id, company_id in User.objects.filter(
+                role__in=COMPANY_ROLES, company_id__in=company_ids
+        ).values_list("pk", "company_id"):
+            company_users[company_id].add(user_id)
+        for company_id, manager_id in Company.objects.filter(
+                pk__in=company_ids, manager__role=UserRole.MANAGER
+        ).values_list("pk", "manager_id"):
+            company_users[company_id].add(manager_id)
+        admin_ids = set(
+            User.objects.filter(role__in=ADMIN_ROLES).values_list("pk", flat=True)
+        )
+
+        deltas = Counter()
+        for notification in notifications:
+            recipients = admin_ids | company_users[notification.company_id]
+            if notification.user_id is not None:
+                recipients.add(notification.user_id)
+            for user_id in recipients:
+                deltas[user_id] += delta
+        unread_counters.change_unread_counts(
+            deltas, UnreadCounterKind.NOTIFICATIONS
+        )
 
     @staticmethod
     def create_notification(company, content_object, message):
         return Notification.objects.create(
             company=company, content_object=content_object, name=message
         )
+
+    def set_read_state(self, user, **state):
+        """
+        Read and dismiss flags of a broadcast notification are kept per user
+        """
+        NotificationReadState.objects.update_or_create(
+            notification=self, user=user, defaults=state
+        )
+
+
+class NotificationReadState(models.Model):
+    """
+    Read or dismissed broadcast notification of the user,
+    there are no rows for unread ones
+    """
+
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.CASCADE,
+        verbose_name="Уведомление",
+        related_name="read_states",
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="notification_read_states",
+    )
+    is_read = models.BooleanField("Прочитано", default=False)
+    is_dismissed = models.BooleanField("Удалено", default=False)
+
+    class Meta:
+        verbose_name = "Состояние уведомления"
+        verbose_name_plural = "Состояния уведомлений"
+        db_table = "notification_read_states"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["notification", "user"], name="unique_notification_read_state"
+            )
+        ]
+
+
+class BroadcastReadCursor(models.Model):
+    """
+    Broadcast notifications created up to `read_up_to` are read by the user,
+    unless NotificationReadState of the notification says otherwise
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="broadcast_read_cursor",
+    )
+    read_up_to = models.DateTimeField("Рассылки прочитаны до")
+
+    class Meta:
+        verbose_name = "Прочитанные рассылки"
+        verbose_name_plural = "Прочитанные рассылки"
+        db_table = "notification_broadcast_read_cursors"
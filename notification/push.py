@@ -0,0 +1,107 @@
+"""
+Pushing new notifications to the websocket groups of their recipients,
+see notification.consumers.NotificationConsumer
+"""
+import logging
+from collections import defaultdict
+from functools import partial
+from typing import Iterable, List
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+
+from notification.api.serializers import NotificationSerializer
+from notification.models import ADMIN_ROLES, COMPANY_ROLES, Notification
+from user.models import Favorite, UserRole
+
+log = logging.getLogger(__name__)
+
+
+def get_user_group(user_id: int) -> str:
+    return f"notifications_user_{user_id}"
+
+
+def get_company_group(company_id: int) -> str:
+    return f"notifications_company_{company_id}"
+
+
+def get_role_group(role: int) -> str:
+    return f"notifications_role_{role}"
+
+
+def get_followers_group(company_id: int) -> str:
+    return f"notifications_followers_{company_id}"
+
+
+def get_user_groups(user) -> List[str]:
+    """
+    Groups the user receives notifications from,
+    mirrors NotificationQuerySet.visible_to
+    """
+    from company.models import Company
+
+    groups = [get_user_group(user.pk), get_role_group(user.role)]
+    if user.role in COMPANY_ROLES and user.company_id:
+        groups.append(get_company_group(user.company_id))
+    if user.role == UserRole.MANAGER:
+        groups.extend(
+            get_company_group(company_id)
+            for company_id in Company.objects.filter(manager=user).values_list(
+                "pk", flat=True
+            )
+        )
+    groups.extend(
+        get_followers_group(company_id)
+        for company_id in Favorite.objects.filter(
+            user=user, content_type=ContentType.objects.get_for_model(Company)
+        ).values_list("object_id", flat=True)
+    )
+    return groups
+
+
+def get_notification_groups(notification) -> List[str]:
+    # Администраторы видят все уведомления
+    groups = [get_role_group(role) for role in ADMIN_ROLES]
+    if notification.audience_role is not None:
+        groups.append(get_role_group(notification.audience_role))
+    if notification.audience_company_id is not None:
+        groups.append(get_followers_group(notification.audience_company_id))
+    if notification.is_broadcast:
+        return groups
+    if notification.user_id is not None:
+        groups.append(get_user_group(notification.user_id))
+    if notification.company_id is not None:
+        groups.append(get_company_group(notification.company_id))
+    return groups
+
+
+def send_notifications(notification_ids: List[int]):
+    notifications_by_group = defaultdict(list)
+    for notification in Notification.objects.filter(pk__in=notification_ids):
+        data = NotificationSerializer(notification).data
+        for group in get_notification_groups(notification):
+            notifications_by_group[group].append(data)
+
+    channel_layer = get_channel_layer()
+    for group, notifications in notifications_by_group.items():
+        try:
+            async_to_sync(channel_layer.group_send)(
+                group, {"type": "notifications_message", "notifications": notifications}
+            )
+        except Exception:
+            # Уведомления уже сохранены, клиент получит их через REST
+            log.exception("Failed to push notifications to %s", group)
+
+
+def push_notifications(notifications: Iterable):
+    """
+    Sends the notifications to the websocket groups after commit,
+    a group gets one message for all of them
+    """
+    notification_ids = [
+        notification.pk for notification in notifications if notification.pk
+    ]
+    if notification_ids:
+        transaction.on_commit(partial(send_notifications, notification_ids))
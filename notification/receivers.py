@@ -2,8 +2,7 @@
 Subscribing to signals from other app models and creating notifications on their updates
 """
 from django.contrib.auth import get_user_model
-from django.contrib.contenttypes.models import ContentType
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 
 from chat.models import Message
@@ -22,7 +21,8 @@ from exchange.signals import (
 from logistics.models import TransportApplication
 from logistics.signals import transport_application_status_update
 from notification.models import Notification
-from user.models import UserRole, Favorite
+from notification.push import push_notifications
+from user.models import UserRole
 
 User = get_user_model()
 
@@ -135,23 +135,19 @@ def handle_transport_application_status_change(
     Notification.objects.bulk_create(to_create)
 
 
+# Рассылки создаются одной записью на событие, см. Notification.audience_role
+# и Notification.audience_company
+
 @receiver(post_save, sender=TransportApplication)
 def handle_new_transport_application(
     sender, instance: TransportApplication, created, **kwargs
 ):
     if created:
-        logists = User.objects.filter(role=UserRole.LOGIST)
-        to_create = []
-        for logist in logists:
-            to_create.append(
-                Notification(
-                    user=logist,
-                    content_object=instance,
-                    name="Создана новая заявка на транспорт",
-                )
-            )
-
-        Notification.objects.bulk_create(to_create)
+        Notification.objects.create(
+            audience_role=UserRole.LOGIST,
+            content_object=instance,
+            name="Создана новая заявка на транспорт",
+        )
 
 
 @receiver(post_save, sender=RecyclablesApplication)
@@ -161,49 +157,25 @@ def handle_new_recyclables_application(
     if not created:
         return
 
-    company = instance.company
-    company_content_type = ContentType.objects.get_for_model(company)
-    users_to_notify = Favorite.objects.filter(
-        content_type=company_content_type, object_id=company.pk
-    ).values_list("user", flat=True)
-
-    to_create = []
-    for user in users_to_notify:
-        to_create.append(
-            Notification(
-                name="Компания из вашего списка подписок создала заявку на вторсырье",
-                user_id=user,
-                content_object=instance,
-            )
-        )
-
-    Notification.objects.bulk_create(to_create)
+    Notification.objects.create(
+        name="Компания из вашего списка подписок создала заявку на вторсырье",
+        audience_company=instance.company,
+        content_object=instance,
+    )
 
 
 @receiver(post_save, sender=EquipmentApplication)
-def handle_new_recyclables_application(
+def handle_new_equipment_application(
     sender, instance: EquipmentApplication, created, **kwargs
 ):
     if not created:
         return
 
-    company = instance.company
-    company_content_type = ContentType.objects.get_for_model(company)
-    users_to_notify = Favorite.objects.filter(
-        content_type=company_content_type, object_id=company.pk
-    ).values_list("user", flat=True)
-
-    to_create = []
-    for user in users_to_notify:
-        to_create.append(
-            Notification(
-                name="Компания из вашего списка подписок создала заявку на оборудование",
-                user=user,
-                content_object=instance,
-            )
-        )
-
-    Notification.objects.bulk_create(to_create)
+    Notification.objects.create(
+        name="Компания из вашего списка подписок создала заявку на оборудование",
+        audience_company=instance.company,
+        content_object=instance,
+    )
 
 
 @receiver(application_status_changed, sender=RecyclablesApplication)
@@ -238,3 +210,38 @@ def handle_recyclables_equipment_status_change(
     )
 
     Notification.objects.bulk_create(to_create)
+
+
+# Счетчики непрочитанных уведомлений, см. user.services.unread_counters,
+# новые уведомления отправляются в websocket, см. notification.push
+
+@receiver(pre_save, sender=Notification)
+def remember_notification_read_flag(sender, instance: Notification, **kwargs):
+    if instance.pk and not instance.is_broadcast:
+        instance._previous_is_read = (
+            Notification.objects.filter(pk=instance.pk)
+            .values_list("is_read", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Notification)
+def update_unread_notifications_count(
+    sender, instance: Notification, created, **kwargs
+):
+    if created:
+        if not instance.is_read:
+            Notification.change_recipients_unread_counts([instance], 1)
+        push_notifications([instance])
+        return
+    previous_is_read = getattr(instance, "_previous_is_read", None)
+    if previous_is_read is not None and previous_is_read != instance.is_read:
+        Notification.change_recipients_unread_counts(
+            [instance], -1 if instance.is_read else 1
+        )
+
+
+@receiver(post_delete, sender=Notification)
+def decrease_unread_notifications_count(sender, instance: Notification, **kwargs):
+    if not instance.is_broadcast and not instance.is_read:
+        Notification.change_recipients_unread_counts([instance], -1)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from product.models import RecyclableMarketSummary
+
+
+class Command(BaseCommand):
+    help = "Полностью пересчитывает сводку по вторсырью (RecyclableMarketSummary)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recyclables",
+            type=int,
+            nargs="+",
+            help="ID вторсырья, по умолчанию пересчитывается все",
+        )
+
+    def handle(self, *args, **options):
+        RecyclableMarketSummary.objects.refresh(options["recyclables"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Записей в сводке: {RecyclableMarketSummary.objects.count()}"
+            )
+        )
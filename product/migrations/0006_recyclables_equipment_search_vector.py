@@ -0,0 +1,54 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+from common.search import build_search_vector
+
+
+def fill_search_vector(apps, schema_editor):
+    weighted_fields = (
+        ("name", "A", "russian"),
+        ("description", "C", "russian"),
+    )
+    for model_name in ("Recyclables", "Equipment"):
+        apps.get_model("product", model_name).objects.update(
+            search_vector=build_search_vector(weighted_fields)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0026_company_search_vector'),
+        ('product', '0005_remove_recyclables_recycling_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recyclables',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recyclables',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recyclables_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recyclables',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='recyclables_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='equipments_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='equipments_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(fill_search_vector, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+import common.model_fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_market_summary(apps, schema_editor):
+    RecyclablesApplication = apps.get_model("exchange", "RecyclablesApplication")
+    RecyclableMarketSummary = apps.get_model("product", "RecyclableMarketSummary")
+    rows = (
+        RecyclablesApplication.objects.filter(status=2, is_deleted=False)
+        .values("recyclables_id", "urgency_type", "deal_type", region_id=models.F("city__region_id"))
+        .annotate(
+            applications_count=models.Count("id"),
+            min_price=models.Min("price"),
+            min_lot_size=models.Min("lot_size"),
+            published_date=models.Max("created_at"),
+            total_volume=models.functions.Coalesce(models.Sum("total_weight"), 0.0),
+        )
+        .order_by()
+    )
+    RecyclableMarketSummary.objects.bulk_create(
+        [RecyclableMarketSummary(**row) for row in rows]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('company', '0026_company_search_vector'),
+        ('exchange', '0036_recyclablesapplication_lat_lon_idx'),
+        ('product', '0006_recyclables_equipment_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecyclableMarketSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_deleted', models.BooleanField(default=False, verbose_name='Помечен как удаленный')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления')),
+                ('urgency_type', models.PositiveSmallIntegerField(choices=[(1, 'Готово к отгрузке'), (2, 'Контракт на поставку')], verbose_name='Срочность')),
+                ('deal_type', models.PositiveSmallIntegerField(choices=[(1, 'Покупка'), (2, 'Продажа')], verbose_name='Тип сделки')),
+                ('applications_count', models.PositiveIntegerField(default=0, verbose_name='Количество заявок')),
+                ('min_price', common.model_fields.AmountField(blank=True, decimal_places=2, default=0, max_digits=13, null=True, verbose_name='Минимальная цена')),
+                ('min_lot_size', models.FloatField(blank=True, null=True, verbose_name='Минимальная лотность')),
+                ('published_date', models.DateTimeField(blank=True, null=True, verbose_name='Дата последней публикации')),
+                ('total_volume', models.FloatField(default=0, verbose_name='Общий объем')),
+                ('recyclables', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='market_summaries', to='product.recyclables', verbose_name='Вторсырье')),
+                ('region', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='company.region', verbose_name='Регион')),
+            ],
+            options={
+                'verbose_name': 'Сводка по вторсырью',
+                'verbose_name_plural': 'Сводки по вторсырью',
+                'db_table': 'recyclables_market_summaries',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='recyclablemarketsummary',
+            constraint=models.UniqueConstraint(fields=('recyclables', 'urgency_type', 'deal_type', 'region'), name='unique_market_summary'),
+        ),
+        migrations.AddConstraint(
+            model_name='recyclablemarketsummary',
+            constraint=models.UniqueConstraint(condition=models.Q(('region__isnull', True)), fields=('recyclables', 'urgency_type', 'deal_type'), name='unique_market_summary_without_region'),
+        ),
+        migrations.RunPython(fill_market_summary, migrations.RunPython.noop),
+    ]
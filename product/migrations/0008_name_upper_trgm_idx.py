@@ -0,0 +1,21 @@
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_recyclablemarketsummary'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recyclables',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='recyclables_upper_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('name'), name='gin_trgm_ops'), name='equipments_upper_trgm_idx'),
+        ),
+    ]
@@ -1,11 +1,15 @@
 from bulk_update_or_create import BulkUpdateOrCreateQuerySet
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import models, transaction
+from django.db.models.functions import Coalesce, Upper
 from mptt.fields import TreeForeignKey
 from mptt.managers import TreeManager
 from mptt.models import MPTTModel
 
-from common.models import BaseNameModel, BaseNameDescModel
-from exchange.models import ApplicationStatus, DealType, DealStatus
+from common.cache import bump_model_version
+from common.model_fields import AmountField, get_field_from_choices
+from common.models import BaseModel, BaseNameModel, BaseNameDescModel, SearchVectorModelMixin
+from exchange.models import ApplicationStatus, DealType, DealStatus, RecyclablesApplication, UrgencyType
 
 
 class CategoryManager(TreeManager):
@@ -59,71 +63,67 @@ class EquipmentCategory(MPTTModel, BaseNameModel):
 
 class RecyclablesQuerySet(BulkUpdateOrCreateQuerySet, models.QuerySet):
 
-    def annotate_applications(self, urgency_type=None, *args, **kwargs):
-        query = [("applications__status", ApplicationStatus.PUBLISHED)]
-        applications_query = [("status", ApplicationStatus.PUBLISHED)]
-
+    def annotate_applications(self, urgency_type=None, region=None, district=None, *args, **kwargs):
+        """
+        Annotates market data of published applications from RecyclableMarketSummary
+        """
+        summaries = RecyclableMarketSummary.objects.filter(recyclables=models.OuterRef("pk"))
         if urgency_type:
-            query.append(("applications__urgency_type", urgency_type))
-            applications_query.append(("urgency_type", urgency_type))
-        query = dict(query)
-
-        sales_applications_count = models.Count(
-            "applications",
-            filter=models.Q(applications__is_deleted=False, applications__deal_type=DealType.SELL, **query),
-        )
-        purchase_applications_count = models.Count(
-            "applications",
-            filter=models.Q(applications__is_deleted=False, applications__deal_type=DealType.BUY, **query),
-        )
-        applications = self.model.applications.field.model.objects.filter(
-            recyclables=models.OuterRef("pk"), **dict(applications_query)
-        )
+            summaries = summaries.filter(urgency_type=urgency_type)
+        if region:
+            summaries = summaries.filter(region=region)
+        if district:
+            summaries = summaries.filter(region__district=district)
+
+        def aggregate(expression, output_field):
+            return models.Subquery(
+                summaries.values("recyclables").annotate(value=expression).values("value"),
+                output_field=output_field,
+            )
 
         return self.annotate(
-            sales_applications_count=sales_applications_count,
-            purchase_applications_count=purchase_applications_count,
-            published_date=models.Subquery(
-                applications.order_by("-created_at").values("created_at")[:1]
+            sales_applications_count=Coalesce(
+                aggregate(
+                    models.Sum("applications_count", filter=models.Q(deal_type=DealType.SELL)),
+                    models.IntegerField(),
+                ),
+                0,
             ),
-            lot_size=models.Subquery(
-                applications.order_by("lot_size").values("lot_size")[:1]
+            purchase_applications_count=Coalesce(
+                aggregate(
+                    models.Sum("applications_count", filter=models.Q(deal_type=DealType.BUY)),
+                    models.IntegerField(),
+                ),
+                0,
             ),
+            published_date=aggregate(models.Max("published_date"), models.DateTimeField()),
+            lot_size=aggregate(models.Min("min_lot_size"), models.FloatField()),
             # ДОБАВИЛ
-            price=models.Subquery(
-                applications.order_by("price").values("price")[:1]
-            ),
-            recyclables_id=models.Subquery(
-                applications.order_by("recyclables_id").values("recyclables_id")[:1]
-            )
-        )  # .order_by('recyclables_id')
+            price=aggregate(models.Min("min_price"), AmountField()),
+            recyclables_id=aggregate(models.Max("recyclables_id"), models.IntegerField()),
+        )
+
+    # Сортировки таблицы биржи и соответствующие им аннотации
+    APPLICATIONS_ORDERING = {
+        "price": "price",
+        "purchaseApplicationsCount": "purchase_applications_count",
+        "salesApplicationsCount": "sales_applications_count",
+        "lotSize": "lot_size",
+        "publishedDate": "published_date",
+    }
 
     def ordering_applications(self, ordering, urgency_type=None, page=0, size=0, *args, **kwargs):
-        if ordering == 'price' or ordering == '-price':
-            g = self.annotate_applications(urgency_type=int(urgency_type))
-            return g.order_by(ordering)
+        g = self.annotate_applications(
+            urgency_type=int(urgency_type) if urgency_type else None, **kwargs
+        )
 
         if ordering == 'category' or ordering == '-category':
-            g = self.annotate_applications(urgency_type=int(urgency_type))
-            return g.order_by('category' if ordering == 'recyclables_id' else '-recyclables_id')
-
-        if ordering == 'purchaseApplicationsCount' or ordering == '-purchaseApplicationsCount':
-            g = self.annotate_applications(urgency_type=int(urgency_type))
-            return g.order_by(
-                'purchase_applications_count' if ordering == 'purchaseApplicationsCount' else '-purchase_applications_count')
-
-        if ordering == 'salesApplicationsCount' or ordering == '-salesApplicationsCount':
-            g = self.annotate_applications(urgency_type=int(urgency_type))
-            return g.order_by(
-                'sales_applications_count' if ordering == 'salesApplicationsCount' else '-sales_applications_count')
+            return g.order_by('-recyclables_id')
 
-        if ordering == 'lotSize' or ordering == '-lotSize':
-            g = self.annotate_applications(urgency_type=int(urgency_type))
-            return g.order_by('lot_size' if ordering == 'lotSize' else '-lot_size')
-
-        if ordering == 'publishedDate' or ordering == '-publishedDate':
-            g = self.annotate_applications(urgency_type=int(urgency_type))
-            return g.order_by('published_date' if ordering == 'publishedDate' else '-published_date')
+        field = self.APPLICATIONS_ORDERING.get(ordering.lstrip("-"))
+        if field is None:
+            return g
+        return g.order_by(f"-{field}" if ordering.startswith("-") else field)
 
     def recyclables_generate_offers(self, category=None):
 
@@ -154,7 +154,12 @@ class RecyclingCode(BaseNameDescModel):
         db_table = "recycling_codes"
 
 
-class Recyclables(BaseNameDescModel):
+class Recyclables(SearchVectorModelMixin, BaseNameDescModel):
+    SEARCH_VECTOR_FIELDS = (
+        ("name", "A", "russian"),
+        ("description", "C", "russian"),
+    )
+
     category = models.ForeignKey(
         "product.RecyclablesCategory",
         verbose_name="Категория",
@@ -175,9 +180,22 @@ class Recyclables(BaseNameDescModel):
         verbose_name = "Вторсырье"
         verbose_name_plural = "Вторсырье"
         db_table = "recyclables"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="recyclables_search_vector_idx"),
+            GinIndex(fields=["name"], name="recyclables_name_trgm_idx", opclasses=["gin_trgm_ops"]),
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="recyclables_upper_trgm_idx",
+            ),
+        ]
 
 
-class Equipment(BaseNameDescModel):
+class Equipment(SearchVectorModelMixin, BaseNameDescModel):
+    SEARCH_VECTOR_FIELDS = (
+        ("name", "A", "russian"),
+        ("description", "C", "russian"),
+    )
+
     category = models.ForeignKey(
         "product.EquipmentCategory",
         verbose_name="Категория",
@@ -189,3 +207,95 @@ class Equipment(BaseNameDescModel):
         verbose_name = "Оборудование"
         verbose_name_plural = "Оборудование"
         db_table = "equipments"
+        indexes = [
+            GinIndex(fields=["search_vector"], name="equipments_search_vector_idx"),
+            GinIndex(fields=["name"], name="equipments_name_trgm_idx", opclasses=["gin_trgm_ops"]),
+            GinIndex(
+                OpClass(Upper("name"), name="gin_trgm_ops"),
+                name="equipments_upper_trgm_idx",
+            ),
+        ]
+
+
+class RecyclableMarketSummaryQuerySet(BulkUpdateOrCreateQuerySet, models.QuerySet):
+    def refresh(self, recyclables_ids=None):
+        """
+        Recalculates summaries of the given recyclables (all if not passed)
+        from published applications
+        """
+        applications = RecyclablesApplication.objects.filter(
+            status=ApplicationStatus.PUBLISHED, is_deleted=False
+        )
+        summaries = self.all()
+        recyclables = Recyclables.objects.all()
+        if recyclables_ids is not None:
+            recyclables_ids = set(recyclables_ids)
+            applications = applications.filter(recyclables_id__in=recyclables_ids)
+            summaries = summaries.filter(recyclables_id__in=recyclables_ids)
+            recyclables = recyclables.filter(id__in=recyclables_ids)
+
+        rows = (
+            applications.values(
+                "recyclables_id", "urgency_type", "deal_type", region_id=models.F("city__region_id")
+            )
+            .annotate(
+                applications_count=models.Count("id"),
+                min_price=models.Min("price"),
+                min_lot_size=models.Min("lot_size"),
+                published_date=models.Max("created_at"),
+                total_volume=Coalesce(models.Sum("total_weight"), 0.0),
+            )
+            .order_by()
+        )
+        with transaction.atomic():
+            # Блокировка вторсырья, чтобы параллельные пересчеты не конфликтовали
+            list(recyclables.select_for_update().values_list("id", flat=True))
+            summaries.delete()
+            self.bulk_create([RecyclableMarketSummary(**row) for row in rows])
+        bump_model_version(RecyclableMarketSummary)
+
+
+class RecyclableMarketSummary(BaseModel):
+    """
+    Aggregated data of published applications by recyclable,
+    urgency type, deal type and region
+    """
+
+    recyclables = models.ForeignKey(
+        "product.Recyclables",
+        verbose_name="Вторсырье",
+        on_delete=models.CASCADE,
+        related_name="market_summaries",
+    )
+    urgency_type = get_field_from_choices("Срочность", UrgencyType)
+    deal_type = get_field_from_choices("Тип сделки", DealType)
+    region = models.ForeignKey(
+        "company.Region",
+        verbose_name="Регион",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+    )
+    applications_count = models.PositiveIntegerField("Количество заявок", default=0)
+    min_price = AmountField("Минимальная цена", null=True, blank=True)
+    min_lot_size = models.FloatField("Минимальная лотность", null=True, blank=True)
+    published_date = models.DateTimeField("Дата последней публикации", null=True, blank=True)
+    total_volume = models.FloatField("Общий объем", default=0)
+
+    objects = RecyclableMarketSummaryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = "Сводка по вторсырью"
+        verbose_name_plural = "Сводки по вторсырью"
+        db_table = "recyclables_market_summaries"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recyclables", "urgency_type", "deal_type", "region"],
+                name="unique_market_summary",
+            ),
+            models.UniqueConstraint(
+                fields=["recyclables", "urgency_type", "deal_type"],
+                condition=models.Q(region__isnull=True),
+                name="unique_market_summary_without_region",
+            ),
+        ]
@@ -0,0 +1,41 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from common.cache import bump_model_version
+from common.search import update_search_vector
+from exchange.models import RecyclablesApplication
+from product.models import Recyclables, Equipment, RecyclableMarketSummary
+
+
+@receiver(post_save, sender=Recyclables)
+def update_recyclables_search_vector(sender, instance, update_fields=None, **kwargs):
+    update_search_vector(instance, update_fields)
+
+
+@receiver(post_save, sender=Equipment)
+def update_equipment_search_vector(sender, instance, update_fields=None, **kwargs):
+    update_search_vector(instance, update_fields)
+
+
+# Сводка по вторсырью пересчитывается после фиксации транзакции
+# для вторсырья заявки и, если вторсырье сменилось, для прежнего
+# (прежнее состояние запоминает exchange.receivers.remember_previous_state)
+
+@receiver([post_save, post_delete], sender=RecyclablesApplication)
+def refresh_market_summary(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_state", None)
+    recyclables_ids = {
+        instance.recyclables_id,
+        previous["recyclables_id"] if previous else None,
+    } - {None}
+    transaction.on_commit(
+        partial(RecyclableMarketSummary.objects.refresh, recyclables_ids)
+    )
+
+
+@receiver([post_save, post_delete], sender=Recyclables)
+def bump_recyclables_response_cache_version(sender, **kwargs):
+    transaction.on_commit(partial(bump_model_version, sender))
@@ -0,0 +1,46 @@
+from rest_framework import serializers
+
+# Максимальное количество рассчитываемых стоимостей доставки за один запрос
+MAX_DELIVERY_COSTS = 10000
+
+
+class CoordinatesSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+
+
+class DeliveryCostsRequestSerializer(serializers.Serializer):
+    """
+    Either origin and destinations coordinates
+    or shipping and delivery cities (every pair is calculated)
+    """
+
+    origin = CoordinatesSerializer(required=False)
+    destinations = CoordinatesSerializer(many=True, required=False)
+    shipping_cities = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False
+    )
+    delivery_cities = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False
+    )
+
+    def validate(self, attrs):
+        by_coordinates = "origin" in attrs or "destinations" in attrs
+        by_cities = "shipping_cities" in attrs or "delivery_cities" in attrs
+        if by_coordinates == by_cities:
+            raise serializers.ValidationError(
+                "Укажите либо origin и destinations, либо shipping_cities и delivery_cities"
+            )
+        if by_coordinates:
+            if "origin" not in attrs or not attrs.get("destinations"):
+                raise serializers.ValidationError("Укажите origin и destinations")
+            count = len(attrs["destinations"])
+        else:
+            if "shipping_cities" not in attrs or "delivery_cities" not in attrs:
+                raise serializers.ValidationError("Укажите shipping_cities и delivery_cities")
+            count = len(attrs["shipping_cities"]) * len(attrs["delivery_cities"])
+        if count > MAX_DELIVERY_COSTS:
+            raise serializers.ValidationError(
+                f"Можно рассчитать не больше {MAX_DELIVERY_COSTS} стоимостей за запрос"
+            )
+        return attrs
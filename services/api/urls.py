@@ -10,4 +10,6 @@ urlpatterns = [
         views.approximate_price_using_cities,
         name="approximate_price_using_cities",
     ),
+    path("delivery_costs", views.delivery_costs, name="delivery_costs"),
+    path("nearest_cities", views.nearest_cities, name="nearest_cities"),
 ]
@@ -6,14 +6,34 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from drf_yasg import openapi as api
 
+from company.api.serializers import CitySerializer
+from company.city_index import city_index
 from company.models import City
 from config import settings
+from services.api.serializers import DeliveryCostsRequestSerializer
+from services.distances import (
+    CityDistanceMatrix,
+    fill_city_coordinates,
+    get_delivery_costs,
+    haversine_km,
+)
 from services.models import DeliveryCost
-from services.validators import validate_logistics_coordinates
+from services.validators import (
+    MAX_CITY_SEARCH_RADIUS_KM,
+    validate_coordinates,
+    validate_logistics_coordinates,
+    validate_radius,
+)
 from services.yandex_geo import YandexGeocoderClient
 from config.settings import YANDEX_GEOCODER_API_KEY
 
 geocoder_client = YandexGeocoderClient(YANDEX_GEOCODER_API_KEY)
+city_distance_matrix = CityDistanceMatrix()
+
+
+def resolve_city_coordinates(city: City):
+    address_data = geocoder_client.get_coordinates_from_city(city)
+    return address_data.latitude, address_data.longitude
 
 
 @swagger_auto_schema(
@@ -134,18 +154,118 @@ def approximate_price_using_cities(request):
         cities_qs, pk=delivery_city_pk
     ), get_object_or_404(cities_qs, pk=shipping_city_pk)
 
-    delivery_city_data = geocoder_client.get_coordinates_from_city(
-        delivery_city
-    )
-    shipping_city_data = geocoder_client.get_coordinates_from_city(
-        shipping_city
+    # Для одной пары городов недостающие координаты определяются сразу,
+    # массовый расчет (delivery_costs) геокодер не вызывает
+    fill_city_coordinates(
+        [delivery_city, shipping_city], resolve_city_coordinates
     )
+    pair = (delivery_city.pk, shipping_city.pk)
+    distance = city_distance_matrix.get_distances([pair])[pair]
+    if distance is None:
+        raise ValidationError("Не удалось определить координаты городов")
+    [delivery_data] = get_delivery_costs([distance], settings.PRICE_PER_KM)
+    return Response(DeliveryCost(**delivery_data).dict())
 
-    delivery_data = DeliveryCost.from_coordinates(
-        (delivery_city_data.latitude, delivery_city_data.longitude),
-        (shipping_city_data.latitude, delivery_city_data.longitude),
-        settings.PRICE_PER_KM,
+
+@swagger_auto_schema(
+    method="post", request_body=DeliveryCostsRequestSerializer
+)
+@api_view(["POST"])
+def delivery_costs(request):
+    """
+    Стоимости доставки из одной точки в список точек (origin, destinations)
+    или для всех пар городов отгрузки и доставки
+    (shipping_cities, delivery_cities)
+    """
+    serializer = DeliveryCostsRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    if "origin" in data:
+        destinations = data["destinations"]
+        distances = haversine_km(
+            data["origin"]["latitude"],
+            data["origin"]["longitude"],
+            [destination["latitude"] for destination in destinations],
+            [destination["longitude"] for destination in destinations],
+        )
+        return Response(
+            get_delivery_costs(distances.tolist(), settings.PRICE_PER_KM)
+        )
+
+    pairs = [
+        (shipping_city, delivery_city)
+        for shipping_city in data["shipping_cities"]
+        for delivery_city in data["delivery_cities"]
+    ]
+    distances = city_distance_matrix.get_distances(pairs)
+    costs = get_delivery_costs(
+        [distances.get(pair) for pair in pairs], settings.PRICE_PER_KM
+    )
+    return Response(
+        [
+            {
+                "shipping_city": shipping_city,
+                "delivery_city": delivery_city,
+                "cost": cost,
+            }
+            for (shipping_city, delivery_city), cost in zip(pairs, costs)
+        ]
     )
-    return Response(delivery_data.dict())
 
 
+@swagger_auto_schema(
+    method="get",
+    manual_parameters=[
+        api.Parameter(
+            "lat",
+            api.IN_QUERY,
+            type=api.TYPE_NUMBER,
+            description="Широта",
+            required=True,
+        ),
+        api.Parameter(
+            "lon",
+            api.IN_QUERY,
+            type=api.TYPE_NUMBER,
+            description="Долгота",
+            required=True,
+        ),
+        api.Parameter(
+            "radius",
+            api.IN_QUERY,
+            type=api.TYPE_NUMBER,
+            description=(
+                f"Радиус поиска в км (до {MAX_CITY_SEARCH_RADIUS_KM}), "
+                "без него возвращается ближайший город"
+            ),
+            required=False,
+        ),
+    ],
+)
+@api_view(["GET"])
+def nearest_cities(request):
+    """Города рядом с точкой по локальному индексу, без запросов к геокодеру"""
+    latitude, longitude = validate_coordinates(
+        request.query_params.get("lat"), request.query_params.get("lon")
+    )
+    radius = request.query_params.get("radius")
+    if radius:
+        found = city_index.within(latitude, longitude, validate_radius(radius))
+    else:
+        nearest = city_index.nearest(latitude, longitude)
+        found = [nearest] if nearest else []
+
+    cities = City.objects.select_related("region").in_bulk(
+        [city_id for city_id, _ in found]
+    )
+    return Response(
+        [
+            {
+                **CitySerializer(cities[city_id]).data,
+                "distance": round(distance, 2),
+            }
+            for city_id, distance in found
+            if city_id in cities
+        ]
+    )
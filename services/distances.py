@@ -0,0 +1,159 @@
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.core.cache import cache
+
+from common.cache import bump_model_version, get_model_versions
+from company.models import City
+
+log = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+CITY_DISTANCE_KEY = "city_distance:{}:{}:{}"
+CITY_DISTANCE_TIMEOUT = 30 * 24 * 60 * 60
+
+
+def haversine_km(
+    latitudes_from, longitudes_from, latitudes_to, longitudes_to
+) -> np.ndarray:
+    """
+    Great circle distances in km, arguments are broadcast against each other
+    """
+    latitudes_from, longitudes_from, latitudes_to, longitudes_to = (
+        np.radians(np.asarray(values, dtype=float))
+        for values in (
+            latitudes_from,
+            longitudes_from,
+            latitudes_to,
+            longitudes_to,
+        )
+    )
+    a = (
+        np.sin((latitudes_to - latitudes_from) / 2) ** 2
+        + np.cos(latitudes_from)
+        * np.cos(latitudes_to)
+        * np.sin((longitudes_to - longitudes_from) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def get_pair_key(version: str, first_id: int, second_id: int) -> str:
+    # Расстояние симметрично, пара хранится один раз
+    return CITY_DISTANCE_KEY.format(version, *sorted((first_id, second_id)))
+
+
+class CityDistanceMatrix:
+    """
+    Sparse matrix of distances between cities cached per pair.
+    Cached distances are reset when cities change, see company.receivers.
+    Distances to cities without coordinates are None, the geocoder is not
+    requested here: coordinates are filled by fill_city_coordinates
+    (see the geocode_cities command)
+    """
+
+    def get_distances(
+        self, pairs: Iterable[Tuple[int, int]]
+    ) -> Dict[Tuple[int, int], Optional[float]]:
+        pairs = list(dict.fromkeys(pairs))
+        version = get_model_versions([City])
+        keys = {pair: get_pair_key(version, *pair) for pair in pairs}
+        cached = cache.get_many(list(set(keys.values())))
+        result = {pair: cached.get(key) for pair, key in keys.items()}
+
+        missing = [
+            pair for pair, distance in result.items() if distance is None
+        ]
+        if not missing:
+            return result
+
+        coordinates = self.get_coordinates(
+            {city_id for pair in missing for city_id in pair}
+        )
+        computable = [
+            pair
+            for pair in missing
+            if pair[0] in coordinates and pair[1] in coordinates
+        ]
+        if computable:
+            points_from = np.array(
+                [coordinates[pair[0]] for pair in computable]
+            )
+            points_to = np.array([coordinates[pair[1]] for pair in computable])
+            distances = haversine_km(
+                points_from[:, 0],
+                points_from[:, 1],
+                points_to[:, 0],
+                points_to[:, 1],
+            )
+            computed = dict(zip(computable, distances.tolist()))
+            result.update(computed)
+            cache.set_many(
+                {
+                    get_pair_key(version, *pair): distance
+                    for pair, distance in computed.items()
+                },
+                CITY_DISTANCE_TIMEOUT,
+            )
+        return result
+
+    @staticmethod
+    def get_coordinates(city_ids) -> Dict[int, Tuple[float, float]]:
+        rows = City.objects.filter(
+            pk__in=city_ids, latitude__isnull=False, longitude__isnull=False
+        ).values_list("pk", "latitude", "longitude")
+        return {
+            city_id: (float(latitude), float(longitude))
+            for city_id, latitude, longitude in rows
+        }
+
+
+def fill_city_coordinates(
+    cities: Iterable[City],
+    resolve_coordinates: Callable[[City], Tuple[float, float]],
+) -> List[City]:
+    """
+    Resolves and saves coordinates of the cities which have none,
+    cities the geocoder failed for are skipped
+    """
+    resolved = []
+    for city in cities:
+        if city.latitude is not None and city.longitude is not None:
+            continue
+        try:
+            city.latitude, city.longitude = resolve_coordinates(city)
+        except Exception:
+            log.exception("Failed to resolve coordinates of city %s", city.pk)
+            continue
+        resolved.append(city)
+    if resolved:
+        City.objects.bulk_update(resolved, ["latitude", "longitude"])
+        bump_model_version(City)
+    return resolved
+
+
+def get_delivery_costs(
+    distances: Iterable[Optional[float]], price_per_km: float
+) -> List[Optional[dict]]:
+    """
+    DeliveryCost fields for every distance in one pass
+    """
+    distances = list(distances)
+    known = np.array(
+        [distance for distance in distances if distance is not None],
+        dtype=float,
+    )
+    total_prices = iter((known * price_per_km).round(2).tolist())
+    rounded_distances = iter(known.round(2).tolist())
+    return [
+        (
+            {
+                "price_per_km": round(price_per_km, 2),
+                "distance": next(rounded_distances),
+                "total_price": next(total_prices),
+            }
+            if distance is not None
+            else None
+        )
+        for distance in distances
+    ]
@@ -0,0 +1,103 @@
+import re
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from company.models import GeocodeCache
+from config.settings import YANDEX_GEOCODER_CACHE_SIZE, YANDEX_GEOCODER_CACHE_TTL
+
+METRIC_KEY = "geocode_cache_metrics:{}"
+# memory_hit, db_hit, miss - обращения к кэшу,
+# upstream_requests и upstream_ms - запросы к геокодеру и их суммарное время
+METRICS = ("memory_hit", "db_hit", "miss", "upstream_requests", "upstream_ms")
+
+
+def normalize_address(raw_address: str) -> str:
+    return re.sub(r"\s+", " ", raw_address or "").strip().lower()
+
+
+def incr_metric(name: str, delta: int = 1):
+    key = METRIC_KEY.format(name)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+def get_metrics() -> Dict[str, int]:
+    keys = {name: METRIC_KEY.format(name) for name in METRICS}
+    values = cache.get_many(list(keys.values()))
+    return {name: values.get(key, 0) for name, key in keys.items()}
+
+
+class GeocodeResponseCache:
+    """
+    Two level cache of geocoder results: in-process LRU
+    and GeocodeCache table, entries of both expire after `ttl` seconds
+    """
+
+    def __init__(self, size: int = YANDEX_GEOCODER_CACHE_SIZE, ttl: int = YANDEX_GEOCODER_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(
+            self, raw_address: str, results: int, compute: Callable[[], List[dict]]
+    ) -> List[dict]:
+        key = (normalize_address(raw_address), results)
+        addresses = self._get_from_memory(key)
+        if addresses is not None:
+            incr_metric("memory_hit")
+            return addresses
+
+        addresses = self._get_from_db(key)
+        if addresses is not None:
+            incr_metric("db_hit")
+        else:
+            incr_metric("miss")
+            addresses = compute()
+            GeocodeCache.objects.update_or_create(
+                address=key[0], results=results, defaults={"addresses": addresses}
+            )
+        self._set_to_memory(key, addresses)
+        return addresses
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_from_memory(self, key) -> Optional[List[dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, addresses = entry
+            if expires_at < timezone.now():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return addresses
+
+    def _set_to_memory(self, key, addresses: List[dict]):
+        with self._lock:
+            self._entries[key] = (timezone.now() + timedelta(seconds=self.ttl), addresses)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def _get_from_db(self, key) -> Optional[List[dict]]:
+        address, results = key
+        return (
+            GeocodeCache.objects.filter(
+                address=address,
+                results=results,
+                updated_at__gte=timezone.now() - timedelta(seconds=self.ttl),
+            )
+            .values_list("addresses", flat=True)
+            .first()
+        )
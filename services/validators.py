@@ -1,7 +1,35 @@
-from typing import Collection
+from typing import Collection, Tuple
+
+from rest_framework.exceptions import ValidationError
+
+# Больший радиус возвращал бы большую часть всех городов
+MAX_CITY_SEARCH_RADIUS_KM = 500
 
 
 def validate_logistics_coordinates(coordinates: Collection):
     if any([not x for x in coordinates]):
         raise ValueError("You must specify all coordinates")
     return coordinates
+
+
+def validate_coordinates(latitude, longitude) -> Tuple[float, float]:
+    try:
+        latitude, longitude = float(latitude), float(longitude)
+    except (TypeError, ValueError):
+        raise ValidationError("You must specify latitude and longitude")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValidationError("Coordinates are out of range")
+    return latitude, longitude
+
+
+def validate_radius(radius) -> float:
+    try:
+        radius = float(radius)
+    except (TypeError, ValueError):
+        raise ValidationError("Радиус должен быть числом")
+    if not 0 < radius <= MAX_CITY_SEARCH_RADIUS_KM:
+        raise ValidationError(
+            "Радиус должен быть больше 0 "
+            f"и не больше {MAX_CITY_SEARCH_RADIUS_KM} км"
+        )
+    return radius
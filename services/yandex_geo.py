@@ -1,11 +1,14 @@
 import logging
-from typing import List, Dict
+import time
+from typing import List, Dict, Iterable
 
 from requests import Session
 
+from services.geocode_cache import GeocodeResponseCache, incr_metric
 from services.models import AddressData
+from company.city_index import city_index
 from company.models import City
-from config.settings import YANDEX_GEOCODER_BASE_URL
+from config.settings import CITY_INDEX_MAX_DISTANCE_KM, YANDEX_GEOCODER_BASE_URL
 
 log = logging.getLogger(__name__)
 
@@ -20,10 +23,20 @@ class YandexGeocoderClient(BaseClient):
         self._session = Session()
         self.kwargs = kwargs or {}
         self.base_url = base_url or self._DEFAULT_BASE_URL
+        self._cache = GeocodeResponseCache()
 
     def get_addresses(self, raw_addresses, addresses_to_return=10):
-        raw_json = self._make_request(raw_addresses, addresses_to_return)
-        return self._parse_response(raw_json)
+        addresses = self._cache.get_or_compute(
+            raw_addresses,
+            addresses_to_return,
+            lambda: [
+                address.dict()
+                for address in self._parse_response(
+                    self._make_request(raw_addresses, addresses_to_return)
+                )
+            ],
+        )
+        return [AddressData(**address) for address in addresses]
 
     def get_coordinates_from_city(self, city: City):
         city_name = city.name
@@ -46,7 +59,8 @@ class YandexGeocoderClient(BaseClient):
             "GeocoderMetaData"
         ]["text"]
 
-        object_lat, object_long = map(
+        # Геокодер возвращает точку в порядке "долгота широта"
+        object_long, object_lat = map(
             float, geo_object["GeoObject"]["Point"]["pos"].split()
         )
 
@@ -68,12 +82,20 @@ class YandexGeocoderClient(BaseClient):
             "geocode": raw_adresses,
             "results": addresses_to_return,
         }
-        return self._request(url=url, get_params=params)
+        started_at = time.monotonic()
+        try:
+            return self._request(url=url, get_params=params)
+        finally:
+            incr_metric("upstream_requests")
+            incr_metric("upstream_ms", int((time.monotonic() - started_at) * 1000))
 
     def _parse_response(self, response_body: Dict) -> List[AddressData]:
         geo_objects = response_body["response"]["GeoObjectCollection"][
             "featureMember"
         ]
+        city_ids = self._get_city_ids(
+            self._get_city_name(geo_object) for geo_object in geo_objects
+        )
         parsed_geo_objects: List[AddressData] = list()
 
         for geo_object in geo_objects:
@@ -85,7 +107,13 @@ class YandexGeocoderClient(BaseClient):
                 float, geo_object["GeoObject"]["Point"]["pos"].split()
             )
 
-            city_id = self._get_city_id(geo_object)
+            city_id = city_ids.get(self._get_city_name(geo_object))
+            if not city_id:
+                # Адрес без населенного пункта относится к ближайшему известному городу
+                nearest = city_index.nearest(
+                    object_lat, object_long, CITY_INDEX_MAX_DISTANCE_KM
+                )
+                city_id = nearest[0] if nearest else None
             # Checking if city have been extracted from geocoder response, if no, than skip current address
             if not city_id:
                 continue
@@ -101,7 +129,8 @@ class YandexGeocoderClient(BaseClient):
 
         return parsed_geo_objects
 
-    def _get_city_id(self, geo_object):
+    @staticmethod
+    def _get_city_name(geo_object):
         address_components = geo_object["GeoObject"]["metaDataProperty"][
             "GeocoderMetaData"
         ]["Address"]["Components"]
@@ -113,13 +142,24 @@ class YandexGeocoderClient(BaseClient):
         city_component = list(
             filter(lambda x: x["kind"] == "locality", address_components)
         )
-        # If we successfully extracted city component, then we can extract city name
-        # And then we can get city id from DB
-        city_name = city_component[0]["name"] if city_component else None
-        if not city_name:
-            return None
-
-        # Возможны лаги работы с БД
-        # TODO: оптимизировать поиск/создание кучи объектов
-        city, created = City.objects.get_or_create(name=city_name)
-        return city.pk
+        return city_component[0]["name"] if city_component else None
+
+    @staticmethod
+    def _get_city_ids(city_names: Iterable[str]) -> Dict[str, int]:
+        """
+        Resolves all city names of the response at once,
+        missing cities are created
+        """
+        city_names = {name for name in city_names if name}
+        if not city_names:
+            return {}
+
+        city_ids = {}
+        # Названия городов не уникальны, берется город с наименьшим id
+        for pk, name in City.objects.filter(name__in=city_names).order_by("-pk").values_list("pk", "name"):
+            city_ids[name] = pk
+        created = City.objects.bulk_create(
+            [City(name=name) for name in city_names - city_ids.keys()]
+        )
+        city_ids.update((city.name, city.pk) for city in created)
+        return city_ids
@@ -1,76 +1,86 @@
 from common.serializers import NonNullDynamicFieldsModelSerializer
 from exchange.api.serializers import ExchangeRecyclablesSerializer
-from exchange.models import RecyclablesDeal, DealStatus, RecyclablesApplication, ApplicationStatus
+from exchange.models import RecyclablesApplication
 from product.models import Recyclables
 from rest_framework import serializers
-from django.db.models import Q
+from django.db import models
+from statistic.services import (
+    RecyclablesDealsStatistics,
+    RecyclablesStatistics,
+    get_deviation,
+)
 
 
-class RecyclablesStatisticsSerializer(ExchangeRecyclablesSerializer):
-    def get_deviation_percent(self, instance: Recyclables):
-        lower_date_bound = self.context.get("lower_date_bound")
-        additional_filters = {}
-
-        if lower_date_bound:
-            additional_filters[
-                "application__created_at__gte"
-            ] = lower_date_bound
-
-        # FIXME: Попробовать сделать через аннотации в get_queryset
-        try:
-            latest_deal = RecyclablesDeal.objects.filter(
-                application__recyclables=instance,
-                status=DealStatus.COMPLETED,
-                **additional_filters,
-            ).latest("created_at")
-        except RecyclablesDeal.DoesNotExist:
-            latest_deal = None
-
-        if not latest_deal:
-            return None
-
-        try:
-            first_deal = (
-                RecyclablesDeal.objects.filter(
-                    application__recyclables=instance,
-                    status=DealStatus.COMPLETED,
-                    **additional_filters,
-                )
-                .exclude(pk=latest_deal.pk)
-                .earliest("created_at")
-            )
-        except RecyclablesDeal.DoesNotExist:
-            first_deal = None
-
-        if not first_deal:
-            return None
-
-        latest_deal_price = float(latest_deal.price)
-        pre_latest_deal_price = float(first_deal.price)
-        return round(
-            (latest_deal_price - pre_latest_deal_price)
-            / pre_latest_deal_price
-            * 100,
-            2,
+class ShortRecyclablesAppStatisticsSerializer(NonNullDynamicFieldsModelSerializer):
+    class Meta:
+        model = Recyclables
+        fields = ("id", "category", "name")
+
+
+class RecyclablesStatisticsListSerializer(serializers.ListSerializer):
+    """
+    Computes statistics of all serialized recyclables in a few grouped queries
+    and passes them to the child serializer through the context
+    """
+
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        data = list(data)
+        self._context = {
+            **self.context,
+            "recyclables_statistics": self.child.get_statistics_engine(
+                [instance.id for instance in data]
+            ).compute(),
+        }
+        return super().to_representation(data)
+
+
+class RecyclablesStatisticsMixin:
+    statistics_with_volumes = False
+
+    def get_statistics_engine(self, recyclables_ids):
+        return RecyclablesStatistics(
+            recyclables_ids,
+            lower_date_bound=self.context.get("lower_date_bound"),
+            deal_type=self.context.get("deal_type"),
+            with_volumes=self.statistics_with_volumes,
         )
 
+    def get_statistics(self, instance: Recyclables) -> dict:
+        statistics = self.context.get("recyclables_statistics")
+        if statistics is None or instance.id not in statistics:
+            # Сериализация одного объекта без списка
+            return self.get_statistics_engine([instance.id]).compute()[instance.id]
+        return statistics[instance.id]
+
+    def get_latest_deal_price(self, instance: Recyclables):
+        return self.get_statistics(instance).get("latest_deal_price")
+
+    def get_deviation_percent(self, instance: Recyclables):
+        return self.get_statistics(instance).get("deviation_percent")
+
     def get_deviation(self, instance: Recyclables):
-        deviation_percent = self.get_deviation_percent(instance)
-        if not deviation_percent or deviation_percent == 0:
-            return 0
-        if deviation_percent > 0:
-            return 1
-        return -1
+        return get_deviation(self.get_deviation_percent(instance))
 
 
-class ShortRecyclablesAppStatisticsSerializer(NonNullDynamicFieldsModelSerializer):
-    class Meta:
-        model = Recyclables
-        fields = ("id", "category", "name")
+class RecyclablesStatisticsSerializer(RecyclablesStatisticsMixin, ExchangeRecyclablesSerializer):
+    """
+    Latest price and deviation by completed deals
+    """
+
+    class Meta(ExchangeRecyclablesSerializer.Meta):
+        list_serializer_class = RecyclablesStatisticsListSerializer
+
+    def get_statistics_engine(self, recyclables_ids):
+        return RecyclablesDealsStatistics(
+            recyclables_ids,
+            lower_date_bound=self.context.get("lower_date_bound"),
+        )
 
 
 # ДОБАВИЛ СЕРИАЛАЙЗЕР ДЛЯ recyclables_applications_price
-class RecyclablesAppStatisticsSerializer(NonNullDynamicFieldsModelSerializer):
+class RecyclablesAppStatisticsSerializer(RecyclablesStatisticsMixin, NonNullDynamicFieldsModelSerializer):
     application_recyclable_status = serializers.IntegerField(read_only=True)
     sales_applications_count = serializers.IntegerField(read_only=True)
     purchase_applications_count = serializers.IntegerField(read_only=True)
@@ -87,133 +97,33 @@ class RecyclablesAppStatisticsSerializer(NonNullDynamicFieldsModelSerializer):
     supply_contracts_prices = serializers.SerializerMethodField(read_only=True)
     ready_for_shipment_prices = serializers.SerializerMethodField(read_only=True)
 
+    statistics_with_volumes = True
+
     class Meta:
         model = Recyclables
+        list_serializer_class = RecyclablesStatisticsListSerializer
 
     def get_supply_contracts_prices(self, obj):
-        lst = RecyclablesApplication.objects.filter(urgency_type=2, deal_type=1,
-                                                    recyclables__id=obj.id).order_by("created_at")[0:2]
-        result = list(map(lambda app: int(app.price), lst))
-        prices_dict = {}
-        if len(result) > 0:
-            prices_dict["last_price"] = result[0]
-            if (len(result) > 1):
-                prices_dict["pre_last_price"] = result[1]
-            if (len(result) == 1):
-                prices_dict["pre_last_price"] = 0
-        else:
-            prices_dict["last_price"] = 0
-            prices_dict["pre_last_price"] = 0
-        return prices_dict
+        return self.get_statistics(obj)["supply_contracts_prices"]
 
     def get_ready_for_shipment_prices(self, obj):
-        lst = RecyclablesApplication.objects.filter(urgency_type=1, deal_type=1,
-                                                    recyclables__id=obj.id).order_by("created_at")[0:2]
-        result = list(map(lambda app: int(app.price), lst))
-        prices_dict = {}
-        if len(result) > 0:
-            prices_dict["last_price"] = result[0]
-            if (len(result) > 1):
-                prices_dict["pre_last_price"] = result[1]
-            if (len(result) == 1):
-                prices_dict["pre_last_price"] = 0
-        else:
-            prices_dict["last_price"] = 0
-            prices_dict["pre_last_price"] = 0
-        return prices_dict
+        return self.get_statistics(obj)["ready_for_shipment_prices"]
 
     def get_purchase_ready_for_shipment_total_volume(self, obj):
-        lst = RecyclablesApplication.objects.filter(urgency_type=1, deal_type=1, recyclables__id=obj.id)
-        result = map(lambda app: int(app.full_weigth) / 1000, lst)
-        return sum(result)
+        return self.get_statistics(obj).get("purchase_ready_for_shipment_total_volume", 0)
 
     def get_sales_ready_for_shipment_total_volume(self, obj):
-        lst = RecyclablesApplication.objects.filter(urgency_type=1, deal_type=2, recyclables__id=obj.id)
-        result = map(lambda app: int(app.full_weigth) / 1000, lst)
-        return sum(result)
+        return self.get_statistics(obj).get("sales_ready_for_shipment_total_volume", 0)
 
     def get_purchase_supply_contract_total_volume(self, obj):
-        lst = RecyclablesApplication.objects.filter(urgency_type=2, deal_type=1, recyclables__id=obj.id)
-        result = map(lambda app: int(app.volume) / 1000, lst)
-        return sum(result)
+        return self.get_statistics(obj).get("purchase_supply_contract_total_volume", 0)
 
     def get_sales_supply_contract_total_volume(self, obj):
-        lst = RecyclablesApplication.objects.filter(urgency_type=2, deal_type=2, recyclables__id=obj.id)
-        result = map(lambda app: int(app.volume) / 1000, lst)
-        return sum(result)
-
-    def get_latest_deal_price(self, instance: Recyclables):
-        try:
-            latest_app = RecyclablesApplication.objects.filter(
-                recyclables_id=instance.id,
-                status__gte=ApplicationStatus.ON_REVIEW).latest("created_at")
-        except RecyclablesApplication.DoesNotExist:
-            latest_app = None
-        return latest_app.price if latest_app else None
-
-    def get_deviation_percent(self, instance: Recyclables):
-        lower_date_bound = self.context.get("lower_date_bound")
-        deal_type = self.context.get("deal_type")
-        additional_filters = {}
-
-        # ДОБАВИЛ ДЛЯ РАЗДЕЛЕНИЯ ПОКУПКА/ПРОДАЖА
-        if deal_type:
-            additional_filters[
-                "deal_type"
-            ] = deal_type
-
-        if lower_date_bound:
-            additional_filters[
-                "created_at__gte"
-            ] = lower_date_bound
-
-        # FIXME: Попробовать сделать через аннотации в get_queryset
-        try:
-            latest_app = RecyclablesApplication.objects.filter(
-                recyclables_id=instance.id,
-                status__gte=ApplicationStatus.ON_REVIEW,
-                **additional_filters,
-            ).latest("created_at")
-        except RecyclablesApplication.DoesNotExist:
-            latest_app = None
-        if not latest_app:
-            return None
-
-        try:
-            p = (RecyclablesApplication.objects.filter(
-                recyclables_id=instance.id,
-                status__gte=ApplicationStatus.ON_REVIEW,
-                **additional_filters,
-            )
-                 .exclude(pk=latest_app.pk)
-                 )
-            first_app = p.order_by('created_at')
-        except RecyclablesApplication.DoesNotExist:
-            first_app = None
-
-        if not first_app:
-            return None
-
-        latest_deal_price = float(latest_app.price)
-        pre_latest_deal_price = float(first_app[0].price)
-        return round(
-            (latest_deal_price - pre_latest_deal_price)
-            / pre_latest_deal_price
-            * 100,
-            2,
-        )
-
-    def get_deviation(self, instance: Recyclables):
-        deviation_percent = self.get_deviation_percent(instance)
-        if not deviation_percent or deviation_percent == 0:
-            return 0
-        if deviation_percent > 0:
-            return 1
-        return -1
+        return self.get_statistics(obj).get("sales_supply_contract_total_volume", 0)
 
 
 # ДОБАВИЛ СЕРИАЛАЙЗЕР ДЛЯ main_page_recyclable
-class MainPageRecyclableSerializer(NonNullDynamicFieldsModelSerializer):
+class MainPageRecyclableSerializer(RecyclablesStatisticsMixin, NonNullDynamicFieldsModelSerializer):
     application_recyclable_status = serializers.IntegerField(read_only=True)
     sales_applications_count = serializers.IntegerField(read_only=True)
     purchase_applications_count = serializers.IntegerField(read_only=True)
@@ -225,67 +135,7 @@ class MainPageRecyclableSerializer(NonNullDynamicFieldsModelSerializer):
 
     class Meta:
         model = Recyclables
-
-    def get_latest_deal_price(self, instance: Recyclables):
-        try:
-            latest_app = RecyclablesApplication.objects.filter(
-                recyclables_id=instance.id,
-                status__gte=ApplicationStatus.ON_REVIEW).latest("created_at")
-        except RecyclablesApplication.DoesNotExist:
-            latest_app = None
-        return latest_app.price if latest_app else None
-
-    def get_deviation_percent(self, instance: Recyclables):
-        lower_date_bound = self.context.get("lower_date_bound")
-        additional_filters = {}
-        if lower_date_bound:
-            additional_filters[
-                "created_at__gte"
-            ] = lower_date_bound
-
-        # FIXME: Попробовать сделать через аннотации в get_queryset
-        try:
-            latest_app = RecyclablesApplication.objects.filter(
-                recyclables_id=instance.id,
-                status__gte=ApplicationStatus.ON_REVIEW,
-                **additional_filters,
-            ).latest("created_at")
-        except RecyclablesApplication.DoesNotExist:
-            latest_app = None
-        if not latest_app:
-            return None
-
-        try:
-            p = (RecyclablesApplication.objects.filter(
-                recyclables_id=instance.id,
-                status__gte=ApplicationStatus.ON_REVIEW,
-                **additional_filters,
-            )
-                 .exclude(pk=latest_app.pk)
-                 )
-            first_app = p.order_by('created_at')
-        except RecyclablesApplication.DoesNotExist:
-            first_app = None
-
-        if not first_app:
-            return None
-
-        latest_deal_price = float(latest_app.price)
-        pre_latest_deal_price = float(first_app[0].price)
-        return round(
-            (latest_deal_price - pre_latest_deal_price)
-            / pre_latest_deal_price
-            * 100,
-            2,
-        )
-
-    def get_deviation(self, instance: Recyclables):
-        deviation_percent = self.get_deviation_percent(instance)
-        if not deviation_percent or deviation_percent == 0:
-            return 0
-        if deviation_percent > 0:
-            return 1
-        return -1
+        list_serializer_class = RecyclablesStatisticsListSerializer
 
 
 class RecyclablesApplicationStatisticsSerializer(
@@ -1,26 +1,38 @@
+import datetime
+
 from django.contrib.auth import get_user_model
 from django.db.models import Count, Sum, Q
+from django.utils import timezone
+from django_filters import BooleanFilter, ModelMultipleChoiceFilter, MultipleChoiceFilter
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet
+from django_filters.utils import translate_validation
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
+from common.cache import cached_response
 from common.serializers import EmptySerializer
 from company.models import Company, RecyclingCollectionType
 from exchange.api.views import (
     RecyclablesApplicationFilterSet,
     RecyclablesDealFilterSet,
 )
-from exchange.models import RecyclablesApplication, RecyclablesDeal, DealStatus
+from exchange.models import (
+    ApplicationStatus,
+    DailyExchangeVolume,
+    DealStatus,
+    RecyclablesApplication,
+    RecyclablesDeal,
+)
 from exchange.utils import (
     validate_period,
     get_truncation_class,
     get_lower_date_bound,
 )
 from product.api.views import RecyclablesFilterSet, ApplicationsRecyclablesFilterSet
-from product.models import Recyclables
+from product.models import Recyclables, RecyclableMarketSummary
 from statistic.api.models import (
     RecyclingColTypeWithCount,
     RecyclablesTotalWeightByCategory,
@@ -38,6 +50,35 @@ from user.models import UserRole
 from drf_yasg import openapi as api
 
 
+EXCHANGE_VOLUME_COUNTER_PARAMS = {
+    "period",
+    "deal_type",
+    "urgency_type",
+    "recyclables",
+    "recyclables__category",
+    "status",
+    "is_deleted",
+}
+
+
+class ExchangeVolumeFilterSet(FilterSet):
+    """
+    Filters of RecyclablesApplicationFilterSet supported by DailyExchangeVolume
+    """
+
+    status = MultipleChoiceFilter(choices=ApplicationStatus.choices)
+    recyclables = ModelMultipleChoiceFilter(queryset=Recyclables.objects.all())
+    is_deleted = BooleanFilter(field_name="application_is_deleted")
+
+    class Meta:
+        model = DailyExchangeVolume
+        fields = {
+            "deal_type": ["exact"],
+            "urgency_type": ["exact"],
+            "recyclables__category": ["exact"],
+        }
+
+
 class StatisticsViewSet(GenericViewSet):
     filter_backends = (
         DjangoFilterBackend,
@@ -189,6 +230,7 @@ class StatisticsViewSet(GenericViewSet):
 
     # ДОБАВИЛ ДЛЯ СТАТИСТИКИ ТЕКУЩИХ ЗАЯВОК И ЦЕН
     @action(methods=["get"], detail=False)
+    @cached_response(RecyclablesApplication, RecyclableMarketSummary, Recyclables)
     def recyclables_applications_price(self, request):
         recyclables = self.filter_queryset(
             self.get_queryset())
@@ -227,6 +269,7 @@ class StatisticsViewSet(GenericViewSet):
 
     # ендпоинт статистики для главной странице
     @action(methods=["get"], detail=False)
+    @cached_response(RecyclablesApplication, RecyclableMarketSummary, Recyclables)
     def main_page_statistics(self, request):
 
         recyclables = self.filter_queryset(self.get_queryset())
@@ -262,7 +305,6 @@ class StatisticsViewSet(GenericViewSet):
 
         if lower_date_bound:
             qs = qs.filter(created_at__gte=lower_date_bound)
-        qs = qs.annotate_total_weight()
 
         aggregated_total_weight = (
             qs.values("recyclables__name")
@@ -292,6 +334,7 @@ class StatisticsViewSet(GenericViewSet):
         ]
     )
     @action(methods=["get"], detail=False)
+    @cached_response(RecyclablesApplication, Company)
     def total_applications(self, request):
         qs = self.filter_queryset(self.get_queryset())
 
@@ -345,6 +388,7 @@ class StatisticsViewSet(GenericViewSet):
         ]
     )
     @action(methods=["get"], detail=False)
+    @cached_response(RecyclablesDeal, Company)
     def total_deals(self, request):
         period = validate_period(request.query_params.get("period", "all"))
 
@@ -416,10 +460,47 @@ class StatisticsViewSet(GenericViewSet):
         )
         return response
 
+    @swagger_auto_schema(
+        manual_parameters=[
+            api.Parameter(
+                "period",
+                api.IN_QUERY,
+                type=api.TYPE_STRING,
+                required=False,
+                description="Период по которому выводить статистику(week/month/year/all)",
+            )
+        ]
+    )
     @action(detail=False, methods=["get"])
     def exchange_volume(self, request):
-        qs = self.get_queryset()
-        total_price = sum(list(map(lambda x: x.total_price, qs)))
+        period = validate_period(request.query_params.get("period", "all"))
+        lower_date_bound = get_lower_date_bound(period)
+        # Счетчики дневные, поэтому период в обеих ветках начинается с начала дня
+        lower_date = lower_date_bound.date() if lower_date_bound else None
+        params = {key for key, value in request.query_params.items() if value}
+
+        # Фильтры, которые есть в дневных счетчиках, считаются по ним,
+        # для остальных - агрегат по заявкам в базе
+        if params <= EXCHANGE_VOLUME_COUNTER_PARAMS:
+            filterset = ExchangeVolumeFilterSet(
+                request.query_params, queryset=DailyExchangeVolume.objects.all()
+            )
+            if not filterset.is_valid():
+                raise translate_validation(filterset.errors)
+            qs = filterset.qs
+            if lower_date:
+                qs = qs.filter(date__gte=lower_date)
+            total_price = qs.aggregate(total_price=Sum("total"))["total_price"] or 0
+        else:
+            # DjangoFilterBackend отвечает 400 на неверные значения фильтров
+            qs = self.filter_queryset(self.get_queryset())
+            if lower_date:
+                qs = qs.filter(
+                    created_at__gte=timezone.make_aware(
+                        datetime.datetime.combine(lower_date, datetime.time.min)
+                    )
+                )
+            total_price = qs.aggregate_total_price()
         response_data = ExchangeVolume(total=total_price)
 
         return Response(response_data.dict())
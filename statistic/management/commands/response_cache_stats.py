@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver
+
+from common.cache import get_metrics
+
+
+class Command(BaseCommand):
+    help = "Выводит количество попаданий и промахов кэша ответов по эндпоинтам"
+
+    def handle(self, *args, **options):
+        # Эндпоинты регистрируются при импорте views
+        get_resolver().url_patterns
+        for endpoint, metrics in get_metrics().items():
+            hits = metrics["hit"] + metrics["stale"]
+            total = hits + metrics["miss"]
+            hit_rate = hits / total * 100 if total else 0
+            self.stdout.write(
+                f"{endpoint}: hit={metrics['hit']} stale={metrics['stale']} "
+                f"miss={metrics['miss']} "
+                f"not_modified={metrics['not_modified']} hit_rate={hit_rate:.1f}%"
+            )
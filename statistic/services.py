@@ -0,0 +1,239 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connection
+from django.db.models import F, Q, Sum, Window
+from django.db.models.functions import Floor, RowNumber
+
+from exchange.models import (
+    ApplicationStatus,
+    DealStatus,
+    DealType,
+    RecyclablesApplication,
+    RecyclablesDeal,
+    UrgencyType,
+)
+
+# Поля суммарного объема: (срочность, тип сделки, поле веса)
+TOTAL_VOLUME_FIELDS = {
+    "purchase_ready_for_shipment_total_volume": (
+        UrgencyType.READY_FOR_SHIPMENT, DealType.BUY, "full_weigth"
+    ),
+    "sales_ready_for_shipment_total_volume": (
+        UrgencyType.READY_FOR_SHIPMENT, DealType.SELL, "full_weigth"
+    ),
+    "purchase_supply_contract_total_volume": (
+        UrgencyType.SUPPLY_CONTRACT, DealType.BUY, "volume"
+    ),
+    "sales_supply_contract_total_volume": (
+        UrgencyType.SUPPLY_CONTRACT, DealType.SELL, "volume"
+    ),
+}
+
+PRICES_FIELDS = {
+    UrgencyType.SUPPLY_CONTRACT: "supply_contracts_prices",
+    UrgencyType.READY_FOR_SHIPMENT: "ready_for_shipment_prices",
+}
+
+
+def fetch_ranked_rows(queryset, partition_by, order_by, limit, fields) -> List[tuple]:
+    """
+    Returns `fields` of the first `limit` rows of every partition:
+    SELECT ... FROM (... ROW_NUMBER() OVER (PARTITION BY ... ORDER BY ...)) WHERE row_number <= limit
+    """
+    ranked = queryset.annotate(
+        row_number=Window(
+            expression=RowNumber(), partition_by=partition_by, order_by=order_by
+        )
+    ).values_list(*fields, "row_number").order_by()
+    sql, params = ranked.query.sql_with_params()
+    columns = ", ".join(f"ranked.col{i}" for i in range(len(fields)))
+    aliased = ", ".join(f"col{i}" for i in range(len(fields) + 1))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {columns} FROM ({sql}) AS ranked({aliased}) "
+            f"WHERE ranked.col{len(fields)} <= %s",
+            (*params, limit),
+        )
+        return cursor.fetchall()
+
+
+def get_deviation_percent(latest_price, first_price) -> Optional[float]:
+    if latest_price is None or first_price is None or not first_price:
+        return None
+    return round(
+        (float(latest_price) - float(first_price)) / float(first_price) * 100, 2
+    )
+
+
+def get_deviation(deviation_percent: Optional[float]) -> int:
+    if not deviation_percent:
+        return 0
+    if deviation_percent > 0:
+        return 1
+    return -1
+
+
+class RecyclablesStatistics:
+    """
+    Computes application statistics of a set of recyclables
+    with a constant number of grouped queries, the result is a lookup dict
+    recyclable id -> metrics used by the statistics serializers
+    """
+
+    # Путь к id вторсырья в queryset цен
+    recyclables_field = "recyclables_id"
+
+    def __init__(
+            self,
+            recyclables_ids: Iterable[int],
+            lower_date_bound=None,
+            deal_type=None,
+            with_volumes: bool = True,
+    ):
+        self.recyclables_ids = list(recyclables_ids)
+        self.lower_date_bound = lower_date_bound
+        self.deal_type = deal_type
+        self.with_volumes = with_volumes
+
+    def get_applications(self):
+        return RecyclablesApplication.objects.filter(
+            recyclables_id__in=self.recyclables_ids
+        )
+
+    def get_prices(self):
+        """
+        Queryset of prices the latest price and the deviation are taken from
+        """
+        return self.get_applications().filter(
+            status__gte=ApplicationStatus.ON_REVIEW
+        )
+
+    def get_deviation_prices(self):
+        prices = self.get_prices()
+        if self.deal_type:
+            prices = prices.filter(deal_type=self.deal_type)
+        if self.lower_date_bound:
+            prices = prices.filter(created_at__gte=self.lower_date_bound)
+        return prices
+
+    def compute(self) -> Dict[int, dict]:
+        if not self.recyclables_ids:
+            return {}
+        result = defaultdict(dict)
+        if self.with_volumes:
+            self.add_total_volumes(result)
+            self.add_last_prices(result)
+        self.add_latest_prices(result)
+        self.add_deviations(result)
+        return {pk: result[pk] for pk in self.recyclables_ids}
+
+    def add_total_volumes(self, result):
+        # int() весов заявок отбрасывает дробную часть, как и раньше
+        rows = (
+            self.get_applications()
+            .values("recyclables_id")
+            .annotate(
+                **{
+                    field: Sum(
+                        Floor(weight_field),
+                        filter=Q(urgency_type=urgency_type, deal_type=deal_type),
+                    )
+                    for field, (urgency_type, deal_type, weight_field)
+                    in TOTAL_VOLUME_FIELDS.items()
+                }
+            )
+            .order_by()
+        )
+        for row in rows:
+            for field in TOTAL_VOLUME_FIELDS:
+                result[row["recyclables_id"]][field] = (row[field] or 0) / 1000
+
+    def add_last_prices(self, result):
+        rows = fetch_ranked_rows(
+            self.get_applications().filter(deal_type=DealType.BUY),
+            partition_by=[F("recyclables_id"), F("urgency_type")],
+            order_by=[F("created_at").asc(), F("id").asc()],
+            limit=2,
+            fields=("recyclables_id", "urgency_type", "price"),
+        )
+        prices = defaultdict(list)
+        for recyclables_id, urgency_type, price in rows:
+            prices[(recyclables_id, urgency_type)].append(int(price))
+        for recyclables_id in self.recyclables_ids:
+            for urgency_type, field in PRICES_FIELDS.items():
+                values = prices[(recyclables_id, urgency_type)] + [0, 0]
+                result[recyclables_id][field] = {
+                    "last_price": values[0],
+                    "pre_last_price": values[1],
+                }
+
+    def add_latest_prices(self, result):
+        rows = fetch_ranked_rows(
+            self.get_prices(),
+            partition_by=[F(self.recyclables_field)],
+            order_by=[F("created_at").desc(), F("id").desc()],
+            limit=1,
+            fields=(self.recyclables_field, "price"),
+        )
+        for recyclables_id, price in rows:
+            result[recyclables_id]["latest_deal_price"] = price
+
+    def add_deviations(self, result):
+        """
+        Deviation of the latest price in the period from the earliest one
+        """
+        prices = self.get_deviation_prices()
+        fields = (self.recyclables_field, "id", "price")
+        latest = fetch_ranked_rows(
+            prices,
+            partition_by=[F(self.recyclables_field)],
+            order_by=[F("created_at").desc(), F("id").desc()],
+            limit=1,
+            fields=fields,
+        )
+        earliest = {
+            recyclables_id: (pk, price)
+            for recyclables_id, pk, price in fetch_ranked_rows(
+                prices,
+                partition_by=[F(self.recyclables_field)],
+                order_by=[F("created_at").asc(), F("id").asc()],
+                limit=1,
+                fields=fields,
+            )
+        }
+        for recyclables_id, pk, price in latest:
+            first_pk, first_price = earliest[recyclables_id]
+            # Для одной заявки отклонения нет
+            if first_pk != pk:
+                result[recyclables_id]["deviation_percent"] = get_deviation_percent(
+                    price, first_price
+                )
+
+
+class RecyclablesDealsStatistics(RecyclablesStatistics):
+    """
+    Latest price and deviation by completed deals instead of applications,
+    the period is applied to the creation date of the deal application
+    """
+
+    recyclables_field = "application__recyclables_id"
+
+    def __init__(self, recyclables_ids: Iterable[int], lower_date_bound=None):
+        super().__init__(
+            recyclables_ids, lower_date_bound=lower_date_bound, with_volumes=False
+        )
+
+    def get_prices(self):
+        return RecyclablesDeal.objects.filter(
+            application__recyclables_id__in=self.recyclables_ids,
+            status=DealStatus.COMPLETED,
+        )
+
+    def get_deviation_prices(self):
+        prices = self.get_prices()
+        if self.lower_date_bound:
+            prices = prices.filter(
+                application__created_at__gte=self.lower_date_bound
+            )
+        return prices
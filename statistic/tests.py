@@ -0,0 +1,123 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+
+from common.cache import bump_model_version, cached_response
+
+from company.models import Company, CompanyStatus
+from exchange.models import (
+    ApplicationStatus,
+    DealType,
+    RecyclablesApplication,
+    UrgencyType,
+)
+from product.models import Recyclables, RecyclablesCategory
+from statistic.api.serializers import (
+    MainPageRecyclableSerializer,
+    RecyclablesAppStatisticsSerializer,
+    RecyclablesStatisticsSerializer,
+)
+
+
+class RecyclablesStatisticsQueriesTestCase(TestCase):
+    """
+    Number of queries of the statistics list serializers
+    does not depend on the number of recyclables
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = RecyclablesCategory.objects.create(name="Бумага")
+        cls.company = Company.objects.create(
+            name="Тестовая компания",
+            inn="1",
+            phone="+79990000000",
+            status=CompanyStatus.VERIFIED,
+        )
+
+    def create_recyclables(self, count):
+        recyclables = []
+        for i in range(count):
+            instance = Recyclables.objects.create(
+                name=f"Вторсырье {count}-{i}",
+                category=self.category,
+            )
+            for deal_type in (DealType.BUY, DealType.SELL):
+                for urgency_type in UrgencyType.values:
+                    RecyclablesApplication.objects.create(
+                        company=self.company,
+                        recyclables=instance,
+                        deal_type=deal_type,
+                        urgency_type=urgency_type,
+                        status=ApplicationStatus.PUBLISHED,
+                        price=Decimal(10 + i),
+                        full_weigth=1000,
+                        volume=1000,
+                    )
+            recyclables.append(instance)
+        return recyclables
+
+    def serialize(self, serializer_class, recyclables):
+        return serializer_class(
+            recyclables, many=True, context={"lower_date_bound": None}
+        ).data
+
+    def assertConstantQueries(self, serializer_class):
+        few = self.create_recyclables(10)
+        many = self.create_recyclables(100)
+        with CaptureQueriesContext(connection) as queries:
+            self.serialize(serializer_class, few)
+        with self.assertNumQueries(len(queries)):
+            self.serialize(serializer_class, many)
+
+    def test_app_statistics(self):
+        self.assertConstantQueries(RecyclablesAppStatisticsSerializer)
+
+    def test_main_page(self):
+        self.assertConstantQueries(MainPageRecyclableSerializer)
+
+    def test_deals_statistics(self):
+        self.assertConstantQueries(RecyclablesStatisticsSerializer)
+
+
+class CachedView:
+    calls = 0
+
+    @cached_response(Company)
+    def list(self, request):
+        CachedView.calls += 1
+        return Response({"price": Decimal("10.50")})
+
+
+class ResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        CachedView.calls = 0
+        self.request = APIRequestFactory().get("/")
+        self.request.query_params = self.request.GET
+
+    def test_cached_decimal_is_number(self):
+        miss = CachedView().list(self.request)
+        hit = CachedView().list(self.request)
+
+        self.assertEqual((miss["X-Cache"], hit["X-Cache"]), ("MISS", "HIT"))
+        self.assertEqual(miss.data, {"price": 10.5})
+        self.assertEqual(hit.data, miss.data)
+        self.assertEqual(CachedView.calls, 1)
+
+    def test_stale_response_while_recomputed(self):
+        CachedView().list(self.request)
+        bump_model_version(Company)
+
+        # Пересчет нового ответа уже идет в другом запросе
+        with mock.patch("common.cache.cache.add", return_value=False):
+            response = CachedView().list(self.request)
+
+        self.assertEqual(response["X-Cache"], "STALE")
+        self.assertEqual(CachedView.calls, 1)
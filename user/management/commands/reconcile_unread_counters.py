@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from chat.models import Message
+from notification.models import Notification
+from user.models import UnreadCounterKind
+from user.services.unread_counters import set_unread_counts
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает счетчики непрочитанных уведомлений и сообщений чатов"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--users", nargs="+", type=int, help="Id пользователей, по умолчанию все"
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options["users"]:
+            users = users.filter(pk__in=options["users"])
+
+        counters = {
+            UnreadCounterKind.NOTIFICATIONS: Notification.objects.count_unread_personal,
+            UnreadCounterKind.CHAT_MESSAGES: Message.objects.count_unread,
+        }
+        values = {kind: {} for kind in counters}
+        for user in users.iterator():
+            for kind, count_unread in counters.items():
+                values[kind][user.pk] = count_unread(user)
+        for kind, kind_values in values.items():
+            set_unread_counts(kind_values, kind)
+
+        users_count = len(values[UnreadCounterKind.NOTIFICATIONS])
+        self.stdout.write(
+            self.style.SUCCESS(f"Пересчитаны счетчики пользователей: {users_count}")
+        )
@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0009_alter_user_role"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UnreadCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.PositiveSmallIntegerField(
+                        choices=[(1, "Уведомления"), (2, "Сообщения чатов")],
+                        verbose_name="Тип",
+                    ),
+                ),
+                (
+                    "value",
+                    models.IntegerField(
+                        default=0, verbose_name="Количество непрочитанных"
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="unread_counters",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Пользователь",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Счетчик непрочитанных",
+                "verbose_name_plural": "Счетчики непрочитанных",
+                "db_table": "users_unread_counters",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="unreadcounter",
+            constraint=models.UniqueConstraint(
+                fields=("user", "kind"), name="unique_user_unread_counter"
+            ),
+        ),
+    ]
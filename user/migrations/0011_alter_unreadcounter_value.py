@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0010_unreadcounter"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="unreadcounter",
+            name="value",
+            field=models.IntegerField(
+                null=True, verbose_name="Количество непрочитанных"
+            ),
+        ),
+    ]
@@ -196,3 +196,35 @@ class UserActions(BaseModel):
         verbose_name = "Действия пользователя"
         verbose_name_plural = "Действия пользователей"
         db_table = "users_actions"
+
+
+class UnreadCounterKind(models.IntegerChoices):
+    NOTIFICATIONS = 1, "Уведомления"
+    CHAT_MESSAGES = 2, "Сообщения чатов"
+
+
+class UnreadCounter(models.Model):
+    """
+    Persistent copy of the unread counter kept in the cache,
+    see user.services.unread_counters
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        verbose_name="Пользователь",
+        related_name="unread_counters",
+    )
+    kind = get_field_from_choices("Тип", UnreadCounterKind)
+    # NULL - счетчик еще не вычислен, прибавления к нему не применяются
+    value = models.IntegerField("Количество непрочитанных", null=True)
+
+    class Meta:
+        verbose_name = "Счетчик непрочитанных"
+        verbose_name_plural = "Счетчики непрочитанных"
+        db_table = "users_unread_counters"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "kind"], name="unique_user_unread_counter"
+            )
+        ]
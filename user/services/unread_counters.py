@@ -0,0 +1,94 @@
+from collections import defaultdict
+from functools import partial
+from typing import Callable, Dict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+from user.models import UnreadCounter, UnreadCounterKind
+
+UNREAD_COUNTER_KEY = "unread_counter:{}:{}"
+# При изменении счетчиков большего числа пользователей ключи удаляются,
+# следующее чтение берет значение из таблицы
+UNREAD_COUNTER_CACHE_FANOUT = 100
+
+
+def get_key(user_id: int, kind: UnreadCounterKind) -> str:
+    return UNREAD_COUNTER_KEY.format(int(kind), user_id)
+
+
+def get_unread_count(user, kind: UnreadCounterKind, compute: Callable[[], int]) -> int:
+    """
+    Reads the counter from the cache, on a miss from the table under the row lock.
+    The first read of the user computes it with `compute`: changes of the counter
+    made before the lock are waited for and included into `compute`,
+    later ones wait for the computed value
+    """
+    key = get_key(user.pk, kind)
+    value = cache.get(key)
+    if value is None:
+        # Строка создается заранее, чтобы параллельные изменения ждали блокировки
+        UnreadCounter.objects.get_or_create(user=user, kind=kind)
+        with transaction.atomic():
+            counter = UnreadCounter.objects.select_for_update().get(
+                user=user, kind=kind
+            )
+            if counter.value is None:
+                counter.value = compute()
+                counter.save(update_fields=["value"])
+            value = counter.value
+            # Кэш заполняется до снятия блокировки, изменения,
+            # ожидающие ее, попадут в кэш после фиксации (см. update_cache)
+            cache.set(key, value, None)
+    return max(value, 0)
+
+
+def update_cache(deltas: Dict[int, int], kind: UnreadCounterKind):
+    if len(deltas) > UNREAD_COUNTER_CACHE_FANOUT:
+        cache.delete_many([get_key(user_id, kind) for user_id in deltas])
+        return
+    for user_id, delta in deltas.items():
+        try:
+            cache.incr(get_key(user_id, kind), delta)
+        except ValueError:
+            # Значения нет в кэше, оно будет прочитано из таблицы
+            pass
+
+
+def change_unread_counts(deltas: Dict[int, int], kind: UnreadCounterKind):
+    """
+    Adds deltas (user id -> delta) to the counters of the users.
+    Counters which were not read yet are not created here,
+    not computed ones (NULL) stay NULL
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids_by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        user_ids_by_delta[delta].append(user_id)
+    for delta, user_ids in user_ids_by_delta.items():
+        UnreadCounter.objects.filter(user_id__in=user_ids, kind=kind).update(
+            value=F("value") + delta
+        )
+    transaction.on_commit(partial(update_cache, deltas, kind))
+
+
+def set_unread_counts(values: Dict[int, int], kind: UnreadCounterKind):
+    """
+    Overwrites counters of the users with exact values
+    """
+    UnreadCounter.objects.bulk_create(
+        [
+            UnreadCounter(user_id=user_id, kind=kind, value=value)
+            for user_id, value in values.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["user", "kind"],
+        update_fields=["value"],
+    )
+    cache.set_many(
+        {get_key(user_id, kind): value for user_id, value in values.items()}, None
+    )
+